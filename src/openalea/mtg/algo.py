@@ -20,7 +20,10 @@
 
 __docformat__ = "restructuredtext"
 
+import numpy as np
+
 from . import traversal
+from .tree_index import interval_index, lca_index
 
 try:
     from .tree import InvalidVertex
@@ -45,7 +48,7 @@ def ancestors(g, vid, **kwds):
     ci = kwds.get('ContainedIn')
 
     if ci is not None:
-        c_scale = g.scale(ci)
+        is_contained_in = interval_index(g).is_contained_in
 
     v = vid
 
@@ -54,7 +57,7 @@ def ancestors(g, vid, **kwds):
         if rt == 'SameComplex':
             if g.complex(v) != g.complex(vid):
                 break
-        if ci and g.complex_at_scale(v, scale=c_scale) != ci:
+        if ci and not is_contained_in(v, ci):
             break
 
         yield v
@@ -73,18 +76,36 @@ def path(g, vid1, vid2=None):
     if v2 is None:
         return ancestors(g,v1), sign
 
-    l= list(ancestors(g,v2))
-    try: 
-        index = l.index(v1)
-    except ValueError:
-        l = list(ancestors(g,v1))
-        try:
-            index = l.index(v2)
-            sign = -1
-        except ValueError:
+    index = interval_index(g)
+    if not index.is_ancestor(v1, v2):
+        if not index.is_ancestor(v2, v1):
             return iter([]), 0
+        v1, v2 = v2, v1
+        sign = -1
+
+    # only walk from v2 up to v1
+    l = [v2]
+    while v2 != v1:
+        v2 = g.parent(v2)
+        l.append(v2)
+
+    return reversed(l), sign
 
-    return reversed(l[:index+1]), sign
+def is_ancestor(g, vid1, vid2):
+    """ Test if `vid1` is an ancestor of `vid2`.
+
+    A vertex is an ancestor of itself.
+    The test is done in constant time with the
+    :class:`~openalea.mtg.tree_index.IntervalIndex` of `g`.
+
+    :Parameters:
+        - `g`: a tree or an MTG
+        - `vid1`, `vid2`: vertex ids which belong to `g`
+
+    :Returns:
+        True if `vid1` is on the path from `vid2` to the root.
+    """
+    return interval_index(g).is_ancestor(vid1, vid2)
 
 def edge_type(g,v):
     return g.property('edge_type').get(v)
@@ -254,8 +275,8 @@ def sons(g, vid, **kwds):
     if et != '*':
         children = (v for v in children if edge_type[v] == et)
     if ci is not None:
-        c_scale = g.scale(ci)
-        children = (v for v in children if g.complex_at_scale(v) == ci)
+        is_contained_in = interval_index(g).is_contained_in
+        children = (v for v in children if is_contained_in(v, ci))
 
     return list(children)
 
@@ -268,7 +289,7 @@ def full_ancestors(g, v1, **kwds):
 
     v = v1
     if ci is not None:
-        c_scale = g.scale(ci)
+        is_contained_in = interval_index(g).is_contained_in
 
     while v is not None:
         if et != '*' and edge_type.get(v) != et:
@@ -280,7 +301,7 @@ def full_ancestors(g, v1, **kwds):
         elif rt == 'SameAxis':
             if edge_type.get(v) == '+':
                 break
-        if ci and g.complex_at_scale(v, scale=c_scale) != ci:
+        if ci and not is_contained_in(v, ci):
             break
         yield v
         v = g.parent(v)
@@ -295,13 +316,13 @@ def axis(g, vtx_id, scale=-1, **kwds):
     kwds['EdgeType'] = '<'
 
     if ci is not None:
-        c_scale = g.scale(ci)
+        is_contained_in = interval_index(g).is_contained_in
 
     for v in ancestors(g, vtx_id, **kwds):
         if rt == 'SameComplex':
             if g.complex(v) != g.complex(vtx_id):
                 break
-        if ci and g.complex_at_scale(v, scale=c_scale) != ci:
+        if ci and not is_contained_in(v, ci):
             break
 
         if edge_type.get(v) == '+':
@@ -318,11 +339,15 @@ def descendants(g, vtx_id, scale=-1, **kwds):
     rt = kwds.get('RestrictedTo', 'NoRestriction')
     ci = kwds.get('ContainedIn')
 
-    if ci is not None:
-        c_scale = g.scale(ci)
-
     vtx_id = vertex_at_scale(g, vtx_id, scale)
 
+    if et == '*' and rt == 'NoRestriction' and ci is None:
+        # the subtree is a slice of the pre-order
+        return iter(interval_index(g).descendants(vtx_id))
+
+    if ci is not None:
+        is_contained_in = interval_index(g).is_contained_in
+
     v = vtx_id
 
     if rt == 'SameComplex':
@@ -337,7 +362,7 @@ def descendants(g, vtx_id, scale=-1, **kwds):
         elif rt == 'SameAxis' and edge_type.get(v) == '+':
                 return False
 
-        if ci and g.complex_at_scale(v, scale=c_scale) != ci:
+        if ci and not is_contained_in(v, ci):
             return False
         return True
 
@@ -346,8 +371,18 @@ def descendants(g, vtx_id, scale=-1, **kwds):
         
 def extremities(g, vid, **kwds):
     """ TODO see aml doc
-    Implement the method more efficiently...
     """
+    et = kwds.get('EdgeType','*')
+    rt = kwds.get('RestrictedTo', 'NoRestriction')
+    ci = kwds.get('ContainedIn')
+
+    if et == '*' and rt == 'NoRestriction' and ci is None:
+        # the extremities are the leaves of the subtree
+        for v in descendants(g, vid, **kwds):
+            if g.is_leaf(v):
+                yield v
+        return
+
     vertices = set(descendants(g,vid, **kwds))
     for v in vertices:
         if g.is_leaf(v):
@@ -374,7 +409,7 @@ def local_axis(g, vtx_id, scale=-1, **kwds):
     vtx_id = vertex_at_scale(g, vtx_id, scale)
 
     if ci is not None:
-        c_scale = g.scale(ci)
+        is_contained_in = interval_index(g).is_contained_in
 
     
     v = vtx_id
@@ -388,7 +423,7 @@ def local_axis(g, vtx_id, scale=-1, **kwds):
                 if rt == 'SameComplex':
                     if g.complex(v) != g.complex(vtx_id):
                         v = None
-                if ci and g.complex_at_scale(v, scale=c_scale) != ci:
+                if ci and v is not None and not is_contained_in(v, ci):
                     v = None
 
 def vertex_at_scale(g, vtx_id, scale):
@@ -510,34 +545,295 @@ def heights(g, scale=-1):
 
     return heights
 
-def lookForCommonAncestor(g, commonAncestors, currentNode):       
-    while not(currentNode is None):
-        for i in range(len(commonAncestors)):
-            node = commonAncestors[i]
-            if node == currentNode:
-                for j in range(i):
-                    commonAncestors.popleft()
-                return 
-            i += 1
-        currentNode = g.parent(currentNode)
+def _ancestor_sums(weights, start, stop):
+    """ Sum the weights of the intervals containing each position.
+
+    Position `p` gets the sum of `weights[i]` for all `i` such that
+    `start[i] <= p < stop[i]`.
+    With pre-order intervals, this is the sum over the ancestors.
+    """
+    n = len(weights)
+    delta = np.bincount(start, weights, minlength=n+1)
+    delta -= np.bincount(stop, weights, minlength=n+1)
+    return np.rint(np.cumsum(delta[:n])).astype(np.int64)
+
+def topology_metrics(g, scale=None):
+    """ Compute the topological features of all the vertices in one pass.
+
+    The features are computed on the tree graph of each scale.
+
+    :Parameters:
+        - `g`: an MTG
+        - `scale`: the scale of the vertices (all the scales if None)
+
+    :Returns:
+        a dict of aligned numpy arrays, the vertices being sorted by scale
+        and in pre-order within each scale:
+
+            - `vid`: vertex identifier
+            - `scale`: scale of the vertex
+            - `order`: number of '+' edges from the root, i.e. the algebraic
+              order with respect to the root (see :func:`orders`)
+            - `height`: number of edges from the root (see :func:`heights`)
+            - `rank`: number of '<' edges to the beginning of the axis
+            - `decomposition_depth`: number of finer scales in which the
+              vertex is decomposed, down to the finest scale (0 for a
+              vertex without components)
+            - `subtree_size`: number of vertices in the sub-tree of the vertex
+            - `nb_leaves`: number of leaves in the sub-tree of the vertex
+
+    :Examples:
+
+    .. code-block:: python
+
+        metrics = topology_metrics(g, scale=3)
+        df = pandas.DataFrame(metrics)
+
+    .. note:: All the metrics are computed with a few vectorized operations
+        on the :class:`~openalea.mtg.tree_index.IntervalIndex` of `g`,
+        except the rank which requires one loop over the vertices.
+    """
+    index = interval_index(g)
+    vids = index._order
+    n = len(vids)
+    position = np.arange(n)
+    end = index._end[vids]
+    ones = np.ones(n)
+
+    edge_type = g.property('edge_type')
+    et = [edge_type.get(v) for v in vids.tolist()]
+    plus = np.array([e == '+' for e in et], dtype=np.float64)
+
+    height = _ancestor_sums(ones, position, end) - 1
+    order = _ancestor_sums(plus, position, end)
+
+    rank = [0]*n
+    for i, p in enumerate(index._parent_pos.tolist()):
+        if et[i] == '<':
+            rank[i] = rank[p]+1 if p >= 0 else 1
+
+    complex_pos, levels = index.decomposition_levels()
+    decomposition_depth = np.zeros(n, dtype=np.int64)
+    for level in reversed(levels[1:]):
+        np.maximum.at(decomposition_depth, complex_pos[level], decomposition_depth[level] + 1)
+
+    subtree_size = end - position
+    leaves = np.zeros(n+1, dtype=np.int64)
+    np.cumsum(subtree_size == 1, out=leaves[1:])
+    nb_leaves = leaves[end] - leaves[position]
+
+    scales = np.fromiter(map(g.scale, vids.tolist()), dtype=np.int64, count=n)
+    if scale is None:
+        selected = np.lexsort((position, scales))
+    else:
+        selected = np.flatnonzero(scales == scale)
+
+    return dict(vid=vids[selected],
+                scale=scales[selected],
+                order=order[selected],
+                height=height[selected],
+                rank=np.array(rank, dtype=np.int64)[selected],
+                decomposition_depth=decomposition_depth[selected],
+                subtree_size=subtree_size[selected],
+                nb_leaves=nb_leaves[selected])
+
+_operators = dict(sum=np.add, prod=np.multiply, max=np.maximum, min=np.minimum)
+
+# Default values of the operators which have no identity
+_extrema = {np.maximum: -np.inf, np.fmax: -np.inf, np.minimum: np.inf, np.fmin: np.inf}
+
+def accumulate(g, prop, op='sum', direction='up', scale=None, default=None):
+    """ Aggregate the values of a property over the topology.
+
+    :Parameters:
+        - `g`: a tree or an MTG
+        - `prop`: name of a property of `g` or a dict (vid -> value)
+        - `op`: 'sum', 'prod', 'max', 'min' or a binary numpy ufunc
+        - `direction`: what is aggregated on each vertex:
+
+            - 'up': the values of its descendants (i.e. of its sub-tree),
+            - 'down': the values of its ancestors (i.e. of the path from the root),
+            - 'complex': the values of its components at all the finer scales.
+
+        - `scale`: only return the vertices of this scale (all if None)
+        - `default`: value of the vertices which are not defined in `prop`
+          (the identity of `op` if None, e.g. 0 for 'sum', -inf for 'max').
+          Required for the ufuncs without identity other than
+          maximum, minimum, fmax and fmin.
+
+    :Returns:
+        a dict (vid -> aggregated value). The value of a vertex is included.
+
+    :Examples:
+
+    .. code-block:: python
+
+        # total length of each sub-tree and of each axis
+        total_length = accumulate(g, 'length', scale=3)
+        axis_length = accumulate(g, 'length', direction='complex', scale=2)
+        # number of leaves of each sub-tree
+        leaves = dict((v, 1) for v in g.vertices(scale=3) if g.is_leaf(v))
+        nb_leaves = accumulate(g, leaves, scale=3)
+        # distance to the root
+        distance = propagate(g, 'length', scale=3)
 
+    .. note:: The vertices are processed level by level (i.e. by depth)
+        with numpy ufuncs, on the arrays of the cached
+        :class:`~openalea.mtg.tree_index.IntervalIndex` of `g`.
+
+    .. seealso:: :func:`propagate`
+    """
+    ufunc = _operators.get(op, op) if isinstance(op, str) else op
+    if not isinstance(ufunc, np.ufunc):
+        raise ValueError('Unknown operator %s'%(op,))
+
+    index = interval_index(g)
+    if direction in ('up', 'down'):
+        parent, levels = index.levels()
+    elif direction == 'complex':
+        parent, levels = index.decomposition_levels()
+    else:
+        raise ValueError("direction has to be 'up', 'down' or 'complex' (%s)"%(direction,))
+
+    if isinstance(prop, str):
+        prop = g.property(prop)
+    if default is None:
+        default = ufunc.identity
+        if default is None:
+            if ufunc not in _extrema:
+                raise ValueError('%s has no identity: give the default value'%(ufunc.__name__,))
+            default = _extrema[ufunc]
+
+    vids = index._order.tolist()
+    data = np.array([prop.get(v, default) for v in vids])
+
+    if direction == 'down':
+        for positions in levels[1:]:
+            data[positions] = ufunc(data[parent[positions]], data[positions])
+    else:
+        for positions in reversed(levels[1:]):
+            ufunc.at(data, parent[positions], data[positions])
+
+    if scale is None:
+        return dict(zip(vids, data.tolist()))
+    else:
+        vertices = g.vertices(scale=scale)
+        positions = index._pre[np.asarray(vertices, dtype=np.int64)]
+        return dict(zip(vertices, data[positions].tolist()))
+
+def propagate(g, prop, op='sum', scale=None, default=None):
+    """ Aggregate the values of a property from the root to the leaves.
+
+    The value of each vertex is combined with the values of all its ancestors,
+    e.g. the sum of the lengths gives the distance to the root,
+    and 'max' the maximum value on the path from the root.
+
+    This is :func:`accumulate` with `direction='down'`.
+
+    :Returns:
+        a dict (vid -> aggregated value)
+    """
+    return accumulate(g, prop, op=op, direction='down', scale=scale, default=default)
 
 def lowestCommonAncestor(g, nodes):
-    """LCA algorithm"""     
-    from collections import deque
+    """LCA algorithm
+
+    Return the lowest common ancestor of a list of vertices,
+    or None if there is less than two vertices or if they
+    do not belong to the same tree.
+    """
     lca = None
     if (len(nodes) > 1):
-        
-        firstNode = nodes[0];
-        firstAncestors = deque(g.Ancestors(firstNode))
-        i = 1
-        while i < len(nodes) and len(firstAncestors) > 0:
-            currentNode = nodes[i]
-            lookForCommonAncestor(g, firstAncestors, currentNode)
-            i += 1
-
-        if len(firstAncestors) > 0:
-            lca = firstAncestors[0]
-    
+        index = lca_index(g)
+        lca = nodes[0]
+        for node in nodes[1:]:
+            lca = index.lca(lca, node)
+            if lca is None:
+                break
+
     return lca
+
+def lca(g, vid1, vid2):
+    """ Return the lowest common ancestor of two vertices.
+
+    The query is done in constant time with the
+    :class:`~openalea.mtg.tree_index.LCAIndex` of `g`,
+    which is computed once and cached until `g` is edited.
+
+    :Parameters:
+        - `g`: a tree or an MTG
+        - `vid1`, `vid2`: vertex ids which belong to `g`
+
+    :Returns:
+        the lowest common ancestor, or None if `vid1` and `vid2`
+        do not belong to the same tree (e.g. are at different scales).
+    """
+    return lca_index(g).lca(vid1, vid2)
+
+def lca_many(g, pairs):
+    """ Return the lowest common ancestors of a sequence of pairs of vertices.
+
+    :Parameters:
+        - `g`: a tree or an MTG
+        - `pairs`: a sequence of `(vid1, vid2)` or an array of shape (n, 2)
+
+    :Returns:
+        a numpy array of vertex ids, -1 for the pairs without common ancestor.
+
+    :Examples:
+
+    .. code-block:: python
+
+        leaves = [v for v in g.vertices(scale=3) if g.is_leaf(v)]
+        lcas = lca_many(g, [(v1, v2) for v1 in leaves for v2 in leaves])
+    """
+    vids1, vids2 = _split_pairs(pairs)
+    return lca_index(g).lca_many(vids1, vids2)
+
+def topological_distance(g, vid1, vid2):
+    """ Return the number of edges on the path between two vertices.
+
+    The path goes up from `vid1` to the lowest common ancestor
+    and down to `vid2`.
+
+    :Returns:
+        the number of edges, or None if `vid1` and `vid2` do not belong
+        to the same tree.
+    """
+    return lca_index(g).distance(vid1, vid2)
+
+def path_length_many(g, pairs):
+    """ Return the topological distances of a sequence of pairs of vertices.
+
+    :Parameters:
+        - `g`: a tree or an MTG
+        - `pairs`: a sequence of `(vid1, vid2)` or an array of shape (n, 2)
+
+    :Returns:
+        a numpy array with the number of edges between the vertices of each
+        pair, -1 for the pairs which do not belong to the same tree.
+    """
+    vids1, vids2 = _split_pairs(pairs)
+    return lca_index(g).distance_many(vids1, vids2)
+
+def topological_distances(g, vertices):
+    """ Return the matrix of topological distances between vertices.
+
+    :Parameters:
+        - `g`: a tree or an MTG
+        - `vertices`: a sequence of vertex ids
+
+    :Returns:
+        a square numpy array `d` where `d[i, j]` is the number of edges
+        between `vertices[i]` and `vertices[j]` (-1 if not in the same tree).
+    """
+    vertices = np.asarray(vertices, dtype=np.int64)
+    n = len(vertices)
+    vids1 = np.repeat(vertices, n)
+    vids2 = np.tile(vertices, n)
+    return lca_index(g).distance_many(vids1, vids2).reshape(n, n)
+
+def _split_pairs(pairs):
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
    
\ No newline at end of file
@@ -0,0 +1,470 @@
+# -*- python -*-
+#
+#       OpenAlea.mtg
+#
+#       Copyright 2008-2026 INRIA - CIRAD - INRA
+#
+#       File author(s): Christophe Pradal <christophe.pradal.at.cirad.fr>
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+################################################################################
+'''
+Binary, columnar file format for MTGs.
+
+:func:`save_binary` writes the arrays of a :class:`~openalea.mtg.frozen.FrozenMTG`
+(topology) and the properties stored as columns:
+
+    - numbers: a typed array and a validity mask
+      (see :class:`~openalea.mtg.column.Column`),
+    - strings (labels, edge types, ...): integer codes and a table of the
+      distinct strings (see :class:`~openalea.mtg.column.StringColumn`),
+    - the other values are pickled.
+
+:func:`load_binary` returns a FrozenMTG whose arrays may be memory-mapped:
+loading does not depend on the size of the MTG and only the parts of the
+file which are used are read.
+
+:func:`share_mtg` writes the same data in a block of shared memory, and
+:func:`attach_mtg` returns a FrozenMTG whose arrays are views on this
+block, so that several processes use one copy of the MTG.
+
+File layout (version 1)::
+
+    magic (8 bytes) | version (uint32) | header size (uint32) | header (JSON)
+    | padding | arrays, each aligned on 64 bytes
+
+The header describes the arrays (dtype, shape, offset from the start of
+the data) and the properties.
+
+The file may be compressed (gzip, bz2, xz, zstd, see
+:func:`~openalea.mtg.compress.open_file`): it is then decompressed in
+memory when loaded, and not memory-mapped.
+
+.. warning:: Pickled values are loaded with :mod:`pickle`:
+    only load files from trusted sources.
+'''
+
+__docformat__ = "restructuredtext"
+
+import io
+import json
+import os
+import pickle
+import struct
+import threading
+
+import numpy as np
+
+from .column import Column, StringColumn
+from .compress import compression_of, open_file
+from .frozen import FrozenMTG
+
+MAGIC = b'OAMTGBIN'
+VERSION = 1
+
+_prefix = struct.Struct('<8sII')
+_ALIGN = 64
+
+# Topological arrays of a FrozenMTG
+_topology = [('vertices', '_vertices'),
+             ('scale', '_scale_array'),
+             ('parent', '_parent_array'),
+             ('complex', '_complex_array'),
+             ('explicit', '_explicit'),
+             ('child_offsets', '_child_offsets'),
+             ('children', '_child_array'),
+             ('component_offsets', '_component_offsets'),
+             ('components', '_component_array')]
+
+
+def _aligned(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _bytes_array(obj):
+    return np.frombuffer(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL), dtype=np.uint8)
+
+
+def _string_table(strings):
+    ''' Encode a list of strings as (offsets, utf-8 data) arrays. '''
+    data = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(data)+1, dtype=np.int64)
+    np.cumsum([len(d) for d in data], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(data), dtype=np.uint8)
+
+
+class _StringTable(object):
+    ''' Sequence of strings decoded from the file on first access. '''
+
+    def __init__(self, offsets, data):
+        self._offsets = offsets
+        self._data = data
+        self._strings = None
+
+    def _decode(self):
+        data = self._data.tobytes()
+        offsets = self._offsets.tolist()
+        self._strings = [data[offsets[i]:offsets[i+1]].decode('utf-8')
+                         for i in range(len(offsets)-1)]
+        return self._strings
+
+    def __getitem__(self, i):
+        strings = self._strings
+        if strings is None:
+            strings = self._decode()
+        return strings[i]
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+
+def _encode_property(p, size):
+    ''' Split a property into columns.
+
+    :Returns:
+        - `(kind, arrays, leftovers)` where kind is 'int', 'float', 'str'
+          or 'object' and `leftovers` is a dict of the values to pickle.
+    '''
+    if isinstance(p, Column):
+        kind = 'float' if p.dtype.kind == 'f' else 'int'
+        return kind, {'values': p.array, 'mask': p.mask}, dict(p.overflow)
+    if isinstance(p, StringColumn):
+        offsets, data = _string_table(list(p.strings))
+        return 'str', {'codes': p.codes, 'offsets': offsets, 'data': data}, dict(p.overflow)
+
+    # Keep the most frequent type among str, int and float in a column
+    counts = {str: 0, int: 0, float: 0}
+    for value in p.values():
+        t = type(value)
+        if t in counts:
+            counts[t] += 1
+    t = max(counts, key=counts.get)
+    if counts[t] == 0:
+        return 'object', {}, dict(p)
+
+    leftovers = {}
+    items = []
+    for vid, value in p.items():
+        if type(value) is t and type(vid) is int and 0 <= vid < size:
+            items.append((vid, value))
+        else:
+            leftovers[vid] = value
+
+    if t is str:
+        codes = np.full(size, -1, dtype=np.int32)
+        table = {}
+        for vid, value in items:
+            codes[vid] = table.setdefault(value, len(table))
+        offsets, data = _string_table(list(table))
+        return 'str', {'codes': codes, 'offsets': offsets, 'data': data}, leftovers
+
+    column = Column(np.int64 if t is int else np.float64)
+    for vid, value in items:
+        column[vid] = value
+    leftovers.update(column.overflow)
+    kind = 'int' if t is int else 'float'
+    return kind, {'values': column.array, 'mask': column.mask}, leftovers
+
+
+def _encode(g):
+    ''' Header and arrays of the binary format of `g`.
+
+    :Returns: `(head, arrays, offsets, size)` where `head` is the prefix
+        and the header, `offsets` the position of the arrays and `size`
+        the size of the data.
+    '''
+    fg = g if isinstance(g, FrozenMTG) else FrozenMTG.from_mtg(g, copy_properties=False)
+    size = len(fg._scale_array)
+
+    arrays = []
+
+    def add_array(array):
+        arrays.append(np.ascontiguousarray(array))
+        return len(arrays) - 1
+
+    topology = dict((name, add_array(getattr(fg, attr))) for name, attr in _topology)
+
+    properties = []
+    for name, p in fg._properties.items():
+        kind, columns, leftovers = _encode_property(p, size)
+        desc = {'name': name, 'kind': kind}
+        desc.update((k, add_array(a)) for k, a in columns.items())
+        if leftovers:
+            desc['leftovers'] = add_array(_bytes_array(leftovers))
+        properties.append(desc)
+    graph_properties = add_array(_bytes_array(dict(fg._graph_properties)))
+
+    array_desc = []
+    offset = 0
+    for a in arrays:
+        array_desc.append({'dtype': a.dtype.str, 'shape': list(a.shape), 'offset': offset})
+        offset = _aligned(offset + a.nbytes)
+
+    header = {'root': int(fg.root),
+              'max_id': int(fg._id),
+              'arrays': array_desc,
+              'topology': topology,
+              'properties': properties,
+              'graph_properties': graph_properties}
+
+    header = json.dumps(header).encode('utf-8')
+    head = _prefix.pack(MAGIC, VERSION, len(header)) + header
+    start = _aligned(len(head))
+    offsets = [start + desc['offset'] for desc in array_desc]
+    return head, arrays, offsets, offsets[-1] + arrays[-1].nbytes
+
+
+def save_binary(g, path, compression='infer'):
+    ''' Save an MTG in the binary columnar format.
+
+    :Parameters:
+        - `g` (MTG or FrozenMTG)
+        - `path` (str) - name of the file, or a binary file object
+        - `compression` (str) - 'infer' (from the extension of `path`, e.g.
+          `.bmtg.gz`), None, or one of 'gzip', 'bz2', 'xz', 'zstd'.
+
+    :Example:
+
+    .. code-block:: python
+
+        g = read_mtg_file('orchard.mtg')
+        save_binary(g, 'orchard.bmtg')
+        fg = load_binary('orchard.bmtg')
+
+    .. seealso:: :func:`load_binary`
+    '''
+    head, arrays, offsets, _ = _encode(g)
+
+    def write(f):
+        f.write(head)
+        position = len(head)
+        for a, offset in zip(arrays, offsets):
+            f.write(b'\0' * (offset - position))
+            f.write(a.data)
+            position = offset + a.nbytes
+
+    if not isinstance(path, (str, os.PathLike)):
+        with open_file(path, 'wb', compression=None if compression == 'infer' else compression) as f:
+            write(f)
+        return
+
+    if compression == 'infer':
+        compression = compression_of(fn=path)
+
+    # Write in a temporary file: `g` may be memory-mapped from `path`.
+    tmp = '%s.%d.tmp'%(os.fspath(path), os.getpid())
+    try:
+        with open_file(tmp, 'wb', compression=compression) as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _read_prefix(prefix, name):
+    ''' Size of the header, from the prefix of the data. '''
+    if len(prefix) < _prefix.size or prefix[:len(MAGIC)] != MAGIC:
+        raise ValueError('%s is not a binary MTG file'%(name,))
+    _, version, header_size = _prefix.unpack(prefix)
+    if version > VERSION:
+        raise ValueError('%s: unsupported binary MTG version %d (the last supported one is %d)'%(name, version, VERSION))
+    return header_size
+
+
+def load_binary(path, mmap=True):
+    ''' Load an MTG saved with :func:`save_binary`.
+
+    :Parameters:
+        - `path` (str) - name of the file, or a binary file object
+        - `mmap` (bool) - if True, the arrays are memory-mapped from the file
+          (read-only and only loaded when used), otherwise the file is read.
+          A compressed file is always read.
+
+    :Returns:
+        a :class:`~openalea.mtg.frozen.FrozenMTG`.
+        Use :meth:`~openalea.mtg.frozen.FrozenMTG.thaw` to get an editable MTG.
+
+    .. seealso:: :func:`save_binary`
+    '''
+    with open_file(path, 'rb') as f:
+        header_size = _read_prefix(f.read(_prefix.size), path)
+        header = json.loads(f.read(header_size).decode('utf-8'))
+        start = _aligned(_prefix.size + header_size)
+
+        if mmap and isinstance(getattr(f, 'raw', None), io.FileIO):
+            buffer = np.memmap(f, dtype=np.uint8, mode='r')
+        else:
+            # read (and decompress) the arrays
+            f.read(start - _prefix.size - header_size)
+            buffer = np.frombuffer(f.read(), dtype=np.uint8)
+            start = 0
+
+    return _decode(header, buffer, start)
+
+
+def _decode(header, buffer, start):
+    ''' FrozenMTG whose arrays are views on `buffer` (an uint8 array)
+    where the data starts at `start`.
+    '''
+    def array(i):
+        desc = header['arrays'][i]
+        dtype = np.dtype(desc['dtype'])
+        shape = tuple(desc['shape'])
+        offset = start + desc['offset']
+        nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        return buffer[offset:offset+nbytes].view(dtype).reshape(shape)
+
+    def unpickle(i):
+        return pickle.loads(array(i).tobytes())
+
+    topology = dict((name, array(i)) for name, i in header['topology'].items())
+
+    properties = {}
+    for desc in header['properties']:
+        kind = desc['kind']
+        leftovers = unpickle(desc['leftovers']) if 'leftovers' in desc else None
+        if kind in ('int', 'float'):
+            p = Column.from_arrays(array(desc['values']), array(desc['mask']), leftovers)
+        elif kind == 'str':
+            strings = _StringTable(array(desc['offsets']), array(desc['data']))
+            p = StringColumn(array(desc['codes']), strings, leftovers)
+        else:
+            p = leftovers or {}
+        properties[desc['name']] = p
+
+    return FrozenMTG(header['root'], topology['vertices'], topology['scale'],
+                     topology['parent'], topology['complex'], topology['explicit'],
+                     topology['child_offsets'], topology['children'],
+                     topology['component_offsets'], topology['components'],
+                     properties=properties,
+                     graph_properties=unpickle(header['graph_properties']),
+                     max_id=header['max_id'])
+
+
+def share_mtg(g, name=None):
+    ''' Publish an MTG in a block of shared memory, in the binary format.
+
+    Other processes get a read-only :class:`~openalea.mtg.frozen.FrozenMTG`
+    from the name of the block with :func:`attach_mtg`. Its arrays
+    (topology, numbers and strings of the properties) are views on the
+    shared memory: they are not copied in each process.
+
+    :Parameters:
+        - `g` (MTG or FrozenMTG)
+        - `name` (str) - name of the block (a new name if None)
+
+    :Returns:
+        the :class:`multiprocessing.shared_memory.SharedMemory` block.
+        Its creator has to call `close()` and `unlink()` when the workers
+        are done.
+
+    :Example:
+
+    .. code-block:: python
+
+        shm = share_mtg(g)
+        with ProcessPoolExecutor(32) as pool:
+            results = list(pool.map(simulate, [shm.name]*1000))
+        shm.close()
+        shm.unlink()
+
+        def simulate(name):
+            g = attach_mtg(name)
+            ...
+
+    .. seealso:: :func:`attach_mtg`
+    '''
+    from multiprocessing.shared_memory import SharedMemory
+
+    head, arrays, offsets, size = _encode(g)
+    shm = SharedMemory(name=name, create=True, size=size)
+    try:
+        buffer = np.ndarray(size, dtype=np.uint8, buffer=shm.buf)
+        buffer[:len(head)] = np.frombuffer(head, dtype=np.uint8)
+        for a, offset in zip(arrays, offsets):
+            buffer[offset:offset+a.nbytes] = a.reshape(-1).view(np.uint8)
+        del buffer
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    return shm
+
+
+# Serialize the attachments which patch resource_tracker.register
+_attach_lock = threading.Lock()
+
+
+class _SharedBlock(object):
+    ''' Owner of the arrays which are views on a shared memory block.
+
+    The block is closed when the arrays are all deleted.
+    '''
+    def __init__(self, shm):
+        self.shm = shm
+        self._data = np.frombuffer(shm.buf, dtype=np.uint8)
+        interface = dict(self._data.__array_interface__)
+        interface['data'] = (interface['data'][0], True)
+        self.__array_interface__ = interface
+
+    def __del__(self):
+        # release the buffer before closing the block
+        self._data = None
+        self.shm.close()
+
+
+def _map_shared_memory(name):
+    ''' Map an existing block, which is unlinked by its creator only.
+
+    :Returns: a read-only uint8 array on the block. The block is closed
+        when the arrays which use it are deleted.
+    '''
+    from multiprocessing import resource_tracker
+    from multiprocessing.shared_memory import SharedMemory
+
+    try:
+        shm = SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: do not register the block in the resource tracker,
+        # which would unlink it when this process exits. It may be the
+        # tracker of the creator (fork, spawn or forkserver), so the block
+        # must not be unregistered either.
+        with _attach_lock:
+            register = resource_tracker.register
+
+            def register_others(rname, rtype):
+                if rtype != 'shared_memory' or rname.lstrip('/') != name.lstrip('/'):
+                    register(rname, rtype)
+
+            resource_tracker.register = register_others
+            try:
+                shm = SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+    return np.asarray(_SharedBlock(shm))
+
+
+def attach_mtg(name):
+    ''' Get the MTG published with :func:`share_mtg`.
+
+    :Parameters:
+        - `name` (str) - the name of the shared memory block
+
+    :Returns:
+        a read-only :class:`~openalea.mtg.frozen.FrozenMTG` whose arrays are
+        views on the shared memory. The block stays mapped in the process
+        as long as they are used.
+
+    .. seealso:: :func:`share_mtg`
+    '''
+    buffer = _map_shared_memory(name)
+    header_size = _read_prefix(buffer[:_prefix.size].tobytes(), name)
+    header = json.loads(buffer[_prefix.size:_prefix.size+header_size].tobytes().decode('utf-8'))
+    return _decode(header, buffer, _aligned(_prefix.size + header_size))
@@ -0,0 +1,154 @@
+# -*- python -*-
+#
+#       OpenAlea.mtg
+#
+#       Copyright 2008-2026 INRIA - CIRAD - INRA
+#
+#       File author(s): Christophe Pradal <christophe.pradal.at.cirad.fr>
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+################################################################################
+'''
+On-disk cache of the parsed MTG files.
+
+:func:`~openalea.mtg.io.read_mtg_file` with `cache=True` (or the name of
+a directory) stores the parsed MTG in the cache directory and loads it from
+there the next time the same file is read with the same options, without
+parsing the text.
+
+An entry is identified by a hash of the content of the file and of the
+parsing options: a modified file is parsed again. The least recently used
+entries are removed when the size of the cache exceeds :data:`max_size`.
+
+The entries are written in a temporary file which is then renamed, so
+several processes can share the same cache directory.
+
+The default directory is `$OPENALEA_MTG_CACHE`, or `openalea.mtg` in the
+user cache directory (`$XDG_CACHE_HOME` or `~/.cache`).
+
+.. warning:: The entries are loaded with :mod:`pickle`:
+    do not share a cache directory with untrusted users.
+'''
+
+__docformat__ = "restructuredtext"
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+from . import version
+
+#: Maximum size of the cache directory in bytes.
+max_size = 2**30
+
+# Changed when the format of the entries changes
+_CACHE_VERSION = 1
+_SUFFIX = '.mtgcache'
+
+
+def cache_dir(directory=None):
+    ''' Directory of the cache (created if needed).
+
+    :Parameters:
+        - `directory` (str) - the directory, or None for the default one.
+    '''
+    if directory is None:
+        directory = os.environ.get('OPENALEA_MTG_CACHE')
+    if directory is None:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        directory = os.path.join(base, 'openalea.mtg')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def cache_key(fn, **options):
+    ''' Key of the entry of the file `fn` parsed with `options`. '''
+    h = hashlib.sha256()
+    h.update(repr((_CACHE_VERSION, version.__version__, sorted(options.items()))).encode('utf-8'))
+    with open(fn, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _entry(directory, key):
+    return os.path.join(directory, key + _SUFFIX)
+
+
+def load(directory, key):
+    ''' The MTG stored under `key`, or None if it is not in the cache. '''
+    path = _entry(directory, key)
+    try:
+        with open(path, 'rb') as f:
+            g = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # incomplete or incompatible entry
+        _remove(path)
+        return None
+    try:
+        # most recently used
+        os.utime(path)
+    except OSError:
+        pass
+    return g
+
+
+def store(directory, key, g):
+    ''' Store the MTG `g` under `key` and evict the old entries. '''
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(g, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, _entry(directory, key))
+    except BaseException:
+        _remove(tmp)
+        raise
+    evict(directory)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _entries(directory):
+    entries = []
+    for name in os.listdir(directory):
+        if name.endswith(_SUFFIX):
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+
+def evict(directory, size=None):
+    ''' Remove the least recently used entries until the size of the cache
+    is at most `size` (:data:`max_size` by default).
+    '''
+    if size is None:
+        size = max_size
+    entries = sorted(_entries(directory))
+    total = sum(e[1] for e in entries)
+    for _, entry_size, path in entries:
+        if total <= size:
+            break
+        _remove(path)
+        total -= entry_size
+
+
+def clear_cache(directory=None):
+    ''' Remove all the entries of the cache. '''
+    evict(cache_dir(directory), 0)
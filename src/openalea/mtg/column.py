@@ -0,0 +1,595 @@
+# -*- python -*-
+#
+#       OpenAlea.mtg
+#
+#       Copyright 2008-2026 INRIA - CIRAD - INRA
+#
+#       File author(s): Christophe Pradal <christophe.pradal.at.cirad.fr>
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+################################################################################
+'''
+Typed, columnar storage of the properties of a tree or an MTG.
+
+A :class:`Column` behaves like the dict `{vid: value}` used for the other
+properties, but stores the values in a numpy array (int64 or float64)
+indexed by the vertex id, with a boolean mask telling which vertices are
+defined. A value costs 9 bytes instead of a boxed Python object and a dict
+slot, and the whole column can be used directly in vectorized computations.
+
+:Usage:
+
+.. code-block:: python
+
+    g.add_property('length', dtype='REAL')
+    length = g.property('length')
+    length[vid] = 2.5
+    vids, values = length.arrays()
+
+or, when reading an MTG file:
+
+.. code-block:: python
+
+    g = read_mtg_file('plant.mtg', typed_properties=True)
+'''
+
+__docformat__ = "restructuredtext"
+
+import re
+import string
+import sys
+from collections.abc import Mapping, MutableMapping
+
+import numpy as np
+
+# MTG feature types that can be stored in a Column
+dtypes = {'INT': np.int64, 'REAL': np.float64}
+
+
+def column_dtype(dtype):
+    ''' Return the numpy dtype of a column from a MTG feature type
+    ('INT' or 'REAL') or a numpy dtype.
+    '''
+    try:
+        dtype = np.dtype(dtypes.get(dtype, dtype))
+    except TypeError:
+        dtype = None
+    if dtype is None or dtype.kind not in 'iuf':
+        raise ValueError('Column type has to be a number type, not %s'%(dtype,))
+    return dtype
+
+
+class Column(MutableMapping):
+    ''' A dict-like property whose values are stored in a typed numpy array.
+
+    The keys are vertex ids (i.e. non negative integers).
+    Values that cannot be stored in the array without loss (e.g. strings,
+    lists of a dynamic MTG, floats in an INT column or any value of a key
+    which is not a vertex id) are kept in an ordinary dict, so that the
+    column can be used as a dict in all the existing code.
+
+    The values of a REAL column are returned as Python floats,
+    those of an INT column as Python ints.
+    '''
+
+    def __init__(self, dtype, items=None):
+        '''
+        :Parameters:
+            - `dtype` - 'INT', 'REAL' or a numpy number type
+            - `items` - a dict or a sequence of (vid, value) to insert
+        '''
+        self._dtype = column_dtype(dtype)
+        self._values = np.zeros(0, dtype=self._dtype)
+        self._mask = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._objects = {}
+        if items:
+            self.update(items)
+
+    @classmethod
+    def from_arrays(cls, values, mask, overflow=None):
+        ''' Create a column from its arrays, which are not copied.
+
+        :Parameters:
+            - `values` - array of values indexed by vertex id
+            - `mask` - boolean array, True where the value is defined
+            - `overflow` - dict of the values which are not in the array
+        '''
+        column = cls(values.dtype)
+        column._values = values
+        column._mask = mask
+        column._size = int(np.count_nonzero(mask))
+        column._objects = dict(overflow) if overflow else {}
+        return column
+
+    @property
+    def dtype(self):
+        ''' The numpy dtype of the values. '''
+        return self._dtype
+
+    def _fits(self, value):
+        if isinstance(value, (bool, np.bool_)):
+            return False
+        if self._dtype.kind == 'f':
+            return isinstance(value, (int, float, np.integer, np.floating))
+        if isinstance(value, (int, np.integer)):
+            info = np.iinfo(self._dtype)
+            return info.min <= value <= info.max
+        return False
+
+    def _reserve(self, n):
+        capacity = len(self._mask)
+        if n > capacity:
+            capacity = max(n, 2*capacity, 16)
+            values = np.zeros(capacity, dtype=self._dtype)
+            mask = np.zeros(capacity, dtype=bool)
+            values[:len(self._values)] = self._values
+            mask[:len(self._mask)] = self._mask
+            self._values, self._mask = values, mask
+
+    #########################################################################
+    # Mapping interface
+    #########################################################################
+
+    def __getitem__(self, vid):
+        try:
+            if vid >= 0 and self._mask[vid]:
+                return self._values.item(vid)
+        except (IndexError, TypeError):
+            pass
+        return self._objects[vid]
+
+    def get(self, vid, default=None):
+        try:
+            if vid >= 0 and self._mask[vid]:
+                return self._values.item(vid)
+        except (IndexError, TypeError):
+            pass
+        return self._objects.get(vid, default)
+
+    def __contains__(self, vid):
+        try:
+            if vid >= 0 and self._mask[vid]:
+                return True
+        except (IndexError, TypeError):
+            pass
+        return vid in self._objects
+
+    def __setitem__(self, vid, value):
+        if isinstance(vid, (int, np.integer)) and vid >= 0 and self._fits(value):
+            self._reserve(vid+1)
+            if not self._mask[vid]:
+                self._mask[vid] = True
+                self._size += 1
+                self._objects.pop(vid, None)
+            self._values[vid] = value
+        else:
+            if vid in self:
+                del self[vid]
+            self._objects[vid] = value
+
+    def __delitem__(self, vid):
+        try:
+            if vid >= 0 and self._mask[vid]:
+                self._mask[vid] = False
+                self._values[vid] = 0
+                self._size -= 1
+                return
+        except (IndexError, TypeError):
+            pass
+        del self._objects[vid]
+
+    def __iter__(self):
+        for vid in np.flatnonzero(self._mask).tolist():
+            yield vid
+        for vid in list(self._objects):
+            yield vid
+
+    def __len__(self):
+        return self._size + len(self._objects)
+
+    def clear(self):
+        self._values = np.zeros(0, dtype=self._dtype)
+        self._mask = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._objects.clear()
+
+    def copy(self):
+        ''' Return a copy of the column. '''
+        column = Column(self._dtype)
+        column._values = self._values.copy()
+        column._mask = self._mask.copy()
+        column._size = self._size
+        column._objects = dict(self._objects)
+        return column
+
+    def __reduce__(self):
+        # pickled without the spare capacity of the arrays
+        n = int(np.flatnonzero(self._mask)[-1]) + 1 if self._size else 0
+        return _column, (self._values[:n], self._mask[:n], self._objects)
+
+    def __repr__(self):
+        return 'Column(%s, %r)'%(self._dtype.name, dict(self.items()))
+
+    #########################################################################
+    # Array interface
+    #########################################################################
+
+    @property
+    def array(self):
+        ''' Read-only view on the array of values indexed by vertex id.
+
+        Only the values where :attr:`mask` is True are defined.
+        '''
+        array = self._values.view()
+        array.flags.writeable = False
+        return array
+
+    @property
+    def mask(self):
+        ''' Read-only view on the validity mask indexed by vertex id. '''
+        mask = self._mask.view()
+        mask.flags.writeable = False
+        return mask
+
+    @property
+    def overflow(self):
+        ''' Dict of the values which are not stored in the array. '''
+        return self._objects
+
+    def arrays(self):
+        ''' Return the vertex ids and the values stored in the array.
+
+        :Returns:
+            - `(vids, values)` - two numpy arrays sorted by vertex id
+        '''
+        vids = np.flatnonzero(self._mask)
+        return vids, self._values[vids]
+
+    def take(self, vids, default=None):
+        ''' Return the values of a sequence of vertices as a numpy array.
+
+        :Parameters:
+            - `vids` - a sequence of vertex ids
+            - `default` - value of the undefined vertices
+              (NaN for REAL columns and 0 for INT columns if None)
+
+        :Returns:
+            - a numpy array aligned with `vids`.
+        '''
+        vids = np.asarray(vids, dtype=np.int64)
+        if default is None:
+            default = np.nan if self._dtype.kind == 'f' else 0
+        n = len(self._mask)
+        valid = (vids >= 0) & (vids < n)
+        valid[valid] = self._mask[vids[valid]]
+        result = np.full(len(vids), default, dtype=np.result_type(self._dtype, np.asarray(default)))
+        result[valid] = self._values[vids[valid]]
+        return result
+
+
+def _column(values, mask, overflow):
+    # the arrays of an out-of-band pickle buffer may be read-only
+    if not values.flags.writeable:
+        values, mask = values.copy(), mask.copy()
+    return Column.from_arrays(values, mask, overflow)
+
+
+class StringColumn(Mapping):
+    ''' A read-only dict-like property of strings stored as integer codes.
+
+    `codes[vid]` is the position of the value of `vid` in the table of the
+    distinct strings, or -1 if `vid` has no value. It is used to store
+    labels, edge types and other string properties in
+    :func:`~openalea.mtg.binary.save_binary` files.
+    '''
+
+    def __init__(self, codes, strings, overflow=None):
+        '''
+        :Parameters:
+            - `codes` - integer array indexed by vertex id
+            - `strings` - sequence of the distinct strings
+            - `overflow` - dict of the values which are not coded
+        '''
+        self._codes = codes
+        self._strings = strings
+        self._objects = dict(overflow) if overflow else {}
+        self._size = None
+
+    @property
+    def codes(self):
+        ''' The array of codes indexed by vertex id (-1 if undefined). '''
+        return self._codes
+
+    @property
+    def strings(self):
+        ''' The table of the distinct strings. '''
+        return self._strings
+
+    @property
+    def overflow(self):
+        ''' Dict of the values which are not coded. '''
+        return self._objects
+
+    def __getitem__(self, vid):
+        try:
+            if vid >= 0:
+                code = self._codes[vid]
+                if code >= 0:
+                    return self._strings[code]
+        except (IndexError, TypeError):
+            pass
+        return self._objects[vid]
+
+    def get(self, vid, default=None):
+        try:
+            return self[vid]
+        except KeyError:
+            return default
+
+    def __contains__(self, vid):
+        try:
+            if vid >= 0 and self._codes[vid] >= 0:
+                return True
+        except (IndexError, TypeError):
+            pass
+        return vid in self._objects
+
+    def __iter__(self):
+        for vid in np.flatnonzero(np.asarray(self._codes) >= 0).tolist():
+            yield vid
+        for vid in list(self._objects):
+            yield vid
+
+    def __len__(self):
+        if self._size is None:
+            self._size = int(np.count_nonzero(np.asarray(self._codes) >= 0))
+        return self._size + len(self._objects)
+
+    def copy(self):
+        ''' Return a dict with the same items. '''
+        return dict(self.items())
+
+    def __repr__(self):
+        return 'StringColumn(%r)'%(dict(self.items()),)
+
+
+def _loaded(values):
+    return values
+
+
+class LazyColumn(MutableMapping):
+    ''' A property whose values are computed the first time they are used.
+
+    `load` is a function without argument returning the values (a dict or
+    a :class:`Column`). It is called on the first access to the property,
+    then the LazyColumn behaves like the returned mapping (the other
+    attributes, e.g. :meth:`Column.take`, are forwarded to it).
+
+    It is used by :func:`~openalea.mtg.io.read_mtg` to parse the features
+    of an MTG file only when they are needed.
+    '''
+
+    def __init__(self, load):
+        self._load = load
+        self._values = None
+
+    @property
+    def loaded(self):
+        ''' True if the values have been computed. '''
+        return self._values is not None
+
+    @property
+    def values_mapping(self):
+        ''' The mapping of the values (computed if needed). '''
+        if self._values is None:
+            self._values = self._load()
+            self._load = None
+        return self._values
+
+    def __getitem__(self, vid):
+        return self.values_mapping[vid]
+
+    def get(self, vid, default=None):
+        return self.values_mapping.get(vid, default)
+
+    def __contains__(self, vid):
+        return vid in self.values_mapping
+
+    def __setitem__(self, vid, value):
+        self.values_mapping[vid] = value
+
+    def __delitem__(self, vid):
+        del self.values_mapping[vid]
+
+    def __iter__(self):
+        return iter(self.values_mapping)
+
+    def __len__(self):
+        return len(self.values_mapping)
+
+    def keys(self):
+        return self.values_mapping.keys()
+
+    def items(self):
+        return self.values_mapping.items()
+
+    def values(self):
+        return self.values_mapping.values()
+
+    def copy(self):
+        ''' Return a copy of the values. '''
+        return self.values_mapping.copy()
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name in ('_load', '_values'):
+            raise AttributeError(name)
+        return getattr(self.values_mapping, name)
+
+    def __reduce__(self):
+        # pickled as the computed values
+        return _loaded, (self.values_mapping,)
+
+    def __repr__(self):
+        if self._values is None:
+            return 'LazyColumn(<not loaded>)'
+        return 'LazyColumn(%r)'%(self._values,)
+
+
+_letters = string.ascii_letters
+_class_pattern = re.compile(r'[a-zA-Z]+')
+_index_pattern = re.compile(r'[0-9]+$')
+
+
+def split_label(label):
+    ''' Split a label into its class and its index.
+
+    :Returns:
+        - `(class_name, index)` - the class is '' and the index is None
+          if they are not defined. The index is a string.
+    '''
+    if not label:
+        return '', None
+    if isinstance(label, str) and label.isascii():
+        # fast path for the usual labels: letters followed by digits
+        index = label.lstrip(_letters)
+        if len(index) < len(label) and (not index or index.isdigit()):
+            return sys.intern(label[:len(label)-len(index)]), (index or None)
+    m = _class_pattern.match(label)
+    class_name = sys.intern(m.group(0)) if m else ''
+    m = _index_pattern.search(label)
+    return class_name, (m.group(0) if m else None)
+
+
+class LabelColumn(dict):
+    ''' The dict of the labels of an MTG.
+
+    It keeps up to date, on each write of a label, the class and the index
+    of the vertices (see :func:`split_label`) and the set of vertices of each
+    class. So :meth:`~openalea.mtg.mtg.MTG.class_name` and
+    :meth:`~openalea.mtg.mtg.MTG.index` do not parse the label at each call.
+    '''
+
+    def __init__(self, *args, **kwds):
+        dict.__init__(self)
+        self._classes = {}
+        self._indices = {}
+        self._class_vertices = {}
+        self.update(*args, **kwds)
+
+    def _add(self, vid, label):
+        if isinstance(label, str) and label:
+            class_name, index = split_label(label)
+            self._classes[vid] = class_name
+            self._indices[vid] = index
+            if class_name:
+                self._class_vertices.setdefault(class_name, {})[vid] = None
+
+    def _discard(self, vid):
+        class_name = self._classes.pop(vid, None)
+        if class_name is not None:
+            del self._indices[vid]
+            vertices = self._class_vertices.get(class_name)
+            if vertices is not None:
+                vertices.pop(vid, None)
+                if not vertices:
+                    del self._class_vertices[class_name]
+
+    #########################################################################
+    # dict interface
+    #########################################################################
+
+    def __setitem__(self, vid, label):
+        if vid in self._classes:
+            self._discard(vid)
+        dict.__setitem__(self, vid, label)
+        self._add(vid, label)
+
+    def __delitem__(self, vid):
+        dict.__delitem__(self, vid)
+        self._discard(vid)
+
+    def update(self, *args, **kwds):
+        for vid, label in dict(*args, **kwds).items():
+            self[vid] = label
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def setdefault(self, vid, label=None):
+        if vid not in self:
+            self[vid] = label
+        return self[vid]
+
+    def pop(self, vid, *default):
+        if vid in self:
+            label = self[vid]
+            del self[vid]
+            return label
+        return dict.pop(self, vid, *default)
+
+    def popitem(self):
+        vid, label = dict.popitem(self)
+        self._discard(vid)
+        return vid, label
+
+    def clear(self):
+        dict.clear(self)
+        self._classes.clear()
+        self._indices.clear()
+        self._class_vertices.clear()
+
+    def copy(self):
+        ''' Return a copy of the labels. '''
+        return LabelColumn(self)
+
+    def __reduce__(self):
+        return LabelColumn, (dict(self),)
+
+    def merge(self, other, offset):
+        ''' Add the labels of `other` (a LabelColumn) with their vertex ids
+        shifted by `offset`, without parsing them again.
+
+        The root (0) is shared: its label is not shifted.
+        '''
+        if 0 in other:
+            self[0] = other[0]
+        shift = lambda d: dict((v+offset, x) for v, x in d.items() if v)
+        dict.update(self, shift(other))
+        self._classes.update(shift(other._classes))
+        self._indices.update(shift(other._indices))
+        for class_name, vids in other._class_vertices.items():
+            self._class_vertices.setdefault(class_name, {}).update(
+                (v+offset, None) for v in vids if v)
+
+    #########################################################################
+    # Derived columns
+    #########################################################################
+
+    def class_name(self, vid):
+        ''' Class of the label of `vid` ('' if not defined). '''
+        try:
+            return self._classes[vid]
+        except KeyError:
+            return split_label(self.get(vid))[0]
+
+    def index(self, vid):
+        ''' Index of the label of `vid` (a string), or None if not defined. '''
+        try:
+            return self._indices[vid]
+        except KeyError:
+            return split_label(self.get(vid))[1]
+
+    def class_vertices(self, class_name):
+        ''' Vertices whose label is of the class `class_name`. '''
+        return self._class_vertices.get(class_name, {})
+
+    def class_names(self):
+        ''' Classes of the labels. '''
+        return self._class_vertices.keys()
@@ -0,0 +1,174 @@
+# -*- python -*-
+#
+#       OpenAlea.mtg
+#
+#       Copyright 2008-2026 INRIA - CIRAD - INRA
+#
+#       File author(s): Christophe Pradal <christophe.pradal.at.cirad.fr>
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+################################################################################
+'''
+Transparent access to compressed files.
+
+:func:`open_file` opens a file name or a file object compressed with gzip,
+bz2, xz or zstd. The data is decompressed (or compressed) as a stream, the
+whole content is never in memory at once.
+
+The compression is given by the extension of the file name (`.gz`,
+`.bz2`, `.xz`, `.zst`) when writing, and by the first bytes of the data
+when reading.
+
+.. note:: zstd requires `zstandard` (or Python 3.14).
+'''
+
+__docformat__ = "restructuredtext"
+
+import io
+import os
+from contextlib import contextmanager
+
+# magic bytes of the compressed data
+_magic = [('gzip', b'\x1f\x8b'),
+          ('bz2', b'BZh'),
+          ('xz', b'\xfd7zXZ\x00'),
+          ('zstd', b'\x28\xb5\x2f\xfd')]
+
+_extensions = {'.gz': 'gzip', '.gzip': 'gzip',
+               '.bz2': 'bz2',
+               '.xz': 'xz', '.lzma': 'xz',
+               '.zst': 'zstd', '.zstd': 'zstd'}
+
+compressions = ('gzip', 'bz2', 'xz', 'zstd')
+
+
+def compression_of(fn=None, head=None):
+    ''' Compression of a file, from its name or from its first bytes.
+
+    :Parameters:
+        - `fn` (str) - name of the file
+        - `head` (bytes) - first bytes of the data (at least 6)
+
+    :Returns: 'gzip', 'bz2', 'xz', 'zstd' or None if not compressed.
+    '''
+    if head is not None:
+        for compression, magic in _magic:
+            if head.startswith(magic):
+                return compression
+        return None
+    if fn is not None:
+        return _extensions.get(os.path.splitext(str(fn))[1].lower())
+    return None
+
+
+def _zstd_stream(raw, mode):
+    try:
+        from compression import zstd
+        return zstd.ZstdFile(raw, mode)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstandard required for zstd compressed files")
+    if mode == 'rb':
+        # buffered for readline, iteration and (forward) seek
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=False))
+    return zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+
+
+def _stream(raw, compression, mode):
+    ''' Compressed stream over the binary file object `raw`. '''
+    if compression == 'gzip':
+        import gzip
+        return gzip.GzipFile(fileobj=raw, mode=mode)
+    elif compression == 'bz2':
+        import bz2
+        return bz2.BZ2File(raw, mode)
+    elif compression == 'xz':
+        import lzma
+        return lzma.LZMAFile(raw, mode)
+    elif compression == 'zstd':
+        return _zstd_stream(raw, mode)
+    raise ValueError('Unknown compression %r (one of %s)'%(compression, ', '.join(compressions)))
+
+
+def _head(f):
+    ''' First bytes of a binary file object, without consuming them. '''
+    if hasattr(f, 'peek'):
+        return f.peek(6)[:6]
+    if f.seekable():
+        position = f.tell()
+        head = f.read(6)
+        f.seek(position)
+        return head
+    return None
+
+
+@contextmanager
+def open_file(f, mode='r', compression='infer', encoding=None):
+    ''' Open a file which may be compressed.
+
+    :Parameters:
+        - `f` - a file name or a file object. A file object in text mode is
+          used as is. The other file objects are not closed on exit.
+        - `mode` (str) - 'r', 'w' (text) or 'rb', 'wb' (binary).
+        - `compression` (str) - 'infer' (from the first bytes when reading,
+          from the extension of the file name when writing), None, or one of
+          'gzip', 'bz2', 'xz', 'zstd'.
+        - `encoding` (str) - encoding of the text (text mode only).
+
+    :Returns: a context manager giving the (decompressed) file object.
+
+    :Example:
+
+    .. code-block:: python
+
+        with open_file('orchard.mtg.gz') as f:
+            g = read_mtg(f)
+
+    '''
+    if mode not in ('r', 'w', 'rb', 'wb'):
+        raise ValueError('Invalid mode %r'%(mode,))
+    binary_mode = mode[0] + 'b'
+
+    if not isinstance(f, (str, bytes, os.PathLike)):
+        if isinstance(f, io.TextIOBase):
+            if 'b' in mode:
+                raise ValueError('A binary file object is required')
+            yield f
+            return
+        owned, raw = False, f
+    else:
+        owned, raw = True, open(f, binary_mode)
+        if compression == 'infer' and mode[0] == 'w':
+            compression = compression_of(fn=f)
+
+    streams = []
+    try:
+        if compression == 'infer':
+            head = _head(raw)
+            compression = compression_of(head=head) if head is not None else None
+        stream = raw
+        if compression:
+            stream = _stream(raw, compression, binary_mode)
+            streams.append(stream)
+        if 'b' not in mode:
+            stream = io.TextIOWrapper(stream, encoding=encoding)
+            streams.append(stream)
+        yield stream
+    finally:
+        for stream in reversed(streams):
+            if isinstance(stream, io.TextIOWrapper) and stream.buffer is raw and not owned:
+                # do not close the file object of the caller
+                stream.flush()
+                stream.detach()
+            else:
+                stream.close()
+        if owned:
+            raw.close()
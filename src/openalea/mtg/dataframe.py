@@ -1,20 +1,620 @@
 """ Dataframe implementation
 
+Conversion of MTGs to and from pandas dataframes, arrays, Apache Arrow
+tables and Parquet files.
+
+An Arrow table has one row per vertex and the columns:
+
+    - `vid`, `parent`, `complex` (the explicit complex, null when the
+      complex of the vertex is the complex of its parent) and `scale`
+      which define the topology,
+    - `plant`: the root of the tree at scale 1 which contains the vertex,
+    - one column per property (`edge_type`, `label`, ...).
+
+The rows are sorted by plant, then by vertex id.
+
+.. note:: The Arrow functions require `pyarrow`.
 """
 
+import pickle
+
+import numpy as np
 import pandas as pd
-from .algo import orders
+from .algo import topology_metrics
+from .column import Column, LabelColumn
+from .mtg import MTG, fat_mtg as _fat_mtg
+
+# Name of the topological columns of an Arrow table
+_topology = ('vid', 'parent', 'complex', 'scale', 'plant')
+
+# Field metadata of the columns of pickled values
+_PICKLE = {b'openalea.mtg': b'pickle'}
+
+
+# Columns computed by :func:`~openalea.mtg.algo.topology_metrics`
+_metrics = ('order', 'height', 'rank', 'decomposition_depth',
+            'subtree_size', 'nb_leaves')
+
+# String properties exported as categoricals
+_categoricals = ('label', 'edge_type')
+
+
+def _tree_columns(g, vids):
+    ''' Compute the complex, order and height of `vids` (and of the other
+    vertices of their scales) in one traversal of the tree graph of each scale.
+    '''
+    parent = g._parent
+    children = g._children
+    explicit = g._complex
+    edge_type = g._properties.get('edge_type', {})
+
+    complex, order, height = {}, {}, {}
+    stack = [v for v in vids if parent.get(v) is None]
+    for v in stack:
+        complex[v] = explicit.get(v)
+        order[v] = 1 if edge_type.get(v) == '+' else 0
+        height[v] = 0
+    while stack:
+        v = stack.pop()
+        c, o, h = complex[v], order[v], height[v]+1
+        for child in children.get(v, ()):
+            complex[child] = explicit.get(child, c)
+            order[child] = o+1 if edge_type.get(child) == '+' else o
+            height[child] = h
+            stack.append(child)
+    return dict(complex=complex, order=order, height=height)
+
+
+def _nullable_int(values):
+    ''' Int64 (nullable) array from a list of int or None. '''
+    return pd.array(values, dtype='Int64')
+
+
+def _property_column(p, vids, categorical=False):
+    ''' Values of the property `p` for `vids`, as an array. '''
+    if isinstance(p, Column) and not p.overflow:
+        values = p.take(vids)
+        if p.dtype.kind == 'f':
+            return values
+        mask = p.mask
+        rows = np.asarray(vids, dtype=np.int64)
+        valid = rows < len(mask)
+        valid[valid] = mask[rows[valid]]
+        return values if valid.all() else pd.arrays.IntegerArray(values, ~valid)
+
+    values = list(map(p.get, vids))
+    if categorical:
+        return pd.Categorical(values)
+    if pd.api.types.infer_dtype(values, skipna=True) == 'integer':
+        try:
+            return _nullable_int(values)
+        except (OverflowError, TypeError):
+            pass
+    return pd.Series(values, dtype=object).infer_objects().array
+
+
+def to_dataframe(g, scale=None, properties=None,
+                 include=('parent', 'complex', 'scale', 'order')):
+    ''' Export the vertices of an MTG and their properties in a dataframe.
+
+    Each column is built from one array: the properties are not copied in
+    an intermediate dict and the MTG is not modified.
+
+    :Parameters:
+        - `g` (MTG)
+        - `scale` (int) - scale of the exported vertices (default: all)
+        - `properties` (list) - names of the exported properties
+          (default: all)
+        - `include` (list) - computed columns to add, among 'parent',
+          'complex', 'scale' and the topological metrics of
+          :func:`~openalea.mtg.algo.topology_metrics` ('order', 'height',
+          'rank', ...).
+
+    :Returns:
+        a `pandas.DataFrame` indexed by vertex id (sorted). `label` and
+        `edge_type` are categoricals, vertex ids (`parent`, `complex`) and
+        integer properties with missing values are nullable integers.
+        The names of the computed metrics are in `df.attrs['computed']`.
+
+    .. seealso:: :func:`from_dataframe`
+
+    :Example:
+
+    .. code-block:: python
+
+        df = to_dataframe(g, scale=3, properties=['length'],
+                          include=('order', 'height'))
+    '''
+    vids = sorted(g.vertices(scale=-1 if scale is None else scale))
+
+    if properties is None:
+        properties = g.property_names()
+    columns = {}
+    for name in properties:
+        columns[name] = _property_column(g._properties[name], vids,
+                                         categorical=name in _categoricals)
+
+    tree, metrics = None, None
+    for name in include:
+        if name == 'parent':
+            parent = g._parent
+            columns[name] = _nullable_int([parent.get(v) for v in vids])
+        elif name in ('complex', 'order', 'height'):
+            if tree is None:
+                tree = _tree_columns(g, vids)
+            values = [tree[name][v] for v in vids]
+            columns[name] = _nullable_int(values) if name == 'complex' else np.array(values, dtype=np.int64)
+        elif name == 'scale':
+            scales = g._scale
+            columns[name] = np.fromiter((scales[v] for v in vids), dtype=np.int64, count=len(vids))
+        elif name in _metrics:
+            if metrics is None:
+                metrics = topology_metrics(g, scale=scale)
+                rows = np.zeros(max(vids, default=0)+1, dtype=np.int64)
+                rows[metrics['vid']] = np.arange(len(metrics['vid']))
+                rows = rows[vids]
+            columns[name] = metrics[name][rows]
+        else:
+            raise ValueError('Unknown column %s: use one of %s'%(name, ('parent', 'complex', 'scale')+_metrics))
+
+    df = pd.DataFrame(columns, index=pd.Index(vids, dtype=np.int64))
+    df.attrs['computed'] = [name for name in include if name in _metrics]
+    return df
+
+
+def _property(values, vids, valid_vids, typed):
+    ''' Build a property from values aligned with `vids`. '''
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'iuf':
+        if isinstance(values, np.ma.MaskedArray):
+            valid = ~np.ma.getmaskarray(values)
+            values = values.data
+        elif values.dtype.kind == 'f':
+            valid = ~np.isnan(values)
+        else:
+            valid = np.ones(len(values), dtype=bool)
+        if typed:
+            size = int(valid_vids.max())+1 if len(valid_vids) else 0
+            array = np.zeros(size, dtype=np.float64 if values.dtype.kind == 'f' else np.int64)
+            mask = np.zeros(size, dtype=bool)
+            array[valid_vids[valid]] = values[valid]
+            mask[valid_vids[valid]] = True
+            return Column.from_arrays(array, mask)
+        return dict(zip(valid_vids[valid].tolist(), values[valid].tolist()))
+
+    if isinstance(values, np.ndarray):
+        values = values.tolist()
+    return dict((v, x) for v, x in zip(vids, values)
+                if x is not None and not (type(x) is float and x != x))
+
+
+def from_arrays(vids, parents, complexes, scales, properties=None,
+                fat_mtg=False, check=True, typed_properties=False):
+    ''' Build an MTG in bulk from aligned arrays.
+
+    The vertex 0 is the root of the MTG: it is created if it is not in
+    `vids`. Children and components are added in the order of the rows.
+
+    :Parameters:
+        - `vids` - vertex ids
+        - `parents` - parent of each vertex (-1 if none)
+        - `complexes` - complex of each vertex (-1 if none). It may be the
+          complex of all the vertices or only the explicit ones: the complex
+          of a vertex is stored when it differs from the complex of its parent.
+        - `scales` - scale of each vertex
+        - `properties` (dict) - name -> values aligned with `vids`. None or
+          NaN values (and masked values of numpy masked arrays) are missing.
+        - `fat_mtg` (bool) - compute the missing edges at coarser scales
+          (see :func:`~openalea.mtg.mtg.fat_mtg`)
+        - `check` (bool) - check the consistency of the topology
+        - `typed_properties` (bool) - store numeric arrays as
+          :class:`~openalea.mtg.column.Column`
+
+    :Returns:
+        an MTG
+
+    :Raises:
+        ValueError if the topology is not consistent.
+
+    .. seealso:: :func:`from_dataframe`
+    '''
+    vid = np.asarray(vids, dtype=np.int64)
+    parent = np.asarray(parents, dtype=np.int64)
+    complex = np.asarray(complexes, dtype=np.int64)
+    scale = np.asarray(scales, dtype=np.int64)
+    n = len(vid)
+    if not (len(parent) == len(complex) == len(scale) == n):
+        raise ValueError('vids, parents, complexes and scales have different lengths')
+
+    g = MTG()
+    root = g.root
+    if root not in vid:
+        all_vid = np.append(vid, root)
+        parent = np.append(parent, -1)
+        complex = np.append(complex, -1)
+        scale = np.append(scale, 0)
+    else:
+        all_vid = vid
+
+    order = np.argsort(all_vid, kind='stable')
+    sorted_vid = all_vid[order]
+
+    def position(ids):
+        ''' Row of each id, -1 if it is not a vertex. '''
+        i = np.searchsorted(sorted_vid, ids)
+        i[i == len(sorted_vid)] = 0
+        return np.where(sorted_vid[i] == ids, order[i], -1)
+
+    has_parent = parent >= 0
+    has_complex = complex >= 0
+    parent_row = position(parent)
+    complex_row = position(complex)
+
+    if check:
+        def error(mask, msg):
+            i = np.flatnonzero(mask)
+            if len(i):
+                i = i[0]
+                raise ValueError(msg%dict(vid=all_vid[i], parent=parent[i], complex=complex[i]))
+
+        duplicated = sorted_vid[1:][sorted_vid[1:] == sorted_vid[:-1]]
+        if len(duplicated):
+            raise ValueError('Duplicated vertex id %d'%duplicated[0])
+        error(all_vid < 0, 'Invalid vertex id %(vid)d')
+        error(scale[all_vid == root] != 0, 'The root %(vid)d must be at scale 0')
+        error(has_parent & (parent_row < 0), 'The parent %(parent)d of vertex %(vid)d is not a vertex')
+        error(has_complex & (complex_row < 0), 'The complex %(complex)d of vertex %(vid)d is not a vertex')
+        error(has_parent & (scale[parent_row] != scale), 'Vertex %(vid)d and its parent %(parent)d have different scales')
+        error(has_complex & (scale[complex_row] != scale - 1), 'Vertex %(vid)d is not at the scale below its complex %(complex)d')
+        error(~has_parent & ~has_complex & (all_vid != root), 'Vertex %(vid)d has neither parent nor complex')
+
+    explicit = has_complex & (~has_parent | (complex != complex[parent_row]))
+
+    vid_list = all_vid.tolist()
+    g._scale = dict(zip(vid_list, scale.tolist()))
+    g._build_scale_index()
+
+    _parent = g._parent
+    _children = g._children
+    for v, p in zip(all_vid[has_parent].tolist(), parent[has_parent].tolist()):
+        _parent[v] = p
+        _children.setdefault(p, []).append(v)
+    _complex = g._complex
+    _components = g._components
+    for v, c in zip(all_vid[explicit].tolist(), complex[explicit].tolist()):
+        _complex[v] = c
+        _components.setdefault(c, []).append(v)
+    g._id = max(vid_list)
+
+    if check:
+        # Each vertex is reachable from a vertex without parent
+        stack = [v for v in vid_list if v not in _parent or _parent[v] is None]
+        nb = 0
+        while stack:
+            v = stack.pop()
+            nb += 1
+            stack.extend(_children.get(v, ()))
+        if nb != len(vid_list):
+            raise ValueError('The parent relation contains a cycle')
+
+    vids = vid.tolist()
+    for name, values in (properties or {}).items():
+        if len(values) != n:
+            raise ValueError('The values of %s are not aligned with the vertices'%(name,))
+        p = _property(values, vids, vid, typed_properties)
+        if name == 'label':
+            p = LabelColumn(p)
+        g._properties[name] = p
+
+    g._topology_changed()
+    if fat_mtg:
+        g = _fat_mtg(g)
+    return g
+
+
+def _series_values(s):
+    ''' Values of a pandas Series for :func:`from_arrays`. '''
+    dtype = s.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        categories = s.cat.categories.tolist()
+        return [categories[c] if c >= 0 else None for c in s.cat.codes.tolist()]
+    if isinstance(dtype, np.dtype) and dtype.kind in 'iuf':
+        return s.to_numpy()
+    if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+        # nullable integers and floats
+        missing = s.isna().to_numpy()
+        return np.ma.masked_array(s.to_numpy(dtype=dtype.numpy_dtype, na_value=0), mask=missing)
+    values = s.tolist()
+    for i in np.flatnonzero(s.isna().to_numpy()).tolist():
+        values[i] = None
+    return values
+
+
+def _series_ids(s):
+    return s.fillna(-1).to_numpy(dtype=np.int64)
+
+
+def from_dataframe(df, fat_mtg=False, check=True, typed_properties=False):
+    ''' Build an MTG from a dataframe with one row per vertex.
+
+    The dataframe has the layout of :func:`to_dataframe`: the vertex ids are
+    the index (or a `vid` column), the topology is defined by the `parent`,
+    `complex` and `scale` columns and the other columns are properties,
+    except the computed metrics listed in `df.attrs['computed']`.
+
+    :Parameters:
+        - `df` (pandas.DataFrame)
+        - `fat_mtg`, `check`, `typed_properties` - see :func:`from_arrays`
+
+    :Returns:
+        an MTG
+
+    :Example:
+
+    .. code-block:: python
+
+        df = to_dataframe(g)
+        g2 = from_dataframe(df)
+
+    .. seealso:: :func:`to_dataframe`, :func:`from_arrays`
+    '''
+    if 'scale' not in df.columns:
+        raise ValueError('The dataframe has no scale column')
+    vids = df['vid'] if 'vid' in df.columns else df.index.to_series()
+    n = len(df)
+
+    def ids(name):
+        return _series_ids(df[name]) if name in df.columns else np.full(n, -1, dtype=np.int64)
+
+    reserved = ('vid', 'parent', 'complex', 'scale') + tuple(df.attrs.get('computed', ()))
+    properties = dict((name, _series_values(df[name])) for name in df.columns if name not in reserved)
+
+    return from_arrays(vids.to_numpy(dtype=np.int64), ids('parent'), ids('complex'),
+                       df['scale'].to_numpy(dtype=np.int64), properties=properties,
+                       fat_mtg=fat_mtg, check=check, typed_properties=typed_properties)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("pyarrow required for Arrow and Parquet conversions")
+    return pyarrow
+
+
+def _plants(g, vids):
+    ''' Returns the id of the plant (root of a tree at scale 1) containing
+    each vertex.
+    '''
+    plant = {}
+    scale = g._scale
+    parent = g._parent
+
+    def plant_of(v):
+        path = []
+        while v not in plant:
+            s = scale[v]
+            if s == 0:
+                plant[v] = None
+            elif s == 1 and parent.get(v) is None:
+                plant[v] = v
+            else:
+                path.append(v)
+                v = parent[v] if s == 1 else g.complex(v)
+        p = plant[v]
+        for v in path:
+            plant[v] = p
+        return p
+
+    return [plant_of(v) for v in vids]
+
+
+def _int_array(pa, values):
+    ''' Nullable int64 array from a list of int or None. '''
+    return pa.array(values, type=pa.int64())
+
+
+def _property_array(pa, p, vids):
+    values = [p.get(v) for v in vids]
+    try:
+        array = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        # Mixed types: pickle the values
+        array = pa.array([None if x is None else pickle.dumps(x) for x in values],
+                         type=pa.binary())
+        return array, _PICKLE
+    if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+        array = array.dictionary_encode()
+    return array, None
+
+
+def _pylist(pa, array):
+    ''' Fast conversion of an Arrow array into a list (None for nulls). '''
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    t = array.type
+    if pa.types.is_dictionary(t):
+        strings = array.dictionary.to_pylist()
+        return [None if i is None else strings[i] for i in _pylist(pa, array.indices)]
+    if pa.types.is_integer(t) or pa.types.is_floating(t):
+        if not array.null_count:
+            return array.to_numpy().tolist()
+        values = array.fill_null(0).to_numpy().tolist()
+        for i in np.flatnonzero(array.is_null().to_numpy(zero_copy_only=False)).tolist():
+            values[i] = None
+        return values
+    return array.to_pylist()
+
+
+def _arrow_values(pa, array, pickled=False):
+    ''' Values of an Arrow column for :func:`from_arrays`. '''
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    t = array.type
+    if pa.types.is_integer(t) or pa.types.is_floating(t):
+        # NaN are values, nulls are missing
+        missing = array.is_null().to_numpy(zero_copy_only=False)
+        values = array.fill_null(0).to_numpy()
+        return np.ma.masked_array(values, mask=missing)
+    values = _pylist(pa, array)
+    if pickled:
+        values = [None if x is None else pickle.loads(x) for x in values]
+    return values
+
+
+def to_arrow(g, scales=None, columns=None):
+    ''' Convert an MTG into an Arrow table.
+
+    :Parameters:
+        - `g` (MTG)
+        - `scales` (list) - scales of the vertices to export (default: all).
+        - `columns` (list) - names of the properties to export
+          (default: all).
+
+    :Returns:
+        a `pyarrow.Table`. Property columns are typed by `pyarrow`,
+        string columns are dictionary encoded and the columns of mixed
+        types contain the pickled values.
+
+    .. seealso:: :func:`from_arrow`, :func:`write_parquet`
+    '''
+    pa = _pyarrow()
+
+    vids = list(g.vertices()) if scales is None else [v for s in scales for v in g.vertices(scale=s)]
+    plants = _plants(g, vids)
+    order = np.lexsort((np.array(vids, dtype=np.int64),
+                        np.array([-1 if p is None else p for p in plants], dtype=np.int64)))
+    vids = [vids[i] for i in order.tolist()]
+    plants = [plants[i] for i in order.tolist()]
+
+    parent = g._parent
+    complex = g._complex
+    scale = g._scale
+    arrays = [pa.array(vids, type=pa.int64()),
+              _int_array(pa, [parent.get(v) for v in vids]),
+              _int_array(pa, [complex.get(v) for v in vids]),
+              pa.array([scale[v] for v in vids], type=pa.int32()),
+              _int_array(pa, plants)]
+    fields = [pa.field(name, a.type) for name, a in zip(_topology, arrays)]
+
+    if columns is None:
+        columns = [name for name in g.property_names() if name not in _topology]
+    for name in columns:
+        if name in _topology:
+            raise ValueError('%s is a reserved column name'%(name,))
+        array, metadata = _property_array(pa, g.property(name), vids)
+        arrays.append(array)
+        fields.append(pa.field(name, array.type, metadata=metadata))
+
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+
+def from_arrow(table):
+    ''' Build an MTG from an Arrow table.
+
+    The table must contain the complex of each vertex, i.e. all the scales
+    coarser than the ones of its vertices. Children and components are
+    added in the order of the rows.
+
+    :Parameters:
+        - `table` (pyarrow.Table) - a table created by :func:`to_arrow`
+          (or with the same columns).
+
+    :Returns:
+        an MTG
+
+    :Raises:
+        ValueError if the topology is not consistent (see :func:`from_arrays`).
+
+    .. seealso:: :func:`to_arrow`, :func:`read_parquet`
+    '''
+    pa = _pyarrow()
+
+    def ids(name):
+        array = table.column(name).combine_chunks()
+        return array.fill_null(-1).to_numpy().astype(np.int64)
+
+    vids = ids('vid')
+    # The parents of the plants which are not in the table are ignored
+    parents = ids('parent')
+    parents[~np.isin(parents, vids)] = -1
+
+    properties = {}
+    for field in table.schema:
+        if field.name not in _topology:
+            properties[field.name] = _arrow_values(pa, table.column(field.name),
+                                                   field.metadata == _PICKLE)
+
+    return from_arrays(vids, parents, ids('complex'), ids('scale'),
+                       properties=properties, check=True)
+
+
+def write_parquet(g, path, scales=None, columns=None, row_group_size=65536):
+    ''' Write an MTG in a Parquet file.
+
+    Each row group contains whole plants so that :func:`read_parquet` only
+    reads the row groups of the selected plants.
+
+    :Parameters:
+        - `g` (MTG)
+        - `path` (str) - name of the file
+        - `scales`, `columns` - see :func:`to_arrow`
+        - `row_group_size` (int) - minimum number of rows of a row group
+          (except the last one).
+
+    .. seealso:: :func:`read_parquet`
+    '''
+    _pyarrow()
+    import pyarrow.parquet as pq
+
+    table = to_arrow(g, scales=scales, columns=columns)
+    plants = table.column('plant').to_numpy(zero_copy_only=False)
+    # Row indices where a plant starts
+    starts = np.flatnonzero(np.concatenate(([True], plants[1:] != plants[:-1]))).tolist()
+    starts.append(len(table))
+
+    with pq.ParquetWriter(path, table.schema) as writer:
+        begin = 0
+        for end in starts[1:]:
+            if end - begin >= row_group_size or end == len(table):
+                writer.write_table(table.slice(begin, end - begin), row_group_size=end - begin)
+                begin = end
+
+
+def read_parquet(path, columns=None, plants=None, scales=None):
+    ''' Read an MTG from a Parquet file written by :func:`write_parquet`.
+
+    Only the requested columns and the row groups of the selected plants
+    are read.
+
+    :Parameters:
+        - `path` (str) - name of the file
+        - `columns` (list) - names of the properties to read (default: all)
+        - `plants` (list) - ids of the plants to read (default: all)
+        - `scales` (list) - scales to read (default: all). The coarser
+          scales of the selected ones must be read.
+
+    :Returns:
+        an MTG
+
+    :Example:
+
+    .. code-block:: python
+
+        write_parquet(g, 'orchard.parquet')
+        g2 = read_parquet('orchard.parquet', columns=['label'], plants=[1, 12])
 
-def to_dataframe(g):
-    d=g.properties()
-    parents = g._parent
-    complexes = {vid: g.complex(vid) for vid in g if g.complex(vid)}
-    scales = g._scale
+    .. seealso:: :func:`write_parquet`, :func:`from_arrow`
+    '''
+    _pyarrow()
+    import pyarrow.parquet as pq
 
-    d['parent']=parents
-    d['complex'] = complexes
-    d['scale']=scales
-    d['order']=orders(g)
-    dataframe = pd.DataFrame.from_dict(d)
-    return dataframe
+    if columns is not None:
+        columns = list(_topology) + [name for name in columns if name not in _topology]
+    filters = []
+    if plants is not None:
+        filters.append(('plant', 'in', list(plants)))
+    if scales is not None:
+        filters.append(('scale', 'in', list(scales)))
 
+    table = pq.read_table(path, columns=columns, filters=filters or None)
+    return from_arrow(table)
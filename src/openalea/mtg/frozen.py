@@ -0,0 +1,590 @@
+# -*- python -*-
+#
+#       OpenAlea.mtg
+#
+#       Copyright 2008-2026 INRIA - CIRAD - INRA
+#
+#       File author(s): Christophe Pradal <christophe.pradal.at.cirad.fr>
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+################################################################################
+'''
+Read-only, array based implementation of a Multiscale Tree Graph.
+
+A :class:`FrozenMTG` is built from an :class:`~openalea.mtg.mtg.MTG` with
+:meth:`MTG.freeze <openalea.mtg.mtg.MTG.freeze>` and turned back into an
+editable MTG with :meth:`FrozenMTG.thaw`.
+
+The topology is stored in dense integer arrays indexed by the vertex id:
+
+    - `scale[vid]`: scale of the vertex (-1 if `vid` is not a vertex),
+    - `parent[vid]`: parent of the vertex (-1 if None),
+    - `complex[vid]`: complex of the vertex, implicit complexes being resolved (-1 if None),
+
+and the children and the (explicit) components are stored as CSR arrays
+(an `offsets` array and a flat array of vertex ids).
+'''
+
+__docformat__ = "restructuredtext"
+
+from collections.abc import Mapping
+from itertools import chain
+from types import MappingProxyType
+
+import numpy as np
+
+from . import traversal
+from .column import Column, LabelColumn
+from .mtg import MTG
+from .tree import PropertyTree
+
+# Value stored in the parent array for vertices without entry in MTG._parent.
+_NO_PARENT_ENTRY = -2
+
+
+def _vid_dtype(n):
+    return np.int32 if n < 2**31 else np.int64
+
+
+def _csr(lists, n, dtype):
+    """ Build CSR arrays (offsets, values) from a dict vid -> list of vids.
+    """
+    keys = sorted(k for k, l in lists.items() if l and 0 <= k < n)
+    counts = np.zeros(n, dtype=dtype)
+    counts[keys] = [len(lists[k]) for k in keys]
+    offsets = np.zeros(n+1, dtype=dtype)
+    np.cumsum(counts, out=offsets[1:])
+    values = np.fromiter(chain.from_iterable(lists[k] for k in keys),
+                         dtype=dtype, count=int(offsets[-1]))
+    return offsets, values
+
+
+def _copy_property(p):
+    """ Copy a property, keeping typed and label columns. """
+    if isinstance(p, (Column, LabelColumn)):
+        return p.copy()
+    return dict(p)
+
+
+class _ExplicitComplex(Mapping):
+    """ Read-only view on the explicit complexes (`MTG._complex`).
+    """
+    def __init__(self, g):
+        self._g = g
+
+    def __getitem__(self, vid):
+        g = self._g
+        try:
+            if vid >= 0 and g._explicit_mv[vid]:
+                return g._complex_mv[vid]
+        except (IndexError, TypeError):
+            pass
+        raise KeyError(vid)
+
+    def __iter__(self):
+        return iter(np.flatnonzero(self._g._explicit).tolist())
+
+    def __len__(self):
+        return int(np.count_nonzero(self._g._explicit))
+
+
+class _ExplicitComponents(Mapping):
+    """ Read-only view on the explicit components (`MTG._components`).
+    """
+    def __init__(self, g):
+        self._g = g
+
+    def __getitem__(self, vid):
+        g = self._g
+        try:
+            begin, end = g._component_offsets_mv[vid], g._component_offsets_mv[vid+1]
+        except (IndexError, TypeError):
+            raise KeyError(vid)
+        if begin == end or vid < 0:
+            raise KeyError(vid)
+        return g._components_mv[begin:end].tolist()
+
+    def __iter__(self):
+        return iter(np.flatnonzero(np.diff(self._g._component_offsets)).tolist())
+
+    def __len__(self):
+        return int(np.count_nonzero(np.diff(self._g._component_offsets)))
+
+
+class FrozenMTG(object):
+    ''' A read-only Multiscale Tree Graph stored in integer arrays.
+
+    A FrozenMTG provides the read API of :class:`~openalea.mtg.mtg.MTG`
+    (topology, properties, AML-like methods) and can be used with the
+    functions of :mod:`~openalea.mtg.traversal` and :mod:`~openalea.mtg.algo`.
+    It uses far less memory than an MTG and its topological queries do not
+    rely on hashing. It can not be edited: use :meth:`thaw` to get back an MTG.
+
+    :Usage:
+
+    .. code-block:: python
+
+        g = MTG('my_mtg.mtg')
+        fg = g.freeze()
+        for vid in traversal.iter_mtg2(fg, fg.root):
+            print(fg.label(vid), fg.complex(vid))
+        g1 = fg.thaw()
+
+    .. seealso:: :meth:`MTG.freeze <openalea.mtg.mtg.MTG.freeze>`
+    '''
+
+    def __init__(self, root, vertices, scale, parent, complex, explicit,
+                 child_offsets, children, component_offsets, components,
+                 properties=None, graph_properties=None, max_id=None):
+        ''' Create a FrozenMTG from its arrays.
+
+        Use :meth:`MTG.freeze <openalea.mtg.mtg.MTG.freeze>` or :meth:`from_mtg`
+        instead of calling the constructor directly.
+
+        :Parameters:
+            - `root` (int) - the root of the MTG
+            - `vertices` (array) - the vertex ids in their insertion order
+            - `scale`, `parent`, `complex` (arrays) - dense arrays indexed by vid
+            - `explicit` (bool array) - True for vertices with an explicit complex
+            - `child_offsets`, `children` (arrays) - CSR storage of the children
+            - `component_offsets`, `components` (arrays) - CSR storage of the explicit components
+            - `properties` (dict) - property name -> dict(vid -> value)
+            - `graph_properties` (dict)
+            - `max_id` (int) - the last vertex id generated by the MTG
+        '''
+        self._root = root
+        self._vertices = vertices
+        self._scale_array = scale
+        self._parent_array = parent
+        self._complex_array = complex
+        self._explicit = explicit
+        self._child_offsets = child_offsets
+        self._child_array = children
+        self._component_offsets = component_offsets
+        self._component_array = components
+        self._properties = properties if properties is not None else {}
+        self._graph_properties = graph_properties if graph_properties is not None else {}
+        self._id = max_id if max_id is not None else int(vertices.max())
+        self.verbose = False
+        # The topology never changes: cached indices are always valid
+        self._caches = {}
+
+        # Vertices sorted by scale
+        vertex_scale = scale[vertices]
+        order = np.argsort(vertex_scale, kind='stable')
+        self._scale_vertices = vertices[order]
+        self._scale_offsets = np.zeros(int(vertex_scale.max())+2, dtype=np.int64)
+        np.cumsum(np.bincount(vertex_scale), out=self._scale_offsets[1:])
+
+        # memoryviews return python ints and are faster than numpy scalars.
+        self._scale_mv = memoryview(scale)
+        self._parent_mv = memoryview(parent)
+        self._complex_mv = memoryview(complex)
+        self._explicit_mv = memoryview(explicit)
+        self._child_offsets_mv = memoryview(child_offsets)
+        self._children_mv = memoryview(children)
+        self._component_offsets_mv = memoryview(component_offsets)
+        self._components_mv = memoryview(components)
+
+        # Read-only views on the explicit decomposition, as in MTG
+        self._complex = _ExplicitComplex(self)
+        self._components = _ExplicitComponents(self)
+
+        self._property_views = dict((name, MappingProxyType(p))
+                                    for name, p in self._properties.items())
+
+    @classmethod
+    def from_mtg(cls, g, copy_properties=True):
+        ''' Build a FrozenMTG from an MTG.
+
+        Properties are copied, so later edits of `g` are not visible
+        in the returned FrozenMTG.
+
+        :Parameters:
+            - `g` (MTG)
+            - `copy_properties` (bool) - if False, the properties of `g` are
+              shared (for a temporary FrozenMTG)
+
+        :Returns:
+            a FrozenMTG
+        '''
+        nb = len(g._scale)
+        vertices = np.fromiter(g._scale.keys(), dtype=np.int64, count=nb)
+        n = int(vertices.max())+1
+        dtype = _vid_dtype(n)
+        vertices = vertices.astype(dtype)
+
+        scale = np.full(n, -1, dtype=dtype)
+        scale[vertices] = np.fromiter(g._scale.values(), dtype=dtype, count=nb)
+
+        parent = np.full(n, _NO_PARENT_ENTRY, dtype=dtype)
+        vids = [v for v in g._parent if v < n]
+        parent[vids] = [-1 if g._parent[v] is None else g._parent[v] for v in vids]
+
+        # explicit complexes
+        complex = np.full(n, -1, dtype=dtype)
+        explicit = np.zeros(n, dtype=np.bool_)
+        vids = [v for v, c in g._complex.items() if c is not None and v < n]
+        complex[vids] = [g._complex[v] for v in vids]
+        explicit[vids] = True
+
+        child_offsets, children = _csr(g._children, n, dtype)
+        component_offsets, components = _csr(g._components, n, dtype)
+
+        # resolve the implicit complexes: complex(v) = complex(parent(v))
+        resolved = explicit.copy()
+        resolved[g.root] = True
+        _complex = complex.tolist()
+        _parent = parent.tolist()
+        _resolved = resolved.tolist()
+        for vid in vertices.tolist():
+            if _resolved[vid]:
+                continue
+            path = []
+            v = vid
+            while v >= 0 and not _resolved[v]:
+                path.append(v)
+                v = _parent[v]
+            cid = _complex[v] if v >= 0 else -1
+            for v in path:
+                _complex[v] = cid
+                _resolved[v] = True
+        complex[:] = _complex
+
+        if copy_properties:
+            properties = dict((name, _copy_property(p)) for name, p in g._properties.items())
+        else:
+            properties = dict(g._properties)
+
+        return cls(g.root, vertices, scale, parent, complex, explicit,
+                   child_offsets, children, component_offsets, components,
+                   properties=properties,
+                   graph_properties=dict(g._graph_properties),
+                   max_id=g._id)
+
+    def freeze(self):
+        ''' Return the FrozenMTG itself. '''
+        return self
+
+    def __reduce__(self):
+        # pickled as its arrays: the views and caches are rebuilt
+        return (FrozenMTG, (self._root, self._vertices, self._scale_array, self._parent_array,
+                            self._complex_array, self._explicit, self._child_offsets,
+                            self._child_array, self._component_offsets, self._component_array,
+                            self._properties, self._graph_properties, self._id))
+
+    def thaw(self):
+        ''' Return an editable :class:`~openalea.mtg.mtg.MTG` equal to this one.
+
+        :Returns:
+            a new MTG
+        '''
+        g = MTG()
+        vertices = self._vertices.tolist()
+        scale = self._scale_array.tolist()
+        parent = self._parent_array.tolist()
+        complex = self._complex_array.tolist()
+
+        g._root = self._root
+        g._id = self._id
+        g._scale = dict((v, scale[v]) for v in vertices)
+        g._build_scale_index()
+        g._parent = dict((v, None if parent[v] == -1 else parent[v])
+                         for v in vertices if parent[v] != _NO_PARENT_ENTRY)
+        g._children = dict(self._iter_csr(self._child_offsets, self._child_array))
+        g._complex = dict((v, complex[v]) for v in np.flatnonzero(self._explicit).tolist())
+        g._components = dict(self._iter_csr(self._component_offsets, self._component_array))
+        g._properties = dict((name, _copy_property(p)) for name, p in self._properties.items())
+        if 'label' in g._properties and not isinstance(g._properties['label'], LabelColumn):
+            g._properties['label'] = LabelColumn(g._properties['label'])
+        g._graph_properties = dict(self._graph_properties)
+        return g
+
+    @staticmethod
+    def _iter_csr(offsets, values):
+        values = values.tolist()
+        offsets = offsets.tolist()
+        for vid in np.flatnonzero(np.diff(offsets)).tolist():
+            yield vid, values[offsets[vid]:offsets[vid+1]]
+
+    def __str__(self):
+        return "FrozenMTG : nb_vertices=%d, nb_scales=%d"%(self.nb_vertices(), self.nb_scales())
+
+    def __getitem__(self, vtx_id):
+        if self.has_vertex(vtx_id):
+            d = self.get_vertex_property(vtx_id)
+            d.update({"vid":vtx_id,
+                      "index":self.index(vtx_id),
+                      "complex":self.complex(vtx_id),
+                      "parent":self.parent(vtx_id),
+                      "scale":self.scale(vtx_id)})
+        else:
+            raise IndexError('MTG index out of range')
+        return d
+
+    #########################################################################
+    # Vertices and scales
+    #########################################################################
+
+    @property
+    def root(self):
+        ''' The root of the MTG. '''
+        return self._root
+
+    def __len__(self):
+        return len(self._vertices)
+
+    def __iter__(self):
+        return self.vertices_iter()
+
+    def __contains__(self, vid):
+        return self.has_vertex(vid)
+
+    def has_vertex(self, vid):
+        ''' Tests whether a vertex belongs to the graph. '''
+        return self.scale(vid) is not None
+
+    def scale(self, vid):
+        ''' Returns the scale of a vertex or None if `vid` is not a vertex. '''
+        try:
+            s = self._scale_mv[vid]
+        except (IndexError, TypeError):
+            return None
+        return s if s >= 0 and vid >= 0 else None
+
+    def nb_scales(self):
+        ''' Returns the number of scales. '''
+        return int(np.count_nonzero(np.diff(self._scale_offsets)))
+
+    def scales_iter(self):
+        ''' Iterator on the scale identifiers. '''
+        return iter(self.scales())
+
+    def scales(self):
+        ''' List of the scale identifiers. '''
+        return np.flatnonzero(np.diff(self._scale_offsets)).tolist()
+
+    def max_scale(self):
+        ''' Returns the max scale identifier. '''
+        return len(self._scale_offsets)-2
+
+    def nb_vertices(self, scale=-1):
+        ''' Returns the number of vertices at `scale` or of the MTG if scale < 0. '''
+        if scale < 0:
+            return len(self._vertices)
+        if scale > self.max_scale():
+            return 0
+        return int(self._scale_offsets[scale+1]-self._scale_offsets[scale])
+
+    def vertices_iter(self, scale=-1):
+        ''' Iterator on the vertices at `scale` or on all the vertices if scale < 0. '''
+        return iter(self.vertices(scale))
+
+    def vertices(self, scale=-1):
+        ''' List of the vertices at `scale` or of all the vertices if scale < 0. '''
+        if scale < 0:
+            return self._vertices.tolist()
+        if scale > self.max_scale():
+            return []
+        return self._scale_vertices[self._scale_offsets[scale]:self._scale_offsets[scale+1]].tolist()
+
+    def roots_iter(self, scale=0):
+        ''' Iterator on the roots of the tree graphs at a given scale. '''
+        parent = self._parent_mv
+        return (vid for vid in self.vertices_iter(scale) if parent[vid] < 0)
+
+    def roots(self, scale=0):
+        ''' List of the roots of the tree graphs at a given scale. '''
+        return list(self.roots_iter(scale=scale))
+
+    def iter_edges(self, scale=-1):
+        ''' Iterator on the edges (parent, child) at a given scale or on all edges. '''
+        parent = self._parent_mv
+        for vid in self.vertices_iter(scale):
+            p = parent[vid]
+            if p >= 0:
+                yield p, vid
+            elif p == -1 and scale < 0:
+                yield None, vid
+
+    def edges(self, scale=-1):
+        ''' List of the edges at a given scale or of all the edges. '''
+        return list(self.iter_edges(scale=scale))
+
+    #########################################################################
+    # Tree concept
+    #########################################################################
+
+    def parent(self, vtx_id):
+        ''' Return the parent of `vtx_id` (None for roots). '''
+        try:
+            p = self._parent_mv[vtx_id]
+        except (IndexError, TypeError):
+            return None
+        return p if p >= 0 and vtx_id >= 0 else None
+
+    def children_iter(self, vtx_id):
+        ''' Iterator on the children of `vtx_id`. '''
+        return iter(self.children(vtx_id))
+
+    def children(self, vtx_id):
+        ''' List of the children of `vtx_id`. '''
+        offsets = self._child_offsets_mv
+        try:
+            if vtx_id >= 0:
+                return self._children_mv[offsets[vtx_id]:offsets[vtx_id+1]].tolist()
+        except (IndexError, TypeError):
+            pass
+        return []
+
+    def nb_children(self, vtx_id):
+        ''' Number of children of `vtx_id`. '''
+        offsets = self._child_offsets_mv
+        try:
+            if vtx_id >= 0:
+                return offsets[vtx_id+1]-offsets[vtx_id]
+        except (IndexError, TypeError):
+            pass
+        return 0
+
+    def is_leaf(self, vtx_id):
+        ''' Test if `vtx_id` is a leaf. '''
+        return self.nb_children(vtx_id) == 0
+
+    def siblings_iter(self, vtx_id):
+        ''' Iterator on the siblings of `vtx_id` (`vtx_id` excluded). '''
+        parent = self.parent(vtx_id)
+        if parent is None:
+            return iter([])
+        return (vid for vid in self.children(parent) if vid != vtx_id)
+
+    def siblings(self, vtx_id):
+        ''' List of the siblings of `vtx_id` (`vtx_id` excluded). '''
+        return list(self.siblings_iter(vtx_id))
+
+    def nb_siblings(self, vtx_id):
+        ''' Number of siblings of `vtx_id`. '''
+        n = self.nb_children(self.parent(vtx_id))
+        return n-1 if n > 0 else 0
+
+    #########################################################################
+    # Multiscale concept
+    #########################################################################
+
+    def complex(self, vtx_id):
+        ''' Returns the complex of `vtx_id` (None for the MTG root). '''
+        try:
+            c = self._complex_mv[vtx_id]
+        except (IndexError, TypeError):
+            return None
+        return c if c >= 0 and vtx_id >= 0 else None
+
+    def complex_at_scale(self, vtx_id, scale):
+        ''' Returns the complex of `vtx_id` at scale `scale`. '''
+        complex_id = vtx_id
+        current_scale = self.scale(complex_id)
+        for i in range(scale, current_scale):
+            complex_id = self.complex(complex_id)
+        return complex_id
+
+    def component_roots_iter(self, vtx_id):
+        ''' Iterator on the roots of the tree graphs that compose a vertex. '''
+        offsets = self._component_offsets_mv
+        try:
+            if vtx_id < 0:
+                return
+            components = self._components_mv[offsets[vtx_id]:offsets[vtx_id+1]].tolist()
+        except (IndexError, TypeError):
+            return
+        parent, complex = self._parent_mv, self._complex_mv
+        for ci in components:
+            p = parent[ci]
+            if p < 0 or complex[p] != vtx_id:
+                yield ci
+
+    def components_iter(self, vid):
+        ''' Iterator on the components of `vid`. '''
+        for v in self.component_roots_iter(vid):
+            for vtx in traversal.pre_order2(self, v, complex=vid):
+                yield vtx
+
+    def components(self, vid):
+        ''' List of the components of `vid`. '''
+        return list(self.components_iter(vid))
+
+    nb_components = MTG.nb_components
+    components_at_scale_iter = MTG.components_at_scale_iter
+    components_at_scale = MTG.components_at_scale
+    component_roots = MTG.component_roots
+    component_roots_at_scale_iter = MTG.component_roots_at_scale_iter
+    component_roots_at_scale = MTG.component_roots_at_scale
+
+    #########################################################################
+    # Properties
+    #########################################################################
+
+    def property_names(self):
+        ''' Names of all the properties. '''
+        return list(self._properties.keys())
+
+    def property_names_iter(self):
+        ''' Iterator on the names of all the properties. '''
+        return iter(self._properties.keys())
+
+    def property(self, name):
+        ''' Returns a read-only map between the vid and the data. '''
+        return self._property_views.get(name, MappingProxyType({}))
+
+    def properties(self):
+        ''' Returns all the property maps (read-only). '''
+        return dict(self._property_views)
+
+    def graph_properties(self):
+        ''' Returns the graph properties. '''
+        return MappingProxyType(self._graph_properties)
+
+    get_vertex_property = PropertyTree.get_vertex_property
+
+    edge_type = MTG.edge_type
+    label = MTG.label
+    class_name = MTG.class_name
+    index = MTG.index
+    class_vertices = MTG.class_vertices
+    order = MTG.order
+
+    #########################################################################
+    # Compatibility with AML
+    #########################################################################
+
+    VtxList = MTG.VtxList
+    Label = label
+    Class = class_name
+    Index = index
+    Scale = scale
+    ClassScale = MTG.ClassScale
+    EdgeType = MTG.EdgeType
+    Defined = MTG.Defined
+    Rank = MTG.Rank
+    Height = MTG.Height
+    AlgOrder = MTG.AlgOrder
+    AlgRank = MTG.AlgRank
+    AlgHeight = MTG.AlgHeight
+    Father = MTG.Father
+    Successor = MTG.Successor
+    Predecessor = MTG.Predecessor
+    Root = MTG.Root
+    Complex = MTG.Complex
+    Sons = MTG.Sons
+    Ancestors = MTG.Ancestors
+    Descendants = MTG.Descendants
+    Extremities = MTG.Extremities
+    Components = MTG.Components
+    ComponentRoots = MTG.ComponentRoots
+    Path = MTG.Path
+    Axis = MTG.Axis
+    Trunk = MTG.Trunk
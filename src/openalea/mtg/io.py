@@ -15,13 +15,20 @@
 ################################################################################
 """This module provides functions to read / write mtg data structure."""
 
+import io
+import os
 import re
+from functools import partial
+from io import StringIO
 from string import Template
 from warnings import warn
 
 
 from .mtg import *
 from .traversal import iter_mtg, iter_mtg_with_filter
+from .column import Column, LabelColumn, LazyColumn, dtypes, split_label
+from .binary import save_binary, load_binary, share_mtg, attach_mtg
+from .compress import open_file
 
 try:
     from openalea.core.logger import get_logger, logging
@@ -88,56 +95,110 @@ def replace_date(s, format):
 
     return re.sub(rawstr, change_date, s)
 
-def multiscale_edit(s, symbol_at_scale = {}, class_type={}, has_date = False, mtg=None):
-    """Construction of an MTG from a string.
+_feature_types = dict([('INT', int), ('REAL', float), ('ALPHA', str), ('DD/MM/YY', str), ('DD/MM/YYYY', str), ('STRING', str)])
+_letters = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
 
-    :Parameters:
 
-    - `s`: The string representing the MTG.
-    - `symbol_at_scale`: A dict containing the scale for each symbol name.
+def _split_name(name):
+    """ Split a name made of letters followed by digits (e.g. 'U12')
+    into its label, index and class ('U12', '12', 'U').
 
-    :Optional parameters:
+    Return None for the other names, which are parsed with
+    :func:`get_label`, :func:`get_index` and :func:`get_name`.
+    """
+    if name.isascii() and name.isalnum():
+        index = name.lstrip(_letters)
+        if len(index) < len(name) and (not index or index.isdigit()):
+            return name, index, name[:len(name)-len(index)]
 
-    - `class_type`: A dict containing the type of the properties.
-	- `has_date`: Is the MTG is a Dynamic MTG?
-	- `mtg`: An existing MTG
 
+def _date_format(class_type):
+    if 'DD/MM/YY' in list(class_type.values()):
+        return 'DD/MM/YY'
+    else:
+        return 'DD/MM/YYYY'
 
 
-    :Return:
+class MultiscaleBuilder(object):
+    """ Build an MTG node by node, as they are read in the MTG code.
 
-        MTG object
+    A node is given by its tag (the edge type '/', '+', '<', '<<', '\\\\',
+    the brackets '[' and ']', or '*' for the time dependent properties of
+    a dynamic MTG), its name (e.g. 'U1') and its features, a list of
+    (name, value) pairs which are converted to the feature types.
 
+    This is the engine of :func:`multiscale_edit` and of :class:`Reader`,
+    which feeds it line by line without building an intermediate string.
     """
-    def get_properties(name,vid=None, time=False):
-        _type = dict([('INT', int), ('REAL', float), ('ALPHA', str), ('DD/MM/YY', str), ('DD/MM/YYYY', str), ('STRING', str)])
+
+    def __init__(self, symbol_at_scale={}, class_type={}, has_date=False, mtg=None,
+                 typed_properties=False):
+        self.symbol_at_scale = symbol_at_scale
+        self.class_type = class_type
+        self.has_date = has_date
+        self.implicit_scale = bool(symbol_at_scale)
+
+        if debug:
+            log(list(symbol_at_scale.keys()))
+
+        self.mtg = mtg = mtg if mtg else MTG()
+
+        self.vid = mtg.root # vid of the support tree, i.e. at the finest scale
+        self.current_vertex = mtg.root
+        self.branching_stack = []
+        # complex of the new vertices (MTG.complex walks up the axes)
+        self._complexes = {}
+
+        if not self.implicit_scale:
+            self.symbols = ['/', '\\', '[', ']', '+', '<', '<<']
+            pattern = r'(?=[/\\\[\]+])|(?<!<)(?=<)'
+        else:
+            self.symbols = ['/', '[', ']', '+', '<', '<<']
+            # do not consider the date format
+            classes = sorted(symbol_at_scale, key=len, reverse=True)
+            pattern = r'(?=[\[\]+])|(?<!<)(?=<)|(?=/(?:%s))'%'|'.join(map(re.escape, classes))
+        self._split = re.compile(pattern).split
+
+        self.pending_edge = '' # edge type for the next edge to be created
+        self.scale = 0
+
+        # 2. add some properties to the MTG
+        mtg.add_property('index')
+        for k in class_type:
+            if typed_properties and class_type[k] in dtypes:
+                mtg.add_property(k, dtype=class_type[k])
+            else:
+                mtg.add_property(k)
+
+    def get_properties(self, name, features=None, time=False, parsed=None):
         args = {}
-        l = name.strip().split('(')
         if not time:
-            label = get_label(name)
-            index = get_index(label)
+            if parsed:
+                label, index = parsed[0], parsed[1]
+            else:
+                label = get_label(name)
+                index = get_index(label)
             if index.isdigit():
                 args['index'] = int(index)
             args['label'] = label
-        if len(l) > 1:
-            arg_string = l[1].strip()[:-1]
-            if arg_string:
-                ln = arg_string.split(',')
-                for arg in ln:
-                    k, v = arg.split('=')
-                    klass = _type[class_type[k]]
-                    try:
-                        args[k] = klass(v)
-                    except:
-                        if vid is not None:
-                            if k =='_line':
-                                continue
-                            print('Args ', v, 'of vertex ', vid, 'of type ', k, 'is not of type ', str(klass))
-                        else:
-                            print('Args ', v, 'of type ', k, 'is not of type ', str(klass))
+        if features:
+            vid = self.vid
+            class_type = self.class_type
+            for k, v in features:
+                klass = _feature_types[class_type[k]]
+                try:
+                    args[k] = klass(v)
+                except:
+                    if vid is not None:
+                        if k =='_line':
+                            continue
+                        print('Args ', v, 'of vertex ', vid, 'of type ', k, 'is not of type ', str(klass))
+                    else:
+                        print('Args ', v, 'of type ', k, 'is not of type ', str(klass))
         return args
 
-    def add_dynamic_properties(mtg, vid, args):
+    def add_dynamic_properties(self, vid, args):
+        mtg = self.mtg
         if mtg.verbose:
             log("Existing properties at ", vid, " ", mtg.get_vertex_property(vid))
             log("New property: ", args)
@@ -165,40 +226,200 @@ def multiscale_edit(s, symbol_at_scale = {}, class_type={}, has_date = False, mt
             else:
                 mtg.property(prop)[vid] = [(new_date, args[prop])]
 
+    def add_line(self, s, features=None):
+        """ Add the nodes of a line of code.
 
+        :Parameters:
+            - `s` (str) - the topological code of the line, e.g. ']+A1/U1<U2'
+            - `features` - the features of the last node of the line.
+              If the line has no node, they are the time dependent
+              properties of the current vertex (dynamic MTG).
+        """
+        if s.endswith('*'):
+            s = s[:-1]
+        nodes = [node for node in self._split(s) if node]
+        if features and (not nodes or nodes[-1] in ('[', ']')):
+            if not self.has_date:
+                raise ValueError('Features without node: %s'%(features,))
+            nodes.append(None)
+        last = len(nodes) - 1
+        for i, node in enumerate(nodes):
+            if node is None:
+                self.add('*', '', features)
+            elif node.startswith('<<'):
+                self.add('<<', node[2:], features if i == last else None)
+            else:
+                self.add(node[0], node[1:], features if i == last else None)
 
-    implicit_scale = bool(symbol_at_scale)
+    def add(self, tag, name, features=None):
+        """ Add a node to the MTG.
 
-    if debug:
-        log(list(symbol_at_scale.keys()))
+        :Parameters:
+            - `tag` (str) - '/', '+', '<', '<<', '\\\\', '[', ']' or '*'
+            - `name` (str) - the label of the node
+            - `features` - list of (name, value) of the node
+        """
+        mtg = self.mtg
 
-    mtg = mtg if mtg else MTG()
+        if tag == '[':
+            self.branching_stack.append(self.vid)
+            return
+        elif tag == ']':
+            vid = self.branching_stack.pop()
+            self.vid = self.current_vertex = vid
+            self.scale = mtg.scale(vid)
+            return
+        elif tag == '*':
+            args = self.get_properties(name, features, time=True)
+            log(self.vid, '*(', args, ')')
+            # CPL Manage Dynamic_MTG
+            self.add_dynamic_properties(self.vid, args)
+            return
 
-    vid = mtg.root # vid of the support tree, i.e. at the finest scale
-    current_vertex = mtg.root
-    branching_stack = []
+        assert tag in self.symbols, tag
 
-    if not implicit_scale:
-        symbols = ['/', '\\', '[', ']', '+', '<', '<<']
-    else:
-        symbols = ['/', '[', ']', '+', '<', '<<']
+        parsed = _split_name(name)
+        if self.class_type:
+            args = self.get_properties(name, features, parsed=parsed)
+        else:
+            if parsed:
+                label, index = parsed[0], parsed[1]
+            else:
+                label = get_label(name)
+                index = get_index(name)
+            args = {'label':label}
+            if index.isdigit():
+                args['index'] = int(index)
 
-    pending_edge = '' # edge type for the next edge to be created
-    scale = 0
+        vid = self.vid
+        current_vertex = self.current_vertex
+        scale = self.scale
+        pending_edge = self.pending_edge
+        complexes = self._complexes
+        get_complex = self._complex
+
+        if self.implicit_scale:
+            symbol_class = parsed[2] if parsed else get_name(name)
+            try:
+                new_scale = self.symbol_at_scale[symbol_class]
+            except:
+                print('NODE ',symbol_class, tag+name, tag, bool(tag=='*'))
+            if tag == '/' and new_scale <= scale:
+                new_scale -= 1
+                pending_edge = '/'
+            while new_scale < scale:
+                scale -= 1
+                current_vertex = get_complex(current_vertex)
 
-    # 2. add some properties to the MTG
-    mtg.add_property('index')
-    for k in class_type:
-        mtg.add_property(k)
+        if tag in ['+', '<']:
+            if mtg.scale(vid) == scale:
+                complex = get_complex(vid)
+                vid = mtg.add_child(vid, edge_type=tag, **args)
+                complexes[vid] = complex
+                current_vertex = vid
+                pending_edge = ''
+            else:
+                complex = get_complex(current_vertex)
+                current_vertex = mtg.add_component(complex, **args)
+                complexes[current_vertex] = complex
+                pending_edge = tag
+        elif tag == '<<':
+            index = args['index']
+            label = args['label']
+            previous_index = mtg.property('index')[current_vertex]
+            pending_edge = ''
+            _args = {}
+            complex = get_complex(vid)
+            for i in range(previous_index+1, index+1):
+                if i == index:
+                    _args = args
+                _args['index'] = i
+                _args['label'] = label.replace(str(index), str(i))
+                vid = mtg.add_child(vid, edge_type='<', **_args)
+                complexes[vid] = complex
+                current_vertex = vid
+        elif tag == '/':
+            if mtg.scale(vid) == scale:
+                complex = vid
+                vid = mtg.add_component(vid, **args)
+                complexes[vid] = complex
+                current_vertex = vid
+                scale += 1
+            elif mtg.scale(vid) > scale:
+                scale += 1
+                component = mtg.add_component(current_vertex, **args)
+                complexes[component] = current_vertex
+                if mtg.scale(vid) == scale and pending_edge != '/':
+                    vid = mtg.add_child(vid,
+                                        child=component,
+                                        edge_type=pending_edge)
+                    assert vid == component
+                    current_vertex = vid
+                else:
+                    current_vertex = component
+                    # two case :
+                    # 1. up and down in scales E+A/U/E
+                    # 2. /P/P
+                    if pending_edge == '/':
+                        vid = current_vertex
+                        scale = mtg.scale(vid)
+            else:
+                vid = mtg.add_component(current_vertex, **args)
+                complexes[vid] = current_vertex
+                current_vertex = vid
+        elif tag == '\\':
+            scale -= 1
+            current_vertex = get_complex(current_vertex)
+
+        self.vid = vid
+        self.current_vertex = current_vertex
+        self.scale = scale
+        self.pending_edge = pending_edge
+
+    def _complex(self, vid):
+        try:
+            return self._complexes[vid]
+        except KeyError:
+            return self.mtg.complex(vid)
+
+    def finish(self):
+        """ Return the MTG once all the nodes have been added. """
+        return fat_mtg(self.mtg)
+
+
+def multiscale_edit(s, symbol_at_scale = {}, class_type={}, has_date = False, mtg=None,
+                    typed_properties=False):
+    """Construction of an MTG from a string.
+
+    :Parameters:
+
+    - `s`: The string representing the MTG.
+    - `symbol_at_scale`: A dict containing the scale for each symbol name.
+
+    :Optional parameters:
+
+    - `class_type`: A dict containing the type of the properties.
+	- `has_date`: Is the MTG is a Dynamic MTG?
+	- `mtg`: An existing MTG
+	- `typed_properties`: Store the INT and REAL properties in typed columns
+	  (see :class:`~openalea.mtg.column.Column`)
+
+
+
+    :Return:
+
+        MTG object
+
+    .. seealso:: :class:`MultiscaleBuilder`
+    """
+    builder = MultiscaleBuilder(symbol_at_scale, class_type, has_date, mtg=mtg,
+                                typed_properties=typed_properties)
+    symbols = builder.symbols
 
     # remove from the date format the /
     if has_date:
         # print('replace all the date format by -')
-        if 'DD/MM/YY' in list(class_type.values()):
-            date_format = 'DD/MM/YY'
-        else:
-            date_format = 'DD/MM/YYYY'
-        s = replace_date(s, date_format)
+        s = replace_date(s, _date_format(class_type))
 
 
     for edge_type in symbols:
@@ -229,93 +450,16 @@ def multiscale_edit(s, symbol_at_scale = {}, class_type={}, has_date = False, mt
             name = node[1:]
             assert tag in symbols, tag
 
-        if tag == '[':
-            branching_stack.append(vid)
-        elif tag == ']':
-            vid = branching_stack.pop()
-            current_vertex = vid
-            scale = mtg.scale(vid)
-        elif tag == '*':
-            args = get_properties(name, vid=vid, time=True)
-            log(vid, '*(', args, ')')
-            # CPL Manage Dynamic_MTG
-            add_dynamic_properties(mtg, vid, args)
-        else:
-            if class_type:
-                args = get_properties(name, vid=vid)
-            else:
-                label = get_label(name)
-                index = get_index(name)
-                args = {'label':label}
-                if index.isdigit():
-                    args['index'] = int(index)
-
-            if implicit_scale:
-                symbol_class = get_name(name)
-                try:
-                    new_scale = symbol_at_scale[symbol_class]
-                except:
-                    print('NODE ',symbol_class, node, tag, bool(tag=='*'))
-                if tag == '/' and new_scale <= scale:
-                    new_scale -= 1
-                    pending_edge = '/'
-                while new_scale < scale:
-                    scale -= 1
-                    current_vertex = mtg.complex(current_vertex)
+        # split the name and the features: U1(a=1,b=2)
+        features = None
+        if '(' in name:
+            name, arg_string = name.strip().split('(')[:2]
+            arg_string = arg_string.strip()[:-1]
+            if arg_string:
+                features = [arg.split('=') for arg in arg_string.split(',')]
+        builder.add(tag, name, features)
 
-            if tag in ['+', '<']:
-                if mtg.scale(vid) == scale:
-                    vid = mtg.add_child(vid, edge_type=tag, **args)
-                    current_vertex = vid
-                    pending_edge = ''
-                else:
-                    complex = mtg.complex(current_vertex)
-                    current_vertex = mtg.add_component(complex, **args)
-                    pending_edge = tag
-            elif tag == '<<':
-                index = args['index']
-                label = args['label']
-                previous_index = mtg.property('index')[current_vertex]
-                pending_edge = ''
-                _args = {}
-                for i in range(previous_index+1, index+1):
-                    if i == index:
-                        _args = args
-                    _args['index'] = i
-                    _args['label'] = label.replace(str(index), str(i))
-                    vid = mtg.add_child(vid, edge_type='<', **_args)
-                    current_vertex = vid
-            elif tag == '/':
-                if mtg.scale(vid) == scale:
-                    vid = mtg.add_component(vid, **args)
-                    current_vertex = vid
-                    scale += 1
-                elif mtg.scale(vid) > scale:
-                    scale += 1
-                    component = mtg.add_component(current_vertex, **args)
-                    if mtg.scale(vid) == scale and pending_edge != '/':
-                        vid = mtg.add_child(vid,
-                                            child=component,
-                                            edge_type=pending_edge)
-                        assert vid == component
-                        current_vertex = vid
-                    else:
-                        current_vertex = component
-                        # two case :
-                        # 1. up and down in scales E+A/U/E
-                        # 2. /P/P
-                        if pending_edge == '/':
-                            vid = current_vertex
-                            scale = mtg.scale(vid)
-                else:
-                    vid = mtg.add_component(current_vertex, **args)
-                    current_vertex = vid
-            elif tag == '\\':
-                scale -= 1
-                current_vertex = mtg.complex(current_vertex)
-
-    mtg = fat_mtg(mtg)
-    return mtg
+    return builder.finish()
 
 def read_lsystem_string( string,
                          symbol_at_scale,
@@ -894,15 +1038,25 @@ class Reader(object):
     The mtg format is composed of a header and the mtg code.
     The header is used to construct and validate the mtg.
     The code contains topology relations and properties.
+
+    `string` is either the content of the file or a file object.
+    The lines are read one by one and the vertices are created as soon as
+    their line is read, so the whole text is never copied in memory.
     """
 
-    def __init__(self, string, has_line_as_param=True, mtg=None, has_date=False, verbose=True):
+    def __init__(self, string, has_line_as_param=True, mtg=None, has_date=False, verbose=True,
+                 typed_properties=False, features=None, lazy=False):
         self.mtg = mtg
 
-        # First implementation.
-        # Do not store 3 time the structure (mtg, txt and lines)
-        self.txt = string
-        self.lines = string.splitlines()
+        # The lines are read one by one, from a string or a file object.
+        # Only the lines of the header are kept (to display the errors).
+        if isinstance(string, str):
+            string = StringIO(string, newline=None)
+        self._line_iter = iter(string)
+        self._nb_lines = 0
+        self._pushed_back = None
+        self._keep_lines = True
+        self.lines = []
 
         # header information
         self._code = ""
@@ -916,6 +1070,11 @@ class Reader(object):
         self.warnings = []
         self.has_line_as_param = has_line_as_param
         self.verbose = verbose
+        self.typed_properties = typed_properties
+
+        # features to parse (all if None), when they are used if lazy
+        self.selected_features = None if features is None else set(features)
+        self.lazy = lazy
 
     def parse(self):
         """ Read the header and parse the code.
@@ -1010,7 +1169,7 @@ class Reader(object):
                     self._symbols[symbol] = int(scale)
 
         if l.startswith('DESCRIPTION'):
-            self._no_line -= 1
+            self._push_back(l)
 
     def description(self):
         """
@@ -1060,7 +1219,7 @@ class Reader(object):
                 self.warnings.append((self._no_line, msg))
 
         if l.startswith('FEATURES'):
-            self._no_line -= 1
+            self._push_back(l)
 
     def features(self):
         """
@@ -1094,24 +1253,39 @@ class Reader(object):
             self._features[name] = _type
 
         if l.startswith('MTG'):
-            self._no_line -= 1
+            self._push_back(l)
         # add _line feature as int
         if self.has_line_as_param:
             self._features['_line'] = 'INT'
 
     def _next_line(self):
-        self._no_line += 1
-        if self._no_line == len(self.lines):
-            self._no_line -= 1
-            return ""
-
-        l = self.lines[self._no_line]
-        l1 = l.strip()
-        if not l1 or l1[0] == '#':
-            return self._next_line()
-        else:
+        """ Return the next line which is neither empty nor a comment,
+        or "" at the end of the file.
+        """
+        if self._pushed_back is not None:
+            self._no_line, l = self._pushed_back
+            self._pushed_back = None
             return l
 
+        for l in self._line_iter:
+            self._nb_lines += 1
+            if l.endswith('\n'):
+                l = l[:-1]
+            if self._keep_lines:
+                self.lines.append(l)
+            l1 = l.strip()
+            if l1 and l1[0] != '#':
+                self._no_line = self._nb_lines - 1
+                return l
+
+        self._no_line = self._nb_lines - 1
+        return ""
+
+    def _push_back(self, l):
+        """ The line `l` will be returned again by the next call to _next_line. """
+        self._pushed_back = (self._no_line, l)
+        self._no_line -= 1
+
     def next_line_iter(self):
         l = self._next_line()
         while l:
@@ -1136,6 +1310,14 @@ class Reader(object):
         """
         Parse the code and populate the MTG.
         """
+        self.code_header()
+        self.build_mtg()
+        self.lazy_features()
+
+    def code_header(self):
+        """
+        Parse the first lines of the code (MTG and ENTITY-CODE).
+        """
         l = self._next_line()
 
         if not l.startswith('MTG'):
@@ -1159,8 +1341,62 @@ class Reader(object):
         nb_cols = len(code_topo.split('\t'))
         self._feature_slice = slice(nb_cols-1, nb_cols-1+self._nb_features)
 
-        self.preprocess_code()
-        self.build_mtg()
+        if self.selected_features is not None:
+            unknown = self.selected_features.difference(self._features)
+            if unknown:
+                raise ValueError('Unknown features: %s'%(', '.join(sorted(unknown)),))
+
+    def plant_chunks(self, nb_chunks):
+        """
+        Read the remaining lines of the code and group the plants in
+        `nb_chunks` chunks of similar size.
+
+        A plant starts with a line beginning with '/' at the first column
+        followed by a class of scale 1 (see :meth:`plant_label`). Without
+        such lines, there is only one chunk.
+
+        :Returns: a list of (number of the first line, lines)
+        """
+        self._keep_lines = False
+        first_line = self._nb_lines
+        lines = list(self._line_iter)
+        self._nb_lines += len(lines)
+
+        starts = [i for i, l in enumerate(lines) if self.plant_label(l) is not None]
+        if not starts or starts[0] != 0:
+            starts.insert(0, 0)
+        size = len(lines) / max(1, nb_chunks)
+
+        chunks = []
+        begin = 0
+        for i in starts[1:]:
+            if i - begin >= size:
+                chunks.append((first_line+begin, lines[begin:i]))
+                begin = i
+        chunks.append((first_line+begin, lines[begin:]))
+        return chunks
+
+    def plant_label(self, line):
+        """ Label of the plant starting at `line`, or None if `line` does not
+        start a plant, i.e. does not begin with '/' at the first column
+        followed by a vertex whose class is at scale 1.
+        """
+        if line[:1] != '/':
+            return None
+        m = _plant_label.match(line)
+        if not m:
+            return None
+        label = m.group(1)
+        if self._symbols.get(split_label(label)[0]) != 1:
+            return None
+        return label
+
+    def _state(self):
+        """ Header information needed to parse a part of the code. """
+        return dict((name, getattr(self, name)) for name in
+                    ('_code', '_symbols', '_features', '_feature_head', '_nb_features',
+                     '_feature_slice', 'has_date', 'has_line_as_param', 'typed_properties',
+                     'selected_features', 'lazy'))
 
 
 
@@ -1230,58 +1466,128 @@ class Reader(object):
         return s, edge_type
 
 
-    def preprocess_code(self):
+    def build_mtg(self):
+        """ Read the code line by line and build the MTG.
 
-        code = [l for l in self.lines[self._no_line+1:] if l.strip() and not l.strip().startswith('#')]
+        Each line is split once into its topological code and its features,
+        which are directly added to the MTG by a :class:`MultiscaleBuilder`.
+        """
+        self._keep_lines = False
+        feature_head = self._feature_head
+        class_type = self._features
+        selected = self.selected_features
+        if selected is not None:
+            feature_head = [k if k in selected else None for k in feature_head]
+            class_type = dict((k, t) for k, t in class_type.items() if k in selected or k == '_line')
+
+        # lazy features: the selected fields of each vertex are kept in the
+        # _RAW property
+        lazy = self.lazy and not self.has_date
+        if lazy:
+            lazy_columns = [i for i, k in enumerate(feature_head) if k]
+            class_type = dict(class_type)
+            class_type[_RAW] = 'ALPHA'
+
+        builder = MultiscaleBuilder(self._symbols, class_type, self.has_date, mtg=self.mtg,
+                                    typed_properties=self.typed_properties)
+        add_line = builder.add_line
+        feature_slice = self._feature_slice
+        has_line_as_param = self.has_line_as_param
+        date_format = _date_format(self._features) if self.has_date else None
 
         indent = [0]
         edge_type = []
-        new_code = []
 
-        #for l in code:
         for l in self.next_line_iter():
-            #l = l.expandtabs(4)
-            s = l.strip()
-            s= s.split()[0]
-            # args
-            args = l.split('\t')[self._feature_slice]
-            params = [ "%s=%s"%(k,v) for k, v in zip(self._feature_head, args) if v.strip()]
-
-            if self.has_line_as_param:
-                params.append("_line=%d"%self._no_line)
-            if params:
-                s = s + "("+','.join(params)+")"
-
-            # build
-            nb_spaces = len(l) - len(l.lstrip('\t'))
+            s = l.split(None, 1)[0]
+            # features
+            args = l.split('\t')[feature_slice]
+            if lazy:
+                nb_args = len(args)
+                fields = [args[i] if i < nb_args else '' for i in lazy_columns]
+                features = [(_RAW, '\t'.join(fields))] if any(f.strip() for f in fields) else []
+            else:
+                features = [(k, v) for k, v in zip(feature_head, args) if k and v.strip()]
+            if date_format:
+                features = [(k, replace_date(v, date_format)) for k, v in features]
+            if has_line_as_param:
+                features.append(('_line', self._no_line))
 
+            # topology
+            nb_spaces = len(l) - len(l.lstrip('\t'))
             diff_space = nb_spaces - indent[-1]
-
-            #s = self.preprocess_line(s, diff_space, indent, nb_spaces, edge_type)
             s, edge_type = self.preprocess_line(s, diff_space, indent, nb_spaces, edge_type)
 
-            new_code.append(s)
+            add_line(s, features)
 
         while edge_type:
             edge = edge_type.pop()
             if edge in ['+','/']:
-                new_code.append(']')
+                add_line(']')
 
-        self._new_code = ''.join(new_code)
-        if debug:
-            print(self._new_code)
+        self.mtg = builder.finish()
 
-    def build_mtg(self):
-        """
+    def lazy_features(self):
+        """ Replace the features of the MTG by :class:`~openalea.mtg.column.LazyColumn`
+        parsing the kept fields the first time they are used.
         """
-        self.mtg = multiscale_edit(self._new_code, self._symbols, self._features, self.has_date, mtg=self.mtg)
-        #self.mtg = multiscale_edit(self._new_code, {}, self._features)
+        g = self.mtg
+        raw = g._properties.pop(_RAW, None)
+        if raw is None:
+            return
+        selected = self.selected_features
+        names = [k for k in self._feature_head if k and (selected is None or k in selected)]
+        # the fields are released when all the columns are loaded
+        pending = set(name for name in names if name in g._properties)
+        for i, name in enumerate(names):
+            if name in pending:
+                g._properties[name] = LazyColumn(partial(
+                    _parse_feature, raw, pending, i, name,
+                    self._features[name], self.typed_properties))
+
+
+# Name of the property of the fields of the vertices (not a valid feature name)
+_RAW = ' line'
+
 
-def read_mtg(s, mtg=None, has_date=False, verbose=True):
+def _parse_feature(lines, pending, i, name, _type, typed_properties):
+    """ Parse the i-th field in the kept fields of the vertices.
+
+    The fields are removed when all the `pending` features are parsed.
+    """
+    klass = _feature_types[_type]
+    values = Column(dtypes[_type]) if typed_properties and _type in dtypes else {}
+    for vid, l in lines.items():
+        args = l.split('\t')
+        if args[i].strip():
+            v = args[i]
+            try:
+                values[vid] = klass(v)
+            except ValueError:
+                print('Args ', v, 'of vertex ', vid, 'of type ', name, 'is not of type ', str(klass))
+    pending.discard(name)
+    if not pending:
+        lines.clear()
+    return values
+
+
+def read_mtg(s, mtg=None, has_date=False, verbose=True, typed_properties=False,
+             features=None, keep_line_numbers=True, lazy=False):
     """ Create an MTG from its string representation in the MTG format.
 
     :Parameter:
-        - s (string) - a multi-lines string
+        - s (string) - a multi-lines string, or a file object
+          (the lines are read one by one)
+        - typed_properties (bool) - store the features declared as INT or REAL
+          in typed numpy columns (see :class:`~openalea.mtg.column.Column`)
+        - features (list) - names of the features to parse (all if None).
+          The other features are ignored.
+        - keep_line_numbers (bool) - store the line of each vertex in the
+          `_line` property.
+        - lazy (bool) - parse a feature the first time its property is used
+          (see :class:`~openalea.mtg.column.LazyColumn`). The lines of the
+          vertices are kept in memory until all the features are parsed.
+          Not used for dynamic MTGs (with dates).
 
     :Return: an MTG
 
@@ -1293,27 +1599,377 @@ def read_mtg(s, mtg=None, has_date=False, verbose=True):
         txt = f.read()
 
         g = read_mtg(txt)
+        g = read_mtg(txt, features=['Length'], keep_line_numbers=False)
 
     .. seealso:: :func:`read_mtg_file`.
 
     """
-    reader = Reader(s, mtg=mtg, has_date=has_date, verbose=verbose)
+    reader = Reader(s, mtg=mtg, has_date=has_date, verbose=verbose,
+                    typed_properties=typed_properties, features=features,
+                    has_line_as_param=keep_line_numbers, lazy=lazy)
     g = reader.parse()
     return g
 
-def read_mtg_file(fn, mtg=None, has_date=False, verbose=True):
+def read_mtg_file(fn, mtg=None, has_date=False, verbose=True, typed_properties=False,
+                  features=None, keep_line_numbers=True, lazy=False, workers=1, plants=None,
+                  cache=None):
     """ Create an MTG from a filename.
 
+    :Parameters:
+        - `fn` (str) - name of the file, or a file object. A file compressed
+          with gzip, bz2, xz or zstd is decompressed as it is parsed
+          (see :func:`~openalea.mtg.compress.open_file`).
+        - `workers` (int) - number of processes used to parse the plants
+          (all the cores if None). The plants (lines starting with '/' at
+          the first column) are parsed in parallel and merged in one MTG
+          with the same vertex ids as a sequential parsing.
+        - `plants` (list) - parse only these plants, given by the label
+          (str, e.g. 'P1') of their vertex at scale 1, or by the index of
+          this label (int, e.g. 1 for 'P1'). An int is not the position of
+          the plant in the file: `plants=[0]` does not select the first plant.
+          The other plants are not read (see :func:`plant_index`).
+          The vertex ids differ from the ones of the whole file, but the
+          `_line` property is the line of the vertex in the file.
+        - `cache` (bool or str) - if True (or the name of a directory),
+          the parsed MTG is stored in an on-disk cache and loaded from it
+          when the same file is read again with the same options
+          (see :mod:`openalea.mtg.cache`).
+        - see :func:`read_mtg` for the other parameters.
+
     :Usage:
 
         >>> g = read_mtg_file('test.mtg')
+        >>> g = read_mtg_file('test.mtg.gz')
+        >>> g = read_mtg_file('orchard.mtg', workers=8)
+        >>> g = read_mtg_file('orchard.mtg', plants=[137])
+        >>> g = read_mtg_file('orchard.mtg', features=['Length', 'Diameter'], lazy=True)
+        >>> g = read_mtg_file('apricot.mtg', cache=True)
+
+    .. seealso:: :func:`read_mtg`, :func:`plant_index`.
+    """
+    if cache and mtg is None and isinstance(fn, (str, os.PathLike)):
+        return _read_cached(fn, None if cache is True else cache, has_date=has_date,
+                            verbose=verbose, typed_properties=typed_properties,
+                            features=features, keep_line_numbers=keep_line_numbers,
+                            lazy=lazy, workers=workers, plants=plants)
+
+    options = dict(has_date=has_date, verbose=verbose, typed_properties=typed_properties,
+                   features=features, has_line_as_param=keep_line_numbers, lazy=lazy)
+    if plants is not None:
+        return _read_plants(fn, plants, workers, **options)
+    with open_file(fn) as f:
+        if workers == 1 or mtg is not None:
+            return Reader(f, mtg=mtg, **options).parse()
+        return _read_mtg_parallel(f, workers, **options)
+
+
+def _read_cached(fn, directory, **options):
+    """ Load an MTG file from the cache, or parse it and store it. """
+    from . import cache
+
+    directory = cache.cache_dir(directory)
+    key = cache.cache_key(fn, has_date=options['has_date'],
+                          typed_properties=options['typed_properties'],
+                          features=None if options['features'] is None else sorted(options['features']),
+                          keep_line_numbers=options['keep_line_numbers'],
+                          plants=options['plants'])
+    g = cache.load(directory, key)
+    if g is None:
+        g = read_mtg_file(fn, **options)
+        cache.store(directory, key, g)
+    return g
+
+
+def _parse_plants(args):
+    """ Parse a chunk of the code (in a worker process).
+
+    :Returns: the MTG of the chunk and the warnings.
+    """
+    state, first_line, lines = args
+    reader = Reader(lines, verbose=False)
+    reader.__dict__.update(state)
+    reader._nb_lines = first_line
+    reader.build_mtg()
+    return reader.mtg, reader.warnings
+
+
+def _merge_plants(mtgs):
+    """ Merge the MTGs of consecutive chunks of plants.
+
+    The ids of each MTG are shifted by the number of vertices of the
+    previous ones, and the root (0) is shared.
+    """
+    g = MTG()
+    parent, children = g._parent, g._children
+    complex, components = g._complex, g._components
+    scale = g._scale
+    properties = {}
+    offset = 0
+
+    for h in mtgs:
+        o = offset
+        parent.update({v+o: p+o if p else p for v, p in h._parent.items() if v})
+        complex.update({v+o: c+o if c else c for v, c in h._complex.items()})
+        scale.update({v+o: s for v, s in h._scale.items() if v})
+        for edges, h_edges in ((children, h._children), (components, h._components)):
+            edges.update({v+o: [c+o for c in cs] for v, cs in h_edges.items() if v})
+            if 0 in h_edges:
+                edges.setdefault(0, []).extend(c+o for c in h_edges[0])
+        for name, p in h._properties.items():
+            if name not in properties:
+                properties[name] = (p, LabelColumn() if isinstance(p, LabelColumn) else {})
+            values = properties[name][1]
+            if isinstance(p, LabelColumn) and isinstance(values, LabelColumn):
+                values.merge(p, o)
+            else:
+                values.update({v+o: x for v, x in p.items() if v})
+                if 0 in p:
+                    values[0] = p[0]
+        offset += h._id
+
+    for name, (p, values) in properties.items():
+        if isinstance(p, Column):
+            values = Column(p.dtype, values)
+        g._properties[name] = values
+
+    g._id = offset
+    g._build_scale_index()
+    g._topology_changed()
+    return g
+
+
+def _read_mtg_parallel(f, workers, **options):
+    """ Parse the plants of an MTG file in a pool of processes. """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    reader = Reader(f, **options)
+    reader.header()
+    reader.code_header()
+
+    # several chunks per process to balance the load
+    state = reader._state()
+    tasks = [(state, first_line, lines) for first_line, lines in reader.plant_chunks(4*workers)]
+    return _merge_results(reader, tasks, workers)
+
+
+def _merge_results(reader, tasks, workers):
+    """ Parse the chunks of code and merge them in the MTG of the reader. """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        results = [_parse_plants(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            results = list(pool.map(_parse_plants, tasks))
+
+    for _, warnings in results:
+        reader.warnings.extend(warnings)
+    reader.mtg = _merge_plants([g for g, _ in results])
+    reader.lazy_features()
+    if reader.verbose:
+        reader.errors()
+    return reader.mtg
+
+
+_plant_label = re.compile(r'/([^\s/<+\[\]]+)')
+_INDEX_VERSION = 2
+
+
+def _scan_plants(fn):
+    """ Find the position of the code and of each plant in an MTG file. """
+    with open_file(fn) as f:
+        encoding = f.encoding
+        raw = f.buffer
+
+        def lines():
+            l = raw.readline()
+            while l:
+                yield l.decode(encoding)
+                l = raw.readline()
+
+        reader = Reader(lines(), verbose=False)
+        reader.header()
+        reader.code_header()
+        code = [raw.tell(), reader._nb_lines]
+
+        plants = []
+        offset, no_line = code
+        for l in raw:
+            label = reader.plant_label(l.decode(encoding)) if l[:1] == b'/' else None
+            if label is not None:
+                if plants:
+                    plants[-1][2] = offset
+                plants.append([label, offset, None, no_line])
+            offset += len(l)
+            no_line += 1
+        if plants:
+            plants[-1][2] = offset
+    return {'version': _INDEX_VERSION, 'encoding': encoding, 'code': code, 'plants': plants}
+
+
+def plant_index(fn, sidecar=False):
+    """ Index of the position of the plants in an MTG file.
+
+    A plant is a line starting with '/' at the first column followed by a
+    vertex of scale 1, and all the following lines up to the next plant.
+
+    The index is read from the sidecar file `fn + '.idx'` if it exists and
+    is up to date. Otherwise, the file is scanned (without being parsed).
+
+    :Parameters:
+        - `fn` (str) - name of the MTG file
+        - `sidecar` (bool) - write the index in `fn + '.idx'` if it has been
+          computed.
+
+    :Returns: a dict with
+        - `'code'`: the byte offset and the line number of the first line
+          after the header,
+        - `'plants'`: a list of `[label, start, stop, line]` where
+          `start` and `stop` are byte offsets (in the decompressed
+          data for a compressed file) and `line` is the number of the
+          first line of the plant.
+
+    .. seealso:: :func:`read_mtg_file`
+    """
+    import json
+
+    stat = os.stat(fn)
+    key = [stat.st_size, stat.st_mtime_ns]
+    index_fn = fn + '.idx'
+    try:
+        with open(index_fn) as f:
+            index = json.load(f)
+        if index.get('version') == _INDEX_VERSION and index.get('file') == key:
+            return index
+    except (OSError, ValueError):
+        pass
+
+    index = _scan_plants(fn)
+    index['file'] = key
+    if sidecar:
+        with open(index_fn, 'w') as f:
+            json.dump(index, f)
+    return index
+
+
+def _read_plants(fn, plants, workers, **options):
+    """ Parse the header and the selected plants of an MTG file. """
+    index = plant_index(fn)
+    by_label = dict((p[0], p) for p in index['plants'])
+    by_index = {}
+    for p in index['plants']:
+        i = split_label(p[0])[1]
+        if i is not None:
+            by_index.setdefault(int(i), p)
+
+    selected = []
+    for plant in plants:
+        p = by_index.get(plant) if isinstance(plant, int) else by_label.get(plant)
+        if p is None:
+            raise ValueError('Plant %r not found in %s'%(plant, fn))
+        if p not in selected:
+            selected.append(p)
+    selected.sort(key=lambda p: p[1])
+
+    encoding = index['encoding']
+    with open_file(fn, 'rb') as f:
+        header = f.read(index['code'][0]).decode(encoding)
+        reader = Reader(header, **options)
+        reader.header()
+        reader.code_header()
+
+        state = reader._state()
+        tasks = []
+        position = index['code'][0]
+        for label, start, stop, no_line in selected:
+            if f.seekable():
+                f.seek(start)
+            else:
+                # stream (e.g. zstd): skip the previous plants
+                while position < start:
+                    skipped = f.read(min(start - position, 1 << 20))
+                    if not skipped:
+                        break
+                    position += len(skipped)
+            tasks.append((state, no_line, f.read(stop-start).decode(encoding)))
+            position = stop
+
+    return _merge_results(reader, tasks, workers)
+
+
+def _load_file(fn, options):
+    """ Parse an MTG file (in a worker process).
+
+    :Returns: `(mtg, warnings, error)`. The MTG is pickled with its
+        topology and properties packed in arrays (see :mod:`~openalea.mtg.packing`).
+    """
+    try:
+        with open_file(fn) as f:
+            reader = Reader(f, verbose=False, **options)
+            g = reader.parse()
+    except Exception as e:
+        return None, [], e
+    return g, reader.warnings, None
+
+
+def load_many(paths, workers=None, on_error='raise', has_date=False, typed_properties=False,
+              features=None, keep_line_numbers=True):
+    """ Parse many MTG files in a pool of processes.
+
+    The results are given as soon as the files are parsed, not in the
+    order of `paths`. The MTGs are sent back from the worker processes
+    with their topology and properties packed in arrays
+    (see :mod:`~openalea.mtg.packing`).
+
+    :Parameters:
+        - `paths` (list) - names of the MTG files (possibly compressed)
+        - `workers` (int) - number of processes (all the cores if None).
+          With 1, the files are parsed in the current process.
+        - `on_error` (str) - 'raise' to raise the first error, or 'collect'
+          to give the error in the result of the file.
+        - see :func:`read_mtg` for the other parameters.
+
+    :Returns: an iterator of `(path, g, warnings, error)` where `warnings`
+        is the list of `(line, message)` found by the parser
+        (see :meth:`Reader.errors`), and `g` is None if `error` is not None.
+
+    :Usage:
 
-    .. seealso:: :func:`read_mtg`.
+        >>> from glob import glob
+        >>> for fn, g, warnings, error in load_many(glob('trees/*.mtg'), workers=8):
+        ...     print(fn, len(g))
+
+    .. seealso:: :func:`read_mtg_file`
     """
-    f = open(fn)
-    txt = f.read()
-    f.close()
-    return read_mtg(txt, mtg=mtg, has_date=has_date, verbose=verbose)
+    if on_error not in ('raise', 'collect'):
+        raise ValueError("on_error must be 'raise' or 'collect', not %r"%(on_error,))
+    options = dict(has_date=has_date, typed_properties=typed_properties,
+                   features=features, has_line_as_param=keep_line_numbers)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    def result(fn, g, warnings, error):
+        if error is not None and on_error == 'raise':
+            raise error
+        return fn, g, warnings, error
+
+    if workers == 1:
+        for fn in paths:
+            yield result(fn, *_load_file(fn, options))
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = dict((pool.submit(_load_file, fn, options), fn) for fn in paths)
+        for future in as_completed(futures):
+            yield result(futures[future], *future.result())
+    finally:
+        # the iteration may be stopped before the end
+        pool.shutdown(cancel_futures=True)
 
 
 def mtg_display(g, vtx_id, tab='  ', edge_type=None, label=None):
@@ -1373,6 +2029,21 @@ def mtg_display(g, vtx_id, tab='  ', edge_type=None, label=None):
 # Class and methods to write in the famous MTG file format.
 ###############################################################################
 
+def _max_order(g):
+    """ Maximum number of '+' edges from a root to a vertex at any scale. """
+    edge_type = g.property('edge_type')
+    max_order = 0
+    stack = [(v, 1 if edge_type.get(v) == '+' else 0)
+             for v in g.vertices() if g.parent(v) is None]
+    while stack:
+        v, order = stack.pop()
+        if order > max_order:
+            max_order = order
+        for child in g.children(v):
+            stack.append((child, order+1 if edge_type.get(child) == '+' else order))
+    return max_order
+
+
 class Writer(object):
     """
      Write a MTG string from a mtg object.
@@ -1407,120 +2078,116 @@ class Writer(object):
              display_id=False, display_scale=False, filter=None):
         """
         Traverse the MTG and write the code.
+
+        :Returns: the list of the lines (see :meth:`iter_code`).
+        """
+        return list(self.iter_code(property_names, nb_tab=nb_tab, display_id=display_id,
+                                   display_scale=display_scale, filter=filter))
+
+    def iter_code(self, property_names, nb_tab=None,
+                  display_id=False, display_scale=False, filter=None):
+        """
+        Traverse the MTG and generate the lines of the code.
+
+        The column of each vertex is found from the column of its parent
+        (or of the parent of its first component at a finer scale), so the
+        work per vertex does not depend on the number of columns.
         """
+        g = self.g
         if nb_tab is None:
-            from .algo import orders
-            nb_tab = max(orders(self.g))+1
-       
-        head = ['MTG :']
+            nb_tab = _max_order(g)+1
+
+        yield 'MTG :'
 
         entity = ['ENTITY-CODE']
         entity.extend((nb_tab-1)*[''])
         entity.extend(property_names)
-        head.append('\t'.join(entity))
+        yield '\t'.join(entity)
 
         # Create for each line a string with code and propertie values.
         # TODO : duplication of code from display_mtg and mtg_display.
-        labels = self.g.property('label')
-        edge_type = self.g.property('edge_type')
+        labels = g.property('label')
+        edge_type = g.property('edge_type')
 
-        properties = self.g.properties()
-        current_vertex = self.g.root
+        properties = [g.property(pname) for pname in property_names]
+        current_vertex = g.root
+        max_scale = g.max_scale()
         tab = 0
         prev_scale = 0
 
+        # vertex at each column and column of these vertices
         sym_at_col = []
+        column = {}
 
-        for vtx in traversal.iter_mtg2(self.g, current_vertex):
+        def column_of(v):
+            i = column.get(v)
+            if i is not None and i < len(sym_at_col) and sym_at_col[i] == v:
+                return i
 
-            if filter and not filter(self.g, vtx):
-                continue
+        for vtx in traversal.iter_mtg2(g, current_vertex):
 
-            log('Process ',vtx, self.g.node(vtx).label)
+            if filter and not filter(g, vtx):
+                continue
 
-            cur_scale = self.g.scale(vtx)
+            cur_scale = g.scale(vtx)
             if vtx == current_vertex:
                 current_vertex = vtx
                 prev_scale = cur_scale
                 sym_at_col.append(vtx)
+                column[vtx] = 0
                 continue
 
             # Algorithm description:
             # prev_scale >= cur_scale:
             #   1. search the parent
             #   2. if < same column elif + : tab = col+1
-            complex = self.g.complex(vtx)
+            complex = g.complex(vtx)
             if current_vertex == complex:
                 et = '/'
-                if current_vertex != self.g.root:
+                if current_vertex != g.root:
                     et = '^'+et
 
-                log('  ','Cas / ',self.g.node(current_vertex).label, vtx, et)
+                log('  ','Cas / ',g.node(current_vertex).label, vtx, et)
 
             else:
                 et = edge_type.get(vtx,'/')
-                parent = self.g.parent(vtx)
-                possible_et = possible_tab = None
-                log('  ','Cas 2:', et, 'parent:',parent, 'sym_at_col: ',sym_at_col)
-                for i in range(tab, -1, -1):
-                    vc = v = sym_at_col[i]
-                    vscale = self.g.scale(v)
-                    log('    col '+str(i),cur_scale, v,'scale',vscale)
-
-                    vtx_proj = vtx
-                    parent_proj = parent
-                    if vscale > cur_scale:
-                        # up
-                        for j in range(vscale-cur_scale):
-                            vc = self.g.complex(vc)
-                        #down
-                        # Even if the complex are linked together, several solution can coexist
-                        vtx_proj = next(self.g.component_roots_at_scale_iter(vtx,scale=vscale))
-                        parent_proj = self.g.parent(vtx_proj)
-
-                    if vc == parent and v == parent_proj:
-                        log('   ==> cas 1')
-                        if et == '<':
-                            et = '^'+et
-                            tab = i
-                        else:
-                            if i+1 < nb_tab:
-                                tab = i+1
-                            else:
-                                et = '^'+et
-                                tab = i
+                parent = g.parent(vtx)
+
+                # The last column containing the parent of vtx, or at a finer
+                # scale the parent of the first component of vtx whose
+                # complex at the scale of vtx is the parent.
+                found = column_of(parent) if parent is not None else None
+                for scale in range(cur_scale+1, max_scale+1):
+                    vtx_proj = next(g.component_roots_at_scale_iter(vtx, scale=scale), None)
+                    if vtx_proj is None:
                         break
-                    elif vc == parent:
-                        log('   ==> cas 2')
-                        if et == '<':
-                            possible_et = '^'+et
-                            possible_tab = i
-                        else:
-                            if i+1 < nb_tab:
-                                possible_tab = i+1
-                            else:
-                                possible_et = '^'+et
-                                possible_tab = i
-                    elif i == 0 and self.g.complex(vc) == self.g.complex(vtx)==self.g.root:
-                        if not possible_et:
-                            tab = 0
-                            break
-
-                else:
-                    #print sy
-                    log('    Possible Error. Use hypothetic state if possible.')
-                    if possible_et and possible_tab:
-                        et = possible_et
-                        tab = possible_tab
+                    parent_proj = g.parent(vtx_proj)
+                    i = column_of(parent_proj) if parent_proj is not None else None
+                    if i is None or (found is not None and i < found):
+                        continue
+                    vc = parent_proj
+                    for j in range(scale-cur_scale):
+                        vc = g.complex(vc)
+                    if vc == parent:
+                        found = i
+
+                if found is not None:
+                    i = found
+                    if et == '<':
+                        et = '^'+et
+                        tab = i
+                    elif i+1 < nb_tab:
+                        tab = i+1
                     else:
-                        print(tab)
-                        print(sym_at_col)
-                        raise Exception("Error in the MTG for vertex %d"%vtx)
+                        et = '^'+et
+                        tab = i
+                else:
+                    et, tab = self._search_column(vtx, et, tab, nb_tab, sym_at_col)
 
             if tab >= nb_tab:
                 msg = """There is not enough tabs to store the MTG code.
                 Increase the nb_tab variable to at least %d"""
-                raise Exception(msg%(nb_B2tab+2))
+                raise Exception(msg%(tab+1))
 
 
             # Create a valid line with properties.
@@ -1529,25 +2196,19 @@ class Writer(object):
             if not display_id and not display_scale:
                 name = '%s%s'%(et,get_label(label))
             elif display_id and display_scale:
-                name = '%s%s\t\t\t(id=%d, scale=%d)'%(et,get_label(label),vtx, self.g.scale(vtx))
+                name = '%s%s\t\t\t(id=%d, scale=%d)'%(et,get_label(label),vtx, g.scale(vtx))
             elif display_id:
                 name = '%s%s\t\t\t(id=%d)'%(et,get_label(label),vtx)
             else:
-                name = '%s%s\t\t\t(scale=%d)'%(et,get_label(label),self.g.scale(vtx))
+                name = '%s%s\t\t\t(scale=%d)'%(et,get_label(label),g.scale(vtx))
 
             line = ['']*nb_tab
             line[tab] = name
 
-            log(' -> Add vertex', line[:tab+1], '(%d)'%tab )
-
-            for pname in property_names:
-                if vtx in properties[pname]:
-                    p = properties[pname].get(vtx,'')
-                    line.append(str(p))
-                else:
-                    line.append('')
+            for p in properties:
+                line.append(str(p[vtx]) if vtx in p else '')
 
-            head.append('\t'.join(line))
+            yield '\t'.join(line)
 
             current_vertex = vtx
 
@@ -1555,10 +2216,77 @@ class Writer(object):
                 sym_at_col.append(vtx)
             else:
                 assert len(sym_at_col) > tab
-                sym_at_col = sym_at_col[:tab+1]
+                del sym_at_col[tab+1:]
                 sym_at_col[tab] = vtx
+            column[vtx] = tab
+
+    def _search_column(self, vtx, et, tab, nb_tab, sym_at_col):
+        """
+        Search the column of `vtx` when its parent is not in a column:
+        scan the columns backward from `tab` for an approximate position.
+
+        :Returns: the edge type and the column of vtx.
+        """
+        g = self.g
+        cur_scale = g.scale(vtx)
+        parent = g.parent(vtx)
+        possible_et = possible_tab = None
+        log('  ','Cas 2:', et, 'parent:',parent, 'sym_at_col: ',sym_at_col)
+        for i in range(tab, -1, -1):
+            vc = v = sym_at_col[i]
+            vscale = g.scale(v)
+            log('    col '+str(i),cur_scale, v,'scale',vscale)
+
+            vtx_proj = vtx
+            parent_proj = parent
+            if vscale > cur_scale:
+                # up
+                for j in range(vscale-cur_scale):
+                    vc = g.complex(vc)
+                #down
+                # Even if the complex are linked together, several solution can coexist
+                vtx_proj = next(g.component_roots_at_scale_iter(vtx,scale=vscale))
+                parent_proj = g.parent(vtx_proj)
+
+            if vc == parent and v == parent_proj:
+                log('   ==> cas 1')
+                if et == '<':
+                    et = '^'+et
+                    tab = i
+                else:
+                    if i+1 < nb_tab:
+                        tab = i+1
+                    else:
+                        et = '^'+et
+                        tab = i
+                break
+            elif vc == parent:
+                log('   ==> cas 2')
+                if et == '<':
+                    possible_et = '^'+et
+                    possible_tab = i
+                else:
+                    if i+1 < nb_tab:
+                        possible_tab = i+1
+                    else:
+                        possible_et = '^'+et
+                        possible_tab = i
+            elif i == 0 and g.complex(vc) == g.complex(vtx)==g.root:
+                if not possible_et:
+                    tab = 0
+                    break
 
-        return head
+        else:
+            #print sy
+            log('    Possible Error. Use hypothetic state if possible.')
+            if possible_et and possible_tab:
+                et = possible_et
+                tab = possible_tab
+            else:
+                print(tab)
+                print(sym_at_col)
+                raise Exception("Error in the MTG for vertex %d"%vtx)
+        return et, tab
 
 
     @staticmethod
@@ -1665,12 +2393,15 @@ class Writer(object):
 
         return symbols
 
-def write_mtg(g, properties=[], class_at_scale=None, nb_tab=None, display_id=False):
+def write_mtg(g, properties=[], class_at_scale=None, nb_tab=None, display_id=False,
+              fileobj=None):
     """ Transform an MTG into a multi-line string in the MTG format.
 
     This method build a generic header, then traverses the MTG and transform
     each vertex into a line with its label, topoloical relationship and
     specific `properties`.
+    If `fileobj` is given, the lines are written in it as they are
+    generated, so the memory used does not depend on the size of the MTG.
 
     :Parameters:
 
@@ -1683,10 +2414,13 @@ def write_mtg(g, properties=[], class_at_scale=None, nb_tab=None, display_id=Fal
 
         - `class_at_scale` (dict(name->int)): a map between a class name and its scale.
             If `class _at_scale` is None, its value will be computed from `g`.
-        - `nb_tab` (int): the number of tabs used to write the code.
+        - `nb_tab` (int): the number of tabs used to write the code
+            (by default, the maximum order of the vertices + 1).
         - `display_id` (bool): display the id for each vertex
+        - `fileobj`: a file object (in binary mode, the text is encoded
+            with the default encoding).
 
-    :Returns: a list of strings.
+    :Returns: a string, or None if `fileobj` is given.
 
     :Example:
 
@@ -1704,7 +2438,23 @@ def write_mtg(g, properties=[], class_at_scale=None, nb_tab=None, display_id=Fal
         f = open(filename, 'w')
         f.write(mtg_lines)
         f.close()
+
+        # or write the lines directly in the file
+        with open(filename, 'w') as f:
+            write_mtg(g, properties, fileobj=f)
+
+    .. seealso:: :func:`write_mtg_file`
     """
+    if fileobj is None:
+        out = StringIO()
+        write_mtg(g, properties, class_at_scale=class_at_scale, nb_tab=nb_tab,
+                  display_id=display_id, fileobj=out)
+        return out.getvalue()
+    if not isinstance(fileobj, io.TextIOBase):
+        with open_file(fileobj, 'w', compression=None) as f:
+            write_mtg(g, properties, class_at_scale=class_at_scale, nb_tab=nb_tab,
+                      display_id=display_id, fileobj=f)
+        return
 
     w = Writer(g)
 
@@ -1731,13 +2481,46 @@ def write_mtg(g, properties=[], class_at_scale=None, nb_tab=None, display_id=Fal
     header.append(features)
     header.append('')
 
+    for line in header:
+        fileobj.write(line)
+        fileobj.write('\n')
+
     property_name = [p[0] for p in properties]
-    code = w.code(property_name, nb_tab=nb_tab, display_id=display_id, filter=lambda g,v: True if g.scale(v) <=4 else False)
+    code = w.iter_code(property_name, nb_tab=nb_tab, display_id=display_id, filter=lambda g,v: True if g.scale(v) <=4 else False)
+
+    for line in code:
+        fileobj.write(line)
+        fileobj.write('\n')
 
-    header.extend(code)
-    header.append('')
 
-    return '\n'.join(header)
+def write_mtg_file(g, fn, properties=[], class_at_scale=None, nb_tab=None, display_id=False,
+                   compression='infer'):
+    """ Write an MTG in a file in the MTG format.
+
+    The lines are written as they are generated (see :func:`write_mtg`),
+    and compressed on the fly if the file name ends with `.gz`, `.bz2`,
+    `.xz` or `.zst`.
+
+    :Parameters:
+        - `g` (MTG)
+        - `fn` (str) - name of the file
+        - `compression` (str) - 'infer' (from the extension), None, or one of
+          'gzip', 'bz2', 'xz', 'zstd'.
+        - see :func:`write_mtg` for the other parameters.
+
+    :Example:
+
+    .. code-block:: python
+
+        properties = [('Length', 'REAL')]
+        write_mtg_file(g, 'example.mtg.gz', properties)
+        g = read_mtg_file('example.mtg.gz')
+
+    .. seealso:: :func:`write_mtg`, :func:`read_mtg_file`
+    """
+    with open_file(fn, 'w', compression=compression) as f:
+        write_mtg(g, properties, class_at_scale=class_at_scale, nb_tab=nb_tab,
+                  display_id=display_id, fileobj=f)
 
 def display(g, max_scale=0, display_id=True, display_scale=False, nb_tab=None,**kwds):
     """
@@ -33,6 +33,8 @@ from . import traversal
 from . import algo
 
 from .tree import PropertyTree, InvalidVertex
+from .column import Column, LabelColumn, split_label
+from . import packing
 
 
 class MTG(PropertyTree):
@@ -82,6 +84,9 @@ class MTG(PropertyTree):
 
         # Map a vid to its scale
         self._scale = {0:0}
+        # Map a scale to its vertices: scale -> {vid: None}
+        # (ordered like _scale, so per scale queries do not scan all vertices)
+        self._scale_vertices = {0:{0:None}}
 
         # Multiscale tree:
         # complex <=> parent : vid -> vid
@@ -152,9 +157,9 @@ class MTG(PropertyTree):
         :Returns Type:
             int
 
-        .. note:: The complexity is :math:`O(n)`.
+        .. note:: The complexity is :math:`O(s)` with s the number of scales.
         '''
-        return len(set(self._scale.values()))
+        return len(self._scale_vertices)
 
     def scales_iter(self):
         '''Return the different scales of the mtg.
@@ -162,9 +167,9 @@ class MTG(PropertyTree):
         :Returns:
             Iterator on scale identifiers (ints).
 
-        .. note:: The complexity is :math:`O(n)`.
+        .. note:: The complexity is :math:`O(s)` with s the number of scales.
         '''
-        return iter(set(self._scale.values()))
+        return iter(sorted(self._scale_vertices))
 
     def scales(self):
         '''Return the different scales of the mtg.
@@ -172,7 +177,7 @@ class MTG(PropertyTree):
         :Returns:
             Iterator on scale identifiers (ints).
 
-        .. note:: The complexity is :math:`O(n)`.
+        .. note:: The complexity is :math:`O(s)` with s the number of scales.
         '''
         return list(self.scales_iter())
 
@@ -187,10 +192,44 @@ class MTG(PropertyTree):
         :Returns:
             S, the maximum scale identifier.
 
-        .. note:: The complexity is :math:`O(n)`.
+        .. note:: The complexity is :math:`O(s)` with s the number of scales.
         .. seealso:: :func:`scale`, :func:`scales`
         '''
-        return max(self.scales_iter())
+        return max(self._scale_vertices)
+
+    def _set_scale(self, vid, scale):
+        ''' Set the scale of `vid` and update the per scale vertex index.
+        '''
+        old_scale = self._scale.get(vid)
+        if old_scale == scale:
+            return
+        if old_scale is not None:
+            self._unindex_scale(vid, old_scale)
+        self._scale[vid] = scale
+        self._scale_vertices.setdefault(scale, {})[vid] = None
+
+    def _del_scale(self, vid):
+        ''' Remove `vid` from the scale map and from the per scale vertex index.
+        '''
+        if vid in self._scale:
+            self._unindex_scale(vid, self._scale.pop(vid))
+
+    def _unindex_scale(self, vid, scale):
+        vertices = self._scale_vertices.get(scale)
+        if vertices is not None:
+            vertices.pop(vid, None)
+            if not vertices:
+                del self._scale_vertices[scale]
+
+    def _build_scale_index(self):
+        ''' Rebuild the per scale vertex index from the scale map.
+
+        Used after bulk edits of `_scale` (reindex, insert or remove a scale).
+        '''
+        index = {}
+        for vid, sid in self._scale.items():
+            index.setdefault(sid, {})[vid] = None
+        self._scale_vertices = index
 
 
     #########################################################################
@@ -213,11 +252,13 @@ class MTG(PropertyTree):
         :Returns:
             Number of vertices at `scale` or total
             number of vertices if scale < 0.
+
+        .. note:: The complexity is :math:`O(1)`.
         '''
         if scale < 0:
             return len(self._scale)
         else:
-            return len(self.vertices(scale=scale))
+            return len(self._scale_vertices.get(scale, ()))
 
     def vertices(self, scale = -1):
         '''
@@ -288,7 +329,7 @@ class MTG(PropertyTree):
         if scale < 0:
             return iter(self._scale.keys())
         else:
-            return (vid for vid, sid in self._scale.items() if sid == scale)
+            return iter(self._scale_vertices.get(scale, ()))
 
 
     #########################################################################
@@ -426,8 +467,7 @@ class MTG(PropertyTree):
             super(MTG, self).remove_vertex(vid, reparent_child=reparent_child)
             if vid in self._components:
                 del self._components[vid]
-            if vid in self._scale:
-                del self._scale[vid]
+            self._del_scale(vid)
             if vid in self._complex:
                 cid = self._complex[vid]
                 l = self._components[cid]
@@ -437,6 +477,7 @@ class MTG(PropertyTree):
                 except ValueError:
                     pass
                 del self._complex[vid]
+            self._topology_changed()
         else:
             raise InvalidVertex('Can not remove vertex %d with components.'
             'Use remove_tree instead.'%vid)
@@ -462,9 +503,26 @@ class MTG(PropertyTree):
 
         self._scale.clear()
         self._scale[0] = 0
+        self._scale_vertices = {0:{0:None}}
 
         self._complex.clear()
         self._components.clear()
+        self._topology_changed()
+
+    def add_property(self, property_name, dtype=None):
+        """
+        Add a new map between vid and a data
+        Do not fill this property for any vertex
+
+        The `label` property is a :class:`~openalea.mtg.column.LabelColumn`
+        which maintains the class and the index of the vertices.
+
+        .. seealso:: :meth:`PropertyTree.add_property`
+        """
+        if property_name == 'label' and dtype is None:
+            self._properties[property_name] = LabelColumn()
+        else:
+            super(MTG, self).add_property(property_name, dtype=dtype)
 
     def clear_properties(self, exclude=[]):
         """Remove all the properties of the MTG.
@@ -493,6 +551,44 @@ class MTG(PropertyTree):
         """
         return copy.deepcopy(self)
 
+    def __getstate__(self):
+        state = super(MTG, self).__getstate__()
+        state['_complex'] = packing.pack_map(self._complex)
+        state['_components'] = packing.pack_lists(self._components)
+        state['_scale'] = packing.pack_map(self._scale)
+        # rebuilt from _scale
+        del state['_scale_vertices']
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        state['_complex'] = packing.unpack_map(state['_complex'])
+        state['_components'] = packing.unpack_lists(state['_components'])
+        state['_scale'] = packing.unpack_map(state['_scale'])
+        super(MTG, self).__setstate__(state)
+        if '_scale_vertices' not in state:
+            self._build_scale_index()
+
+    def freeze(self):
+        """ Return a read-only copy of the graph stored in integer arrays.
+
+        The :class:`~openalea.mtg.frozen.FrozenMTG` provides the read API
+        of the MTG with a much smaller memory footprint.
+        Use :meth:`~openalea.mtg.frozen.FrozenMTG.thaw` to get back an MTG.
+
+        :Usage:
+
+        .. code-block:: python
+
+            fg = g.freeze()
+            g1 = fg.thaw()
+
+        :Returns:
+            - `fg` (FrozenMTG)
+        """
+        from .frozen import FrozenMTG
+        return FrozenMTG.from_mtg(self)
+
     def roots_iter(self, scale=0):
         ''' Returns an iterator of the roots of the tree graphs at a given scale.
 
@@ -552,7 +648,7 @@ class MTG(PropertyTree):
         '''
 
         child = super(MTG, self).add_child(parent, child, **properties)
-        self._scale[child] = self._scale[parent]
+        self._set_scale(child, self._scale[parent])
         return child
 
     def insert_sibling(self, vtx_id1, vtx_id2=None, **properties):
@@ -569,7 +665,7 @@ class MTG(PropertyTree):
             int
         '''
         vtx_id2 = super(MTG, self).insert_sibling(vtx_id1, vtx_id2, **properties)
-        self._scale[vtx_id2] = self._scale[vtx_id1]
+        self._set_scale(vtx_id2, self._scale[vtx_id1])
         return vtx_id2
 
     def insert_parent(self, vtx_id, parent_id=None, **properties):
@@ -590,7 +686,7 @@ class MTG(PropertyTree):
             self._id += 1
             parent_id = self._id
 
-        self._scale[parent_id] = self.scale(vtx_id)
+        self._set_scale(parent_id, self.scale(vtx_id))
 
         parent_id = super(MTG, self).insert_parent(vtx_id, parent_id, **properties)
 
@@ -624,6 +720,7 @@ class MTG(PropertyTree):
 
         if old_complex is not None:
             self.replace_parent(old_complex, self.complex(new_parent_id))
+        self._topology_changed()
 
 
     #########################################################################
@@ -641,13 +738,36 @@ class MTG(PropertyTree):
             complex identifier or None if vtx_id has no parent.
         :Return Type:
             int
+
+        .. note:: Implicit complexes (i.e. the complex of the parent) are
+            memoized until the next edition of the topology, so the
+            complex of each vertex is resolved only once.
         '''
         complex_id = self._complex.get(vtx_id)
-        while complex_id is None:
-            vtx_id = self.parent(vtx_id)
-            if vtx_id is None:
+        if complex_id is not None:
+            return complex_id
+
+        memo = self._caches.get('complex')
+        if memo is None:
+            memo = self._caches['complex'] = {}
+        elif vtx_id in memo:
+            return memo[vtx_id]
+
+        # Walk up to the first vertex with a known complex
+        path = [vtx_id]
+        vid = self.parent(vtx_id)
+        while vid is not None:
+            complex_id = self._complex.get(vid)
+            if complex_id is not None:
+                break
+            if vid in memo:
+                complex_id = memo[vid]
                 break
-            complex_id = self._complex.get(vtx_id)
+            path.append(vid)
+            vid = self.parent(vid)
+
+        for vid in path:
+            memo[vid] = complex_id
         return complex_id
 
     def complex_at_scale(self, vtx_id, scale):
@@ -788,7 +908,8 @@ class MTG(PropertyTree):
 
         self._components.setdefault(complex_id,[]).append(component_id)
         self._complex[component_id] = complex_id
-        self._scale[component_id] = self._scale[complex_id]+1
+        self._set_scale(component_id, self._scale[complex_id]+1)
+        self._topology_changed()
 
         return component_id
 
@@ -812,17 +933,18 @@ class MTG(PropertyTree):
             self._add_vertex_properties(child, properties)
         else:
             child = self.add_child(parent, child, **properties)
-        self._scale[child] = self._scale[parent]
+        self._set_scale(child, self._scale[parent])
 
 
         parent_complex = self.complex(parent)
 
         if complex not in self._children.get(parent_complex, []):
             self.add_child(parent_complex, complex)
-        self._scale[complex] = self._scale[parent_complex]
+        self._set_scale(complex, self._scale[parent_complex])
 
         self._components.setdefault(complex,[]).append(child)
         self._complex[child] = complex
+        self._topology_changed()
 
         return child, complex
 
@@ -948,6 +1070,8 @@ class MTG(PropertyTree):
                 scale[vid] = scale[vid]-root_scale
 
             self._scale[self.root] = 0
+            self._build_scale_index()
+            self._topology_changed()
 
             return self
         else:
@@ -955,8 +1079,8 @@ class MTG(PropertyTree):
             g = MTG()
             g.root = 0
 
-            for name in self.properties():
-                g.add_property(name)
+            for name, prop in self.properties().items():
+                g.add_property(name, dtype=getattr(prop, 'dtype', None))
 
             treeid_id[vtx_id] = g.root
             subtree = traversal.iter_mtg2(self, vtx_id)
@@ -1024,8 +1148,8 @@ class MTG(PropertyTree):
             g = MTG()
             g.root = mapping.setdefault(self.root,0)
 
-            for name in self.properties():
-                g.add_property(name)
+            for name, prop in self.properties().items():
+                g.add_property(name, dtype=getattr(prop, 'dtype', None))
 
             subtree = traversal.iter_mtg2(self, self.root)
 
@@ -1058,9 +1182,17 @@ class MTG(PropertyTree):
             self._complex = dict((mapping[k], mapping.get(v)) for k, v in self._complex.items())
             self._components = dict((mapping[k], [mapping[v] for v in l]) for k, l in self._components.items())
             self._scale = dict((mapping[k], s) for k, s in self._scale.items())
+            self._build_scale_index()
+            self._topology_changed()
             for name in self._properties:
                 d = self._properties[name]
-                self._properties[name] = dict((mapping[k], s) for k, s in d.items())
+                items = ((mapping[k], s) for k, s in d.items())
+                if isinstance(d, Column):
+                    self._properties[name] = Column(d.dtype, items)
+                elif isinstance(d, LabelColumn):
+                    self._properties[name] = LabelColumn(items)
+                else:
+                    self._properties[name] = dict(items)
 
             return self
 
@@ -1125,6 +1257,7 @@ class MTG(PropertyTree):
 
         # add the new vertices
         g._scale.update( (vid, inf_scale) for vid in complex_inf.values())
+        g._build_scale_index()
 
         # remove all the components of sup_vertices
         for v in sup_vertices:
@@ -1207,6 +1340,8 @@ class MTG(PropertyTree):
             if v in g._complex:
                 del g._complex[v]
 
+        g._build_scale_index()
+
         # And new components
         for component_id, complex_id in new_complex.items():
             g.add_component(complex_id,component_id)
@@ -1294,16 +1429,10 @@ class MTG(PropertyTree):
 
         .. seealso:: :func:`MTG`, :func:`openalea.mtg.aml.Index`, :func:`openalea.mtg.aml.Class`
         """
-        pattern = r'[a-zA-Z]+'
-        label = self.property('label').get(vid)
-        if not label:
-            return ''
-        else:
-            m=re.match(pattern, label)
-            if m:
-                return m.group(0)
-            else:
-                return ''
+        labels = self._properties.get('label', {})
+        if isinstance(labels, LabelColumn):
+            return labels.class_name(vid)
+        return split_label(labels.get(vid))[0]
 
     def index(self, vid):
         """
@@ -1317,16 +1446,36 @@ class MTG(PropertyTree):
         The label thus provides general information about a vertex and
         enables us to encode the plant components.
         """
-        pattern = r'[0-9]+$'
-        label = self.property('label').get(vid)
-        if not label:
-            return vid
+        labels = self._properties.get('label', {})
+        if isinstance(labels, LabelColumn):
+            index = labels.index(vid)
         else:
-            m=re.search(pattern, label)
-            if m:
-                return m.group(0)
-            else:
-                return vid
+            index = split_label(labels.get(vid))[1]
+        return vid if index is None else index
+
+    def class_vertices(self, class_name):
+        """
+        Vertices of a given class.
+
+        The vertices of each class are indexed when the labels are written,
+        so the MTG is not scanned.
+
+        :Usage:
+
+            >>> g.class_vertices('U')
+
+        :Parameters:
+            - `class_name` (str) : the class of the vertices (e.g. 'U')
+
+        :Returns:
+            list of vid
+
+        .. seealso:: :func:`class_name`, :func:`ClassScale`
+        """
+        labels = self._properties.get('label', {})
+        if isinstance(labels, LabelColumn):
+            return [v for v in labels.class_vertices(class_name) if v in self]
+        return [v for v in self.vertices_iter() if self.class_name(v) == class_name]
 
     #########################################################################
     # Proxy node interface
@@ -1424,6 +1573,12 @@ class MTG(PropertyTree):
         .. seealso:: :func:`MTG`, :func:`Class`, :func:`Scale`, :func:`Index`.
 
         """
+        labels = self._properties.get('label', {})
+        if isinstance(labels, LabelColumn):
+            for x in labels.class_vertices(c):
+                if x in self:
+                    return self.scale(x)
+            return
         for x in self.vertices_iter():
             if self.Class(x) == c:
                 return self.scale(x)
@@ -2373,6 +2528,7 @@ def fat_mtg(slim_mtg, preserve_order=False):
                     msg += str(cref) + " / " + str(ch)
                     assert set(ch) == set(cref), msg
                     slim_mtg._children[v] = ch
+    slim_mtg._topology_changed()
     return slim_mtg
 
 
@@ -2629,7 +2785,7 @@ def colored_tree(tree, colors):
             if complex_id:
                 g.add_component(complex_id, component_id)
             elif component_id:
-                g._scale[component_id] = scale
+                g._set_scale(component_id, scale)
 
     # copy the tree information in the MTG
     if isinstance(tree, MTG):
@@ -2646,6 +2802,8 @@ def colored_tree(tree, colors):
         for parent, children in tree._children.items():
             g._children[index_scale[parent]] = [index_scale[id] for id in children]
 
+    g._topology_changed()
+
     # Copy the properties of the tree
     for pname, prop in tree.properties().items():
         property = g._properties.setdefault(pname, {})
@@ -0,0 +1,152 @@
+# -*- python -*-
+#
+#       OpenAlea.mtg
+#
+#       Copyright 2008-2026 INRIA - CIRAD - INRA
+#
+#       File author(s): Christophe Pradal <christophe.pradal.at.cirad.fr>
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+################################################################################
+'''
+Compact state of the trees and MTGs for :mod:`pickle`.
+
+The dicts of the topology (vid -> vid, vid -> [vid]) and the properties
+whose values are all of the same type (int, float, bool or str) are packed
+into numpy arrays. With the pickle protocol 5, the arrays can be sent as
+out-of-band buffers, without being copied::
+
+    buffers = []
+    data = pickle.dumps(g, protocol=5, buffer_callback=buffers.append)
+    g = pickle.loads(data, buffers=buffers)
+
+A packed value is a tuple whose first item is its kind. Unpacking a dict
+returns it unchanged, so the objects pickled without packing can still be
+loaded. The order of the keys is kept.
+'''
+
+__docformat__ = "restructuredtext"
+
+import numpy as np
+
+from .column import LabelColumn
+
+_NONE = -1
+
+
+def _int_array(values, count):
+    ''' Array of python ints in the smallest integer type,
+    or None if they do not fit in an int64.
+    '''
+    try:
+        array = np.fromiter(values, dtype=np.int64, count=count)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if count:
+        for dtype in (np.int8, np.int16, np.int32):
+            info = np.iinfo(dtype)
+            if info.min <= array.min() and array.max() <= info.max:
+                return array.astype(dtype)
+    return array
+
+
+def _all_ints(values):
+    return all(type(v) is int for v in values)
+
+
+def pack_map(d):
+    ''' Pack a dict vid -> vid (or None). '''
+    if not d or not _all_ints(d):
+        return d
+    for v in d.values():
+        if not (type(v) is int and v != _NONE or v is None):
+            return d
+    keys = _int_array(d, len(d))
+    values = _int_array((_NONE if v is None else v for v in d.values()), len(d))
+    if keys is None or values is None:
+        return d
+    return ('map', keys, values)
+
+
+def unpack_map(packed):
+    ''' Inverse of :func:`pack_map`. '''
+    if not isinstance(packed, tuple):
+        return packed
+    _, keys, values = packed
+    return dict(zip(keys.tolist(), [None if v == _NONE else v for v in values.tolist()]))
+
+
+def pack_lists(d):
+    ''' Pack a dict vid -> list of vids. '''
+    if not d or not _all_ints(d) or not all(type(l) is list and _all_ints(l) for l in d.values()):
+        return d
+    keys = _int_array(d, len(d))
+    lengths = _int_array((len(l) for l in d.values()), len(d))
+    values = _int_array((v for l in d.values() for v in l), int(lengths.sum()))
+    if keys is None or values is None:
+        return d
+    return ('lists', keys, lengths, values)
+
+
+def unpack_lists(packed):
+    ''' Inverse of :func:`pack_lists`. '''
+    if not isinstance(packed, tuple):
+        return packed
+    _, keys, lengths, values = packed
+    values = values.tolist()
+    offsets = [0]
+    offsets.extend(np.cumsum(lengths, dtype=np.int64).tolist())
+    return dict((vid, values[offsets[i]:offsets[i+1]]) for i, vid in enumerate(keys.tolist()))
+
+
+_dtypes = {float: np.float64, bool: np.bool_}
+
+
+def pack_property(p):
+    ''' Pack a property (a dict or a :class:`~openalea.mtg.column.LabelColumn`)
+    whose values are all of the same type. The other properties
+    (e.g. :class:`~openalea.mtg.column.Column`) are returned unchanged.
+    '''
+    kind = type(p)
+    if kind not in (dict, LabelColumn) or not p or not _all_ints(p):
+        return p
+    values = p.values()
+    t = type(next(iter(values)))
+    if not all(type(v) is t for v in values):
+        return p
+    keys = _int_array(p, len(p))
+    if keys is None:
+        return p
+    if t is str:
+        table = {}
+        codes = np.fromiter((table.setdefault(v, len(table)) for v in values),
+                            dtype=np.int32, count=len(p))
+        return ('str', kind is LabelColumn, keys, codes, list(table))
+    if t is int:
+        array = _int_array(values, len(p))
+        if array is None:
+            return p
+    elif t in _dtypes:
+        array = np.fromiter(values, dtype=_dtypes[t], count=len(p))
+    else:
+        return p
+    return ('values', kind is LabelColumn, keys, array)
+
+
+def unpack_property(packed):
+    ''' Inverse of :func:`pack_property`. '''
+    if not isinstance(packed, tuple):
+        return packed
+    if packed[0] == 'str':
+        _, labels, keys, codes, table = packed
+        values = [table[c] for c in codes.tolist()]
+    else:
+        _, labels, keys, array = packed
+        values = array.tolist()
+    d = dict(zip(keys.tolist(), values))
+    return LabelColumn(d) if labels else d
@@ -419,13 +419,13 @@ class PlantFrame():
         default_diameter = 1 if not dresser.min_topdia else min(dresser.min_topdia.values())
         default_diameter *= 1./self.dresser.diameter_unit
 
-        strands = {}
-        for vid in traversal.post_order(g, v):
-            strands[vid] = max(sum([strands[c] for c in g.children(vid)]), 1)
+        # The number of strands of a vertex is the number of leaves it bears
+        leaves = dict((vid, 1) for vid in g.vertices(scale=max_scale) if g.is_leaf(vid))
+        strands = algo.accumulate(g, leaves, op='sum', scale=max_scale)
 
         diameters = {}
-        for vid, s in strands.items():
-            diameters[vid] = default_diameter * pow(s, 1./power)
+        for vid in algo.descendants(g, v):
+            diameters[vid] = default_diameter * pow(strands[vid], 1./power)
 
         return diameters
 
@@ -117,7 +117,28 @@ def pre_order2(tree, vtx_id, complex=None, visitor_filter=None):
         return
 
     edge_type = tree.property('edge_type')
-    
+
+    if complex is None and visitor_filter is None:
+        # Fast path without filtering
+        children = tree.children
+        stack = [vtx_id]
+        while stack:
+            vtx_id = stack.pop()
+            yield vtx_id
+
+            child = children(vtx_id)
+            if len(child) == 1:
+                stack.append(child[0])
+            elif child:
+                successor = [vid for vid in child if edge_type.get(vid) == '<']
+                if successor:
+                    # 1. select first '+' edges
+                    stack.extend(reversed(successor))
+                    stack.extend(vid for vid in reversed(child) if edge_type.get(vid) != '<')
+                else:
+                    stack.extend(reversed(child))
+        return
+
     queue = deque()
     queue.append(vtx_id)
 
@@ -174,22 +195,36 @@ def post_order(tree, vtx_id, complex=None, visitor_filter=None):
     ''' 
     Traverse a tree in a postfix way.
     (from leaves to root)
-    This is a recursive implementation
+
+    If defined, `visitor_filter.pre_order(vid)` is called before traversing
+    the sub-tree rooted on `vid`. This sub-tree is skipped if it returns False.
+    `visitor_filter.post_order(vid)` is called after the traversal of the
+    sub-tree, just before `vid` is returned.
+
+    This is a non recursive implementation.
     '''
     if complex is not None and tree.complex(vtx_id) != complex:
         return
     if visitor_filter and not visitor_filter.pre_order(vtx_id):
         return
-    
-    for vid in tree.children_iter(vtx_id):
-
-        for node in post_order(tree, vid, complex, visitor_filter):
-            yield node
 
+    children_iter = tree.children_iter
+    stack = [(vtx_id, children_iter(vtx_id))]
 
-    if visitor_filter:
-        visitor_filter.post_order(vtx_id)
-    yield vtx_id
+    while stack:
+        vtx_id, children = stack[-1]
+        for vid in children:
+            if complex is not None and tree.complex(vid) != complex:
+                continue
+            if visitor_filter and not visitor_filter.pre_order(vid):
+                continue
+            stack.append((vid, children_iter(vid)))
+            break
+        else: # all the children have been traversed
+            stack.pop()
+            if visitor_filter:
+                visitor_filter.post_order(vtx_id)
+            yield vtx_id
 
 
 def post_order2(tree, vtx_id, complex=None, pre_order_filter=None, post_order_visitor=None):
@@ -200,7 +235,13 @@ def post_order2(tree, vtx_id, complex=None, pre_order_filter=None, post_order_vi
     Same algorithm than post_order.
     The goal is to replace the post_order implementation.
 
-        
+    The children are traversed in the reverse order of :func:`pre_order2`
+    ('<' children before '+' ones).
+    `pre_order_filter(vid)` is called once on each child when its parent
+    is reached. The sub-tree rooted on `vid` is skipped if it returns False.
+    `post_order_visitor(vid)` is called just before `vid` is returned.
+
+    This is a non recursive implementation.
     '''
 
     edge_type = tree.property('edge_type')
@@ -227,28 +268,20 @@ def post_order2(tree, vtx_id, complex=None, pre_order_filter=None, post_order_vi
                 plus.append(v)
         
         plus.extend(successor)
-        child = plus
-        return reversed(child)
+        plus.reverse()
+        return iter(plus)
 
-    visited = set([])
-    
-    queue = [vtx_id]
-
-    # 1. select first '+' edges
-
-    while queue:
+    stack = [(vtx_id, order_children(vtx_id))]
 
-        vtx_id = queue[-1]
-        for vid in order_children(vtx_id):
-            if vid not in visited:
-                queue.append(vid)
-                break
+    while stack:
+        vtx_id, children = stack[-1]
+        for vid in children:
+            stack.append((vid, order_children(vid)))
+            break
         else: # no child or all have been visited
+            stack.pop()
             post_order_visitor(vtx_id)
             yield vtx_id
-            visited.add(vtx_id)
-            queue.pop()
-            
 
 
 def traverse_tree(tree, vtx_id, visitor):
@@ -373,17 +406,49 @@ def iter_mtg2(mtg, vtx_id):
     .. seealso:: :func:`iter_mtg`, :func:`iter_mtg_with_filter`, :func:`iter_mtg2_with_filter`
         
     .. note:: Use this function instead of :func:`iter_mtg`
+
+    .. note:: This is a non recursive implementation in O(n).
     """
-    visited = {vtx_id:True}
+    visited = set([vtx_id])
+    outside = set()
     complex_id = vtx_id
 
     max_scale = mtg.max_scale()
+    complex = mtg.complex
 
     yield vtx_id
     for vtx_id in mtg.component_roots_at_scale_iter(complex_id, max_scale):
         for vid in pre_order2(mtg, vtx_id):
-            for node in iter_scale2(mtg, vid, complex_id, visited):
-                yield node
+            if complex(vid) in visited:
+                # most frequent case: the complex has already been traversed
+                visited.add(vid)
+                yield vid
+            else:
+                for node in _new_complexes(mtg, vid, visited, outside):
+                    yield node
+
+def _new_complexes(g, vtx_id, visited, outside):
+    """ Internal method used by :func:`iter_mtg2` and :func:`iter_mtg2_with_filter`.
+
+    Return `vtx_id` preceded by its complexes which have not been visited
+    yet, from the coarsest scale to the finest one.
+    Vertices which do not belong to the traversed complex (i.e. which have
+    no visited complex) are stored in `outside`.
+    Each vertex is thus processed only once during the traversal.
+    """
+    chain = []
+    v = vtx_id
+    while v is not None and v not in visited and v not in outside:
+        chain.append(v)
+        v = g.complex(v)
+
+    if v is not None and v in visited:
+        visited.update(chain)
+        chain.reverse()
+        return chain
+    else:
+        outside.update(chain)
+        return ()
 
 def iter_scale2(g, vtx_id, complex_id, visited):
     """ Internal method used by :func:`iter_mtg` and :func:`iter_mtg_with_visitor`.
@@ -569,7 +634,8 @@ def iter_mtg2_with_filter(mtg, vtx_id, pre_order_filter=None, post_order_visitor
     if post_order_visitor is None:
         post_order_visitor = lambda x: None
 
-    visited = {vtx_id:True}
+    visited = set([vtx_id])
+    outside = set()
     complex_id = vtx_id
 
     max_scale = mtg.max_scale()
@@ -586,7 +652,7 @@ def iter_mtg2_with_filter(mtg, vtx_id, pre_order_filter=None, post_order_visitor
                                           pre_order_filter=None, 
                                           post_order_visitor=post_order_visitor,
                                           complex=None):
-            for node in iter_scale2(mtg, vid, complex_id, visited):
+            for node in _new_complexes(mtg, vid, visited, outside):
 
                 scale = mtg.scale(node)
                 if scale != max_scale:
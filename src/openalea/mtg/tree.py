@@ -32,6 +32,8 @@ __revision__ = " $Id$ "
 #from interface.graph import IRootedGraph, InvalidVertex, InvalidEdge
 #from traversal.tree import pre_order, post_order
 from .traversal import *
+from .column import Column
+from . import packing
 
 class GraphError(Exception):
     """
@@ -65,6 +67,18 @@ class Tree():
         self._parent = {root : None}
         self._children = {}
 
+        # Data computed from the topology (e.g. traversal indices).
+        # It is cleared each time the topology is modified.
+        self._caches = {}
+
+    def _topology_changed(self):
+        '''
+        Invalidate the data cached on the topology.
+
+        Has to be called by every method that edits the tree structure.
+        '''
+        if self._caches:
+            self._caches.clear()
 
     #########################################################################
     # Some Vertex List Graph Concept methods.
@@ -155,6 +169,7 @@ class Tree():
                 del self._parent[vid]
             if vid in self._children:
                 del self._children[vid]
+            self._topology_changed()
         else:
             raise InvalidVertex('Can not remove vertex %d  with children. Use remove_tree instead.'% vid)
 
@@ -171,6 +186,7 @@ class Tree():
         self._parent.clear()
         self._children.clear()
         self._parent[self._root] = None
+        self._topology_changed()
 
     #########################################################################
     # RootedTreeConcept methods.
@@ -185,6 +201,7 @@ class Tree():
         self._root = vtx_id
         if self._root not in self._parent:
             self._parent[self._root] = None
+        self._topology_changed()
 
     def get_root(self):
         '''
@@ -306,6 +323,7 @@ class Tree():
 
         self._children.setdefault(parent,[]).append(child)
         self._parent[child] = parent
+        self._topology_changed()
 
         return child
 
@@ -328,6 +346,7 @@ class Tree():
         siblings.insert(index,vtx_id2)
 
         self._parent[vtx_id2] = parent
+        self._topology_changed()
 
         return vtx_id2
 
@@ -355,6 +374,7 @@ class Tree():
             index = children.index(vtx_id)
             children[index] = parent_id
             self._parent[parent_id] = old_parent
+        self._topology_changed()
         return parent_id
 
     def replace_parent(self, vtx_id, new_parent_id, **properties):
@@ -382,6 +402,7 @@ class Tree():
             children = self._children[old_parent]
             index = children.index(vtx_id)
             del children[index]
+        self._topology_changed()
 
 
     def __str__(self):
@@ -423,6 +444,7 @@ class Tree():
 
             self._root = vtx_id
             self._parent[self._root] = None
+            self._topology_changed()
             return self
         else:
             treeid_id = {}
@@ -513,6 +535,21 @@ class Tree():
         """
         return deepcopy(self)
 
+    def __getstate__(self):
+        # The topology is packed in arrays (see :mod:`~openalea.mtg.packing`)
+        state = self.__dict__.copy()
+        state['_caches'] = {}
+        state['_parent'] = packing.pack_map(self._parent)
+        state['_children'] = packing.pack_lists(self._children)
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        state['_parent'] = packing.unpack_map(state['_parent'])
+        state['_children'] = packing.unpack_lists(state['_children'])
+        state.setdefault('_caches', {})
+        self.__dict__.update(state)
+
 
 class PropertyTree(Tree):
 
@@ -524,6 +561,18 @@ class PropertyTree(Tree):
         self._properties = {}
         self._graph_properties = {}
 
+    def __getstate__(self):
+        state = super(PropertyTree, self).__getstate__()
+        state['_properties'] = dict((name, packing.pack_property(p))
+                                    for name, p in self._properties.items())
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        state['_properties'] = dict((name, packing.unpack_property(p))
+                                    for name, p in state['_properties'].items())
+        super(PropertyTree, self).__setstate__(state)
+
     def remove_vertex(self, vid, reparent_child=False):
         """
         remove a specified vertex of the graph
@@ -622,14 +671,15 @@ class PropertyTree(Tree):
                     del self._children[vid]
 
             self.root = vtx_id
+            self._topology_changed()
             return self
         else:
             treeid_id = {}
             tree = self.__class__()
             tree.root = 0
 
-            for name in self.properties():
-                tree.add_property(name)
+            for name, prop in self.properties().items():
+                tree.add_property(name, dtype=getattr(prop, 'dtype', None))
             
             treeid_id[vtx_id] = tree.root
             tree._add_vertex_properties(tree.root, self.get_vertex_property(vtx_id))
@@ -721,12 +771,21 @@ class PropertyTree(Tree):
         '''
         return self._properties.setdefault(name, {})
 
-    def add_property(self, property_name):
+    def add_property(self, property_name, dtype=None):
         """
         Add a new map between vid and a data
         Do not fill this property for any vertex
+
+        :Parameters:
+            - `property_name` - name of the property
+            - `dtype` - optional number type ('INT', 'REAL' or a numpy dtype).
+              If given, the values are stored in a typed
+              :class:`~openalea.mtg.column.Column` instead of a dict.
         """
-        self._properties[property_name] = {}
+        if dtype is None:
+            self._properties[property_name] = {}
+        else:
+            self._properties[property_name] = Column(dtype)
 
     def remove_property(self, property_name):
         """
@@ -0,0 +1,491 @@
+# -*- python -*-
+#
+#       OpenAlea.mtg
+#
+#       Copyright 2008-2026 INRIA - CIRAD - INRA
+#
+#       File author(s): Christophe Pradal <christophe.pradal.at.cirad.fr>
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+################################################################################
+'''
+Topological indices computed once on a tree or an MTG.
+
+The :class:`IntervalIndex` numbers the vertices of the graph in pre-order
+(the order of :func:`~openalea.mtg.traversal.pre_order2`).
+The descendants of a vertex are then a contiguous slice of this order,
+and ancestor queries are answered by comparing two integers.
+The same numbering is done on the decomposition forest
+(a vertex is the parent of its components), which answers the
+`ContainedIn` queries of the AML functions in constant time.
+
+The :class:`LCAIndex` answers lowest common ancestor queries in constant
+time with a sparse table on the depths of the vertices in pre-order.
+
+Indices are cached on the graph by :func:`interval_index` and
+:func:`lca_index` and discarded as soon as the topology of the graph
+is edited.
+
+:Usage:
+
+.. code-block:: python
+
+    from openalea.mtg.tree_index import interval_index
+
+    index = interval_index(g)
+    index.is_ancestor(v1, v2)
+    index.descendants(v1)
+    lca_index(g).lca(v1, v2)
+'''
+
+__docformat__ = "restructuredtext"
+
+import numpy as np
+
+from .tree import InvalidVertex
+
+
+def _caches(g):
+    ''' Return the dict where the indices of `g` are cached.
+    '''
+    caches = g.__dict__.get('_caches')
+    if caches is None:
+        # graphs created before the caches existed (e.g. old pickles)
+        caches = g._caches = {}
+    return caches
+
+
+def interval_index(g):
+    ''' Return the :class:`IntervalIndex` of `g`.
+
+    The index is computed on the first call and cached on the graph
+    until its topology is edited.
+
+    :Parameters:
+        - `g` (Tree, MTG or FrozenMTG)
+
+    :Returns:
+        - `index` (IntervalIndex)
+    '''
+    caches = _caches(g)
+    index = caches.get('interval_index')
+    if index is None:
+        index = caches['interval_index'] = IntervalIndex(g)
+    return index
+
+
+def lca_index(g):
+    ''' Return the :class:`LCAIndex` of `g`.
+
+    The index is computed on the first call and cached on the graph
+    until its topology is edited.
+
+    :Parameters:
+        - `g` (Tree, MTG or FrozenMTG)
+
+    :Returns:
+        - `index` (LCAIndex)
+    '''
+    caches = _caches(g)
+    index = caches.get('lca_index')
+    if index is None:
+        index = caches['lca_index'] = LCAIndex(interval_index(g))
+    return index
+
+
+def _intervals(order, parent_pos):
+    ''' Compute the end of the subtree of each position of a pre-order.
+    '''
+    n = len(order)
+    size = [1]*n
+    for i in range(n-1, 0, -1):
+        p = parent_pos[i]
+        if p >= 0:
+            size[p] += size[i]
+    return np.arange(n, dtype=np.int64) + np.array(size, dtype=np.int64)
+
+
+def _depths(start, stop):
+    ''' Number of strict ancestors at each position of a pre-order.
+    '''
+    n = len(start)
+    delta = np.bincount(start, minlength=n+1) - np.bincount(stop, minlength=n+1)
+    return np.cumsum(delta[:n]) - 1
+
+
+def _group_by_depth(depth):
+    ''' Split the positions by increasing depth.
+    '''
+    positions = np.argsort(depth, kind='stable')
+    return np.split(positions, np.cumsum(np.bincount(depth))[:-1])
+
+
+class IntervalIndex(object):
+    ''' Pre-order numbering of the vertices of a tree or an MTG.
+
+    For each vertex `v`, `pre[v]` is the position of `v` in the pre-order
+    and `end[v]` the position following its last descendant.
+    Thus `v2` is a descendant of `v1` iff `pre[v1] <= pre[v2] < end[v1]`.
+
+    The vertices of the different scales of an MTG belong to different
+    trees of the same forest. The decomposition forest, where the
+    components of a vertex are its children, is numbered the same way.
+
+    The index is built in O(n) and does not keep any reference to the graph.
+    '''
+
+    def __init__(self, g):
+        vertices = list(g.vertices_iter())
+        n = max(vertices)+1 if vertices else 0
+
+        edge_type = g.property('edge_type')
+        parent = g.parent
+        children = g.children
+
+        # 1. pre-order of the forest: '+' children before '<' children
+        roots = [v for v in vertices if parent(v) is None]
+        order = []
+        append = order.append
+        stack = roots[::-1]
+        push = stack.extend
+        while stack:
+            v = stack.pop()
+            append(v)
+            kids = children(v)
+            if len(kids) == 1:
+                stack.append(kids[0])
+            elif kids:
+                succ = [vid for vid in kids if edge_type.get(vid) == '<']
+                if succ:
+                    push(reversed(succ))
+                    push(reversed([vid for vid in kids if edge_type.get(vid) != '<']))
+                else:
+                    push(reversed(kids))
+
+        pre = np.full(n, -1, dtype=np.int64)
+        pre[order] = np.arange(len(order), dtype=np.int64)
+        pre_mv = memoryview(pre)
+        parent_pos = [-1 if p is None else pre_mv[p] for p in map(parent, order)]
+        end = np.full(n, -1, dtype=np.int64)
+        end[order] = _intervals(order, parent_pos)
+
+        self._order = np.array(order, dtype=np.int64)
+        self._parent_pos = np.array(parent_pos, dtype=np.int64)
+        self._pre = pre
+        self._end = end
+
+        # 2. resolve the complex of each vertex and number the decomposition
+        explicit = getattr(g, '_complex', None)
+        complex_id = [-1]*len(order)
+        if explicit is not None:
+            for i, v in enumerate(order):
+                c = explicit.get(v)
+                if c is None:
+                    p = parent_pos[i]
+                    if p >= 0:
+                        complex_id[i] = complex_id[p]
+                else:
+                    complex_id[i] = c
+
+        components = {}
+        droots = []
+        for i, v in enumerate(order):
+            c = complex_id[i]
+            if c < 0:
+                droots.append(v)
+            else:
+                components.setdefault(c, []).append(v)
+
+        dorder = []
+        append = dorder.append
+        stack = droots[::-1]
+        while stack:
+            v = stack.pop()
+            append(v)
+            comps = components.get(v)
+            if comps:
+                stack.extend(reversed(comps))
+
+        dpre = np.full(n, -1, dtype=np.int64)
+        dpre[dorder] = np.arange(len(dorder), dtype=np.int64)
+        complex_array = np.full(n, -1, dtype=np.int64)
+        complex_array[order] = complex_id
+        dpre_mv = memoryview(dpre)
+        dparent_pos = [-1 if c < 0 else dpre_mv[c] for c in complex_array[dorder].tolist()]
+        dend = np.full(n, -1, dtype=np.int64)
+        dend[dorder] = _intervals(dorder, dparent_pos)
+
+        self._complex_array = complex_array
+        self._dpre = dpre
+        self._dend = dend
+
+        self._pre_mv = pre_mv
+        self._end_mv = memoryview(end)
+        self._dpre_mv = dpre_mv
+        self._dend_mv = memoryview(dend)
+        self._complex_mv = memoryview(complex_array)
+
+    def __len__(self):
+        return len(self._order)
+
+    def levels(self):
+        ''' Group the vertices by depth, to process a whole level at once.
+
+        :Returns:
+            - `parent` (array) - the pre-order position of the parent of
+              the vertex at each position (-1 for the roots),
+            - `levels` (list of arrays) - the positions of the vertices at
+              depth 0 (the roots), 1, 2, ...
+        '''
+        levels = self.__dict__.get('_levels')
+        if levels is None:
+            n = len(self)
+            end = self._end[self._order]
+            levels = self._levels = (self._parent_pos, _group_by_depth(_depths(np.arange(n), end)))
+        return levels
+
+    def decomposition_levels(self):
+        ''' Group the vertices by depth in the decomposition forest.
+
+        :Returns:
+            - `complex` (array) - the pre-order position of the complex of
+              the vertex at each position (-1 if it has no complex),
+            - `levels` (list of arrays) - the positions of the vertices
+              with 0, 1, 2, ... complexes.
+        '''
+        levels = self.__dict__.get('_decomposition_levels')
+        if levels is None:
+            vids = self._order
+            complex_ids = self._complex_array[vids]
+            complex_pos = np.where(complex_ids >= 0, self._pre[complex_ids], -1)
+            dpre = self._dpre[vids]
+            depth = _depths(dpre, self._dend[vids])[dpre]
+            levels = self._decomposition_levels = (complex_pos, _group_by_depth(depth))
+        return levels
+
+    def __contains__(self, vid):
+        try:
+            return vid >= 0 and self._pre_mv[vid] >= 0
+        except (IndexError, TypeError):
+            return False
+
+    def is_ancestor(self, vid1, vid2):
+        ''' Test if `vid1` is an ancestor of `vid2` (or `vid2` itself).
+
+        :Parameters:
+            - `vid1`, `vid2` (int) - vertex identifiers
+
+        :Returns:
+            - True if `vid1` is on the path from `vid2` to its root.
+              Vertices unknown to the index are ancestors of none.
+        '''
+        if vid1 not in self or vid2 not in self:
+            return False
+        pre = self._pre_mv
+        return pre[vid1] <= pre[vid2] < self._end_mv[vid1]
+
+    def subtree(self, vid):
+        ''' Return the bounds of the subtree rooted at `vid`.
+
+        :Returns:
+            - `(start, stop)` such that `pre_order()[start:stop]` are
+              the descendants of `vid`.
+        '''
+        return self._pre_mv[vid], self._end_mv[vid]
+
+    def nb_descendants(self, vid):
+        ''' Return the number of vertices in the subtree rooted at `vid`.
+        '''
+        return self._end_mv[vid] - self._pre_mv[vid]
+
+    def descendants(self, vid):
+        ''' Return the vertices of the subtree rooted at `vid` in pre-order.
+
+        The first element is `vid`.
+        '''
+        return self._order[self._pre_mv[vid]:self._end_mv[vid]].tolist()
+
+    def pre_order(self):
+        ''' Return all the vertices in pre-order, scale after scale.
+        '''
+        return self._order.tolist()
+
+    def complex(self, vid):
+        ''' Return the complex of `vid`, or None.
+        '''
+        c = self._complex_mv[vid]
+        return None if c < 0 else c
+
+    def is_contained_in(self, vid, complex_id):
+        ''' Test if `vid` is a component of `complex_id` at any scale.
+
+        This is equivalent to
+        ``g.complex_at_scale(vid, g.scale(complex_id)) == complex_id``
+        for `complex_id` at a coarser scale than `vid`.
+        A vertex is contained in itself.
+        '''
+        if vid not in self or complex_id not in self:
+            return False
+        dpre = self._dpre_mv
+        return dpre[complex_id] <= dpre[vid] < self._dend_mv[complex_id]
+
+
+class LCAIndex(object):
+    ''' Lowest common ancestor queries in constant time.
+
+    Let `u` and `v` be two vertices of the same tree with `pre[u] < pre[v]`.
+    Among the vertices whose pre-order position is in `]pre[u], pre[v]]`,
+    the one of lowest depth is a child of the lowest common ancestor of
+    `u` and `v`. This range minimum is found in O(1) with a sparse table
+    built in O(n log n).
+
+    Vertices of different trees (e.g. of different scales) have no common
+    ancestor.
+    '''
+
+    def __init__(self, index):
+        self._index = index
+
+        n = len(index)
+        parent_pos = index._parent_pos.tolist()
+        depth = [0]*n
+        root = list(range(n))
+        for i, p in enumerate(parent_pos):
+            if p >= 0:
+                depth[i] = depth[p]+1
+                root[i] = root[p]
+
+        dtype = np.int32 if n < 2**31 else np.int64
+        self._depth = np.array(depth, dtype=dtype)
+        self._root = np.array(root, dtype=dtype)
+        # vertex id of the parent of each position
+        self._parent = np.where(index._parent_pos >= 0,
+                                index._order[index._parent_pos], -1)
+
+        # table[j][i] is the position of lowest depth in [i, i+2**j[
+        depth = self._depth
+        table = [np.arange(n, dtype=dtype)]
+        k = 1
+        while 2*k <= n:
+            prev = table[-1]
+            a, b = prev[:n-2*k+1], prev[k:n-k+1]
+            table.append(np.where(depth[a] <= depth[b], a, b))
+            k *= 2
+        self._table = table
+
+        self._depth_mv = memoryview(self._depth)
+        self._root_mv = memoryview(self._root)
+        self._parent_mv = memoryview(self._parent)
+        self._table_mv = [memoryview(t) for t in table]
+
+    def _position(self, vid):
+        if vid not in self._index:
+            raise InvalidVertex(vid)
+        return self._index._pre_mv[vid]
+
+    def _positions(self, vids):
+        vids = np.asarray(vids, dtype=np.int64)
+        pre = self._index._pre
+        valid = (vids >= 0) & (vids < len(pre))
+        pos = np.full(vids.shape, -1, dtype=np.int64)
+        pos[valid] = pre[vids[valid]]
+        if (pos < 0).any():
+            raise InvalidVertex(vids[pos < 0][0])
+        return pos
+
+    def lca(self, vid1, vid2):
+        ''' Return the lowest common ancestor of `vid1` and `vid2`.
+
+        :Parameters:
+            - `vid1`, `vid2` (int) - vertex identifiers
+
+        :Returns:
+            - the vertex id of the lowest common ancestor,
+              or None if the vertices belong to different trees.
+        '''
+        p1, p2 = self._position(vid1), self._position(vid2)
+        if p1 == p2:
+            return vid1
+        if self._root_mv[p1] != self._root_mv[p2]:
+            return None
+        if p1 > p2:
+            p1, p2 = p2, p1
+        # range ]p1, p2]
+        j = (p2-p1).bit_length()-1
+        table = self._table_mv[j]
+        a, b = table[p1+1], table[p2-(1 << j)+1]
+        depth = self._depth_mv
+        return self._parent_mv[a if depth[a] <= depth[b] else b]
+
+    def depth(self, vid):
+        ''' Return the number of edges between `vid` and its root.
+        '''
+        return self._depth_mv[self._position(vid)]
+
+    def distance(self, vid1, vid2):
+        ''' Return the number of edges on the path between two vertices.
+
+        :Returns:
+            - the topological distance, or None if the vertices belong to
+              different trees.
+        '''
+        c = self.lca(vid1, vid2)
+        if c is None:
+            return None
+        depth = self._depth_mv
+        pre = self._index._pre_mv
+        return depth[pre[vid1]] + depth[pre[vid2]] - 2*depth[pre[c]]
+
+    def _lca_positions(self, p1, p2):
+        ''' Vectorized lca on positions. Return -1 for different trees.
+        '''
+        lo = np.minimum(p1, p2)
+        hi = np.maximum(p1, p2)
+        result = np.where(self._root[lo] == self._root[hi], lo, -1)
+
+        depth = self._depth
+        todo = (lo < hi) & (result >= 0)
+        l, r = lo[todo]+1, hi[todo]
+        j = np.frexp((r-l+1).astype(np.float64))[1]-1
+        found = np.empty(len(l), dtype=np.int64)
+        for level in np.unique(j):
+            table = self._table[level]
+            mask = j == level
+            a = table[l[mask]]
+            b = table[r[mask]-(1 << int(level))+1]
+            child = np.where(depth[a] <= depth[b], a, b)
+            found[mask] = self._index._parent_pos[child]
+        result[todo] = found
+        return result
+
+    def lca_many(self, vids1, vids2):
+        ''' Return the lowest common ancestors of many pairs of vertices.
+
+        :Parameters:
+            - `vids1`, `vids2` (array of int) - vertex identifiers of the
+              first and second elements of the pairs
+
+        :Returns:
+            - a numpy array of vertex ids, -1 for pairs of vertices
+              belonging to different trees.
+        '''
+        pos = self._lca_positions(self._positions(vids1), self._positions(vids2))
+        return np.where(pos >= 0, self._index._order[pos], -1)
+
+    def distance_many(self, vids1, vids2):
+        ''' Return the topological distances between many pairs of vertices.
+
+        :Returns:
+            - a numpy array of number of edges, -1 for pairs of vertices
+              belonging to different trees.
+        '''
+        p1 = self._positions(vids1)
+        p2 = self._positions(vids2)
+        pos = self._lca_positions(p1, p2)
+        depth = self._depth.astype(np.int64)
+        return np.where(pos >= 0, depth[p1] + depth[p2] - 2*depth[pos], -1)
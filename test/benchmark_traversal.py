@@ -0,0 +1,96 @@
+""" Benchmark of the multiscale traversal iter_mtg2.
+
+Compare the linear implementation of :func:`openalea.mtg.traversal.iter_mtg2`
+with the previous recursive one (based on `iter_scale2`)
+on the MTG files of the data directory and on synthetic MTGs.
+
+Usage (from the test directory)::
+
+    python benchmark_traversal.py [nb_vertices ...]
+
+The default sizes of the synthetic MTGs are 10^4, 10^5 and 10^6 vertices.
+"""
+import glob
+import random
+import sys
+from time import perf_counter as clock
+
+from openalea.mtg import MTG
+from openalea.mtg.traversal import iter_mtg2, iter_scale2, pre_order2
+
+
+def recursive_iter_mtg2(mtg, vtx_id):
+    """ The previous implementation of iter_mtg2. """
+    visited = {vtx_id: True}
+    complex_id = vtx_id
+
+    max_scale = mtg.max_scale()
+
+    yield vtx_id
+    for vtx_id in mtg.component_roots_at_scale_iter(complex_id, max_scale):
+        for vid in pre_order2(mtg, vtx_id):
+            for node in iter_scale2(mtg, vid, complex_id, visited):
+                yield node
+
+
+def synthetic_mtg(nb_vertices, branching=0.1, seed=0):
+    """ Build a plant with 3 scales (Plant, Axis, Internode) and long axes.
+
+    Each new internode continues a random axis, and starts a new axis
+    with probability `branching`.
+    """
+    rng = random.Random(seed)
+    g = MTG()
+    plant = g.add_component(g.root, label='P', edge_type='/')
+    axis = g.add_component(plant, label='A', edge_type='/')
+    tips = [g.add_component(axis, label='I', edge_type='/')]
+    edge_type = g.property('edge_type')
+    label = g.property('label')
+
+    n = 4
+    while n < nb_vertices:
+        i = rng.randrange(len(tips))
+        if rng.random() < branching:
+            vid, axis = g.add_child_and_complex(tips[i], edge_type='+', label='I')
+            edge_type[axis] = '+'
+            label[axis] = 'A'
+            tips.append(vid)
+            n += 2
+        else:
+            tips[i] = g.add_child(tips[i], edge_type='<', label='I')
+            n += 1
+    return g
+
+
+def bench(g, name):
+    t = clock()
+    l1 = list(recursive_iter_mtg2(g, g.root))
+    t_old = clock() - t
+
+    t = clock()
+    l2 = list(iter_mtg2(g, g.root))
+    t_new = clock() - t
+
+    assert l1 == l2
+    print('%-35s %9d %10.4f %10.4f %8.1fx' % (name, len(g), t_old, t_new, t_old/t_new))
+
+
+def main(sizes):
+    print('%-35s %9s %10s %10s %9s' % ('MTG', 'vertices', 'recursive', 'linear', 'speedup'))
+    for fn in sorted(glob.glob('data/*.mtg')):
+        try:
+            g = MTG(fn)
+        except Exception:
+            continue
+        bench(g, fn)
+
+    for n in sizes:
+        t = clock()
+        g = synthetic_mtg(n)
+        print('# synthetic MTG built in %.1fs' % (clock() - t))
+        bench(g, 'synthetic (%d)' % n)
+
+
+if __name__ == '__main__':
+    sizes = [int(float(s)) for s in sys.argv[1:]] or [10**4, 10**5, 10**6]
+    main(sizes)
@@ -0,0 +1,167 @@
+import glob
+
+import numpy as np
+import pytest
+
+from openalea.mtg import *
+from openalea.mtg.column import Column, StringColumn
+from openalea.mtg.frozen import FrozenMTG
+from openalea.mtg.io import read_mtg_file, save_binary, load_binary
+from openalea.mtg import binary
+
+
+def same_mtg(g, h):
+    assert g._parent == h._parent
+    assert g._children == h._children
+    assert g._complex == h._complex
+    assert g._components == h._components
+    assert g._scale == h._scale
+    assert g.properties() == h.properties()
+    assert dict(g.graph_properties()) == dict(h.graph_properties())
+
+
+def test_round_trip(tmp_path):
+    fn = str(tmp_path / 'g.bmtg')
+    for mtg_file in ['data/test8_boutdenoylum2.mtg', 'data/mtg_dynamic.mtg',
+                     'data/reconstructed_appletree.mtg']:
+        g = read_mtg_file(mtg_file)
+        save_binary(g, fn)
+        for mmap in (True, False):
+            fg = load_binary(fn, mmap=mmap)
+            assert isinstance(fg, FrozenMTG)
+            assert len(fg) == len(g)
+            assert list(fg.vertices()) == list(g.vertices())
+            for name, p in g.properties().items():
+                assert dict(fg.property(name)) == p
+            same_mtg(g, fg.thaw())
+
+
+def test_columns(tmp_path):
+    fn = str(tmp_path / 'g.bmtg')
+    g = read_mtg_file('data/test8_boutdenoylum2.mtg')
+    g.graph_properties()['author'] = 'me'
+    save_binary(g, fn)
+
+    fg = load_binary(fn)
+    assert isinstance(fg._properties['label'], StringColumn)
+    assert isinstance(fg._properties['edge_type'], StringColumn)
+    assert isinstance(fg._properties['_line'], Column)
+    assert fg._properties['_line'].dtype == np.int64
+    assert fg.graph_properties()['author'] == 'me'
+
+    h = fg.thaw()
+    v = h.roots(scale=1)[0]
+    assert h.class_name(v) == g.class_name(v)
+    assert list(h.class_vertices('P')) == list(g.class_vertices('P'))
+
+    # save a FrozenMTG
+    save_binary(fg, fn)
+    same_mtg(g, load_binary(fn).thaw())
+
+
+def test_mixed_values(tmp_path):
+    fn = str(tmp_path / 'g.bmtg')
+    g = MTG()
+    v1 = g.add_component(g.root, label='P1')
+    v2 = g.add_component(v1, label='I1', length=1.5, values=[1, 2])
+    v3 = g.add_child(v2, label='I2', length=3, values='a')
+    g.node(v3).extra = None
+    save_binary(g, fn)
+
+    fg = load_binary(fn)
+    assert fg.property('length') == {v2: 1.5, v3: 3}
+    assert isinstance(fg.property('length')[v3], int)
+    assert fg.property('values') == {v2: [1, 2], v3: 'a'}
+    assert fg.property('extra') == {v3: None}
+    same_mtg(g, fg.thaw())
+
+
+def test_errors(tmp_path):
+    fn = tmp_path / 'g.bmtg'
+    fn.write_bytes(b'not an mtg')
+    with pytest.raises(ValueError):
+        load_binary(str(fn))
+
+    g = read_mtg_file('data/mtg1.mtg')
+    save_binary(g, str(fn))
+    data = bytearray(fn.read_bytes())
+    data[:binary._prefix.size] = binary._prefix.pack(binary.MAGIC, binary.VERSION+1, binary._prefix.unpack(data[:binary._prefix.size])[2])
+    fn.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        load_binary(str(fn))
+
+
+def test_compressed(tmp_path):
+    g = read_mtg_file('data/test8_boutdenoylum2.mtg')
+    for ext in ('gz', 'xz'):
+        fn = str(tmp_path / ('g.bmtg.' + ext))
+        save_binary(g, fn)
+        with open(fn, 'rb') as f:
+            assert f.read(len(binary.MAGIC)) != binary.MAGIC
+        same_mtg(g, load_binary(fn).thaw())
+
+    fn = str(tmp_path / 'g.bmtg')
+    save_binary(g, fn)
+    with open(fn, 'rb') as f:
+        fg = load_binary(f)
+    same_mtg(g, fg.thaw())
+
+    # file objects
+    from io import BytesIO
+    for compression in (None, 'gzip'):
+        f = BytesIO()
+        save_binary(g, f, compression=compression)
+        assert not f.closed
+        if compression is None:
+            with open(fn, 'rb') as f1:
+                assert f.getvalue() == f1.read()
+        f.seek(0)
+        same_mtg(g, load_binary(f).thaw())
+
+
+def _shared_summary(name):
+    from openalea.mtg.binary import attach_mtg
+    fg = attach_mtg(name)
+    v = fg.vertices(scale=3)[10]
+    return (len(fg), fg.parent(v), fg.children(v), fg.complex(v), fg.components(fg.complex(v)),
+            fg.property('Length').get(v), fg.label(v))
+
+
+def test_shared_memory(capfd):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from openalea.mtg.binary import share_mtg, attach_mtg
+
+    g = read_mtg_file('data/test9_noylum2.mtg')
+    v = g.vertices(scale=3)[10]
+    expected = (len(g), g.parent(v), g.children(v), g.complex(v), g.components(g.complex(v)),
+                g.property('Length').get(v), g.label(v))
+    shm = share_mtg(g)
+    try:
+        fg = attach_mtg(shm.name)
+        assert isinstance(fg, FrozenMTG)
+        assert not fg._parent_array.flags.writeable
+        same_mtg(g, fg.thaw())
+        # the block stays open while its arrays are used
+        parents = fg._parent_array
+        del fg
+        assert parents[v] == g.parent(v)
+        del parents
+
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            assert list(pool.map(_shared_summary, [shm.name]*2)) == [expected]*2
+        # the workers share the resource tracker of the creator
+        for method in ('spawn', 'forkserver'):
+            if method in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context(method)
+                with ProcessPoolExecutor(max_workers=2, mp_context=context) as pool:
+                    assert list(pool.map(_shared_summary, [shm.name]*2)) == [expected]*2
+    finally:
+        shm.close()
+        shm.unlink()
+
+    # the block was still registered by its creator when it was unlinked
+    # (stop the resource tracker to wait for its messages)
+    from multiprocessing import resource_tracker
+    resource_tracker._resource_tracker._stop()
+    assert 'KeyError' not in capfd.readouterr().err
@@ -0,0 +1,97 @@
+import copy
+import pickle
+
+import numpy as np
+import pytest
+
+from openalea.mtg import *
+from openalea.mtg.column import Column
+from openalea.mtg.io import read_mtg_file
+
+
+def test_column():
+    c = Column('REAL')
+    assert c.dtype == np.float64
+    assert len(c) == 0 and 3 not in c
+    c[3] = 2.5
+    c[1] = 1
+    assert c[1] == 1. and isinstance(c[1], float)
+    assert list(c) == [1, 3]
+    assert c == {1: 1., 3: 2.5}
+    assert c.get(2) is None and c.get(-1, 0) == 0
+    with pytest.raises(KeyError):
+        c[2]
+
+    # values which do not fit in the array
+    c[2] = 'a'
+    c['x'] = 1.
+    c[3] = None
+    assert len(c) == 4
+    assert c == {1: 1., 2: 'a', 3: None, 'x': 1.}
+    assert c.overflow == {2: 'a', 3: None, 'x': 1.}
+    c[3] = 4.
+    assert 3 not in c.overflow and c[3] == 4.
+
+    del c[1]
+    del c['x']
+    assert c == {2: 'a', 3: 4.}
+    with pytest.raises(KeyError):
+        del c[1]
+
+    vids, values = c.arrays()
+    assert list(vids) == [3] and list(values) == [4.]
+    assert c.array[3] == 4. and list(c.mask) == [False]*3 + [True] + [False]*12
+    taken = c.take([3, 1, 100])
+    assert taken[0] == 4. and np.isnan(taken[1:]).all()
+
+    i = Column('INT', {0: 1, 5: 2**70, 6: True, 7: 2.5})
+    assert i[0] == 1 and isinstance(i[0], int)
+    assert i.overflow == {5: 2**70, 6: True, 7: 2.5}
+    assert list(i.take([0, 1], default=-1)) == [1, -1]
+
+    assert pickle.loads(pickle.dumps(i)) == i
+    assert copy.deepcopy(c) == c
+    assert c.copy() == c
+
+    with pytest.raises(ValueError):
+        Column('ALPHA')
+
+
+def test_typed_properties():
+    for fn in ['data/test8_boutdenoylum2.mtg', 'data/mtg_dynamic.mtg']:
+        g = read_mtg_file(fn)
+        h = read_mtg_file(fn, typed_properties=True)
+        assert g.properties() == h.properties()
+
+    g = read_mtg_file('data/test8_boutdenoylum2.mtg', typed_properties=True)
+    line = g.property('_line')
+    assert isinstance(line, Column) and line.dtype == np.int64
+    assert not isinstance(g.property('label'), Column)
+
+    v = max(line)
+    del line[v]
+    assert v not in line and len(line) == len(g) - 2
+
+    h = g.sub_mtg(g.roots(scale=1)[0])
+    assert isinstance(h.property('_line'), Column)
+    h = g.reindex()
+    assert isinstance(h.property('_line'), Column)
+    assert sorted(h.property('_line').values()) == sorted(line.values())
+    g.reindex(copy=False)
+    assert g.property('_line') == h.property('_line')
+    assert pickle.loads(pickle.dumps(g)).properties() == g.properties()
+
+    g.add_property('length', dtype='REAL')
+    g.node(1).length = 3
+    assert g.property('length') == {1: 3.}
+
+
+def test_label_column_merge():
+    from openalea.mtg.column import LabelColumn
+
+    labels = LabelColumn({1: 'P1', 2: 'U1'})
+    labels.merge(LabelColumn({0: 'root', 1: 'P2', 2: 'U3', 3: 'E1'}), 10)
+    assert dict(labels) == {0: 'root', 1: 'P1', 2: 'U1', 11: 'P2', 12: 'U3', 13: 'E1'}
+    assert labels == LabelColumn(dict(labels))
+    assert list(labels.class_vertices('U')) == [2, 12]
+    assert labels.class_name(13) == 'E' and labels.index(12) == '3'
@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from openalea.mtg import *
+from openalea.mtg.column import Column
+from openalea.mtg.algo import orders, heights
+from openalea.mtg.io import read_mtg_file
+from openalea.mtg.dataframe import (to_dataframe, from_dataframe, from_arrays,
+                                    to_arrow, from_arrow, write_parquet, read_parquet)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+requires_arrow = pytest.mark.skipif(pa is None, reason="pyarrow not available")
+
+
+def test_to_dataframe():
+    g = read_mtg_file('data/test8_boutdenoylum2.mtg', typed_properties=True)
+    names = list(g.property_names())
+    df = to_dataframe(g)
+    # g is not modified
+    assert list(g.property_names()) == names
+
+    assert list(df.index) == sorted(g.vertices())
+    assert list(df.columns) == names + ['parent', 'complex', 'scale', 'order']
+    assert isinstance(df['label'].dtype, pd.CategoricalDtype)
+    assert isinstance(df['edge_type'].dtype, pd.CategoricalDtype)
+    assert df['_line'].dtype == 'Int64' and df['Dist'].dtype == np.float64
+    assert df['label'][5] == g.label(5) and df['Dist'][3] == g.property('Dist')[3]
+    assert df['parent'][5] == g.parent(5) and df['parent'].isna()[1]
+    assert df['complex'][5] == g.complex(5) and df['complex'][1] == 0
+    assert df['order'].to_dict() == orders(g)
+
+    df = to_dataframe(g, scale=3, properties=['label'], include=('height', 'rank'))
+    assert list(df.index) == sorted(g.vertices(scale=3))
+    assert list(df.columns) == ['label', 'height', 'rank']
+    h = heights(g, scale=3)
+    assert all(df['height'][v] == h[v] for v in df.index)
+
+    with pytest.raises(ValueError):
+        to_dataframe(g, include=('unknown',))
+
+
+def same_topology(g, h):
+    assert g._parent == h._parent
+    assert g._children == h._children
+    assert g._scale == h._scale
+    for v in g.vertices():
+        assert g.complex(v) == h.complex(v)
+        assert g.components(v) == h.components(v)
+
+
+def test_from_dataframe():
+    for fn in ['data/mtg1.mtg', 'data/test8_boutdenoylum2.mtg', 'data/mtg_dynamic.mtg']:
+        g = read_mtg_file(fn)
+        h = from_dataframe(to_dataframe(g, include=('parent', 'complex', 'scale', 'order', 'height')))
+        same_topology(g, h)
+        assert h.properties() == g.properties()
+        assert 'order' not in h.properties()
+
+    g = read_mtg_file('data/test8_boutdenoylum2.mtg')
+    h = from_dataframe(to_dataframe(g), typed_properties=True)
+    assert isinstance(h.property('_line'), Column)
+    assert h.property('_line') == g.property('_line')
+    assert h.class_name(5) == g.class_name(5)
+
+    # vertex ids in a column, edges missing at coarser scales
+    df = to_dataframe(g).reset_index(names='vid')
+    coarse = df['scale'] < 3
+    df.loc[coarse, 'parent'] = pd.NA
+    h = from_dataframe(df, fat_mtg=True)
+    assert dict((v, h.parent(v)) for v in g.vertices()) == dict((v, g.parent(v)) for v in g.vertices())
+
+
+def test_from_arrays():
+    # root, plant and two internodes
+    g = from_arrays([0, 1, 2, 3], [-1, -1, -1, 2], [-1, 0, 1, 1], [0, 1, 2, 2],
+                    properties=dict(label=['', 'P1', 'I1', 'I2'],
+                                    length=np.array([np.nan, np.nan, 1., 2.])))
+    assert g.children(2) == [3] and g.components(1) == [2, 3]
+    assert g.complex(3) == 1 and 3 not in g._complex
+    assert g.property('length') == {2: 1., 3: 2.}
+    assert g.label(3) == 'I2' and g.nb_scales() == 3
+
+    # the root is created
+    g = from_arrays([1, 2], [-1, 1], [0, -1], [1, 1])
+    assert g.children(1) == [2] and g.components(0) == [1, 2]
+
+    bad = [([1, 1], [-1, -1], [0, 0], [1, 1]),      # duplicated id
+           ([1, 2], [-1, 5], [0, -1], [1, 1]),      # unknown parent
+           ([1, 2], [-1, -1], [0, 7], [1, 2]),      # unknown complex
+           ([1, 2], [-1, 1], [0, -1], [1, 2]),      # parent at another scale
+           ([1, 2], [-1, -1], [0, 0], [1, 2]),      # complex not at the scale above
+           ([1, 2], [-1, -1], [0, -1], [1, 1]),     # no parent nor complex
+           ([1, 2, 3], [-1, 3, 2], [0, -1, -1], [1, 1, 1]),   # cycle
+           ([1], [-1], [0], [1, 1])]                # lengths
+    for arrays in bad:
+        with pytest.raises(ValueError):
+            from_arrays(*arrays)
+
+
+def same_mtg(g, h):
+    same_topology(g, h)
+    assert g.properties() == h.properties()
+
+
+@requires_arrow
+def test_arrow():
+    for fn in ['data/mtg1.mtg', 'data/test8_boutdenoylum2.mtg',
+               'data/mtg_dynamic.mtg', 'data/test11_wij10.mtg']:
+        g = read_mtg_file(fn)
+        table = to_arrow(g)
+        assert table.num_rows == len(g)
+        assert table.column_names[:5] == ['vid', 'parent', 'complex', 'scale', 'plant']
+        same_mtg(g, from_arrow(table))
+
+    g = read_mtg_file('data/test8_boutdenoylum2.mtg')
+    table = to_arrow(g, scales=[1, 2], columns=['label', 'Dist'])
+    assert table.column_names[5:] == ['label', 'Dist']
+    assert pa.types.is_dictionary(table.schema.field('label').type)
+    assert to_arrow(g).schema.field('Dist').type == pa.float64()
+    h = from_arrow(table)
+    assert sorted(h.vertices()) == sorted(g.vertices(scale=0)+g.vertices(scale=1)+g.vertices(scale=2))
+    assert h.property('Dist') == dict((v, x) for v, x in g.property('Dist').items() if g.scale(v) <= 2)
+
+    with pytest.raises(ValueError):
+        from_arrow(to_arrow(g, scales=[2, 3]))
+
+    # the topology is checked
+    table = to_arrow(g)
+    with pytest.raises(ValueError):
+        from_arrow(pa.concat_tables([table, table.slice(2, 1)]))
+    scales = table.column('scale').to_pylist()
+    scales[-1] += 1
+    with pytest.raises(ValueError):
+        from_arrow(table.set_column(3, 'scale', pa.array(scales, type=pa.int32())))
+
+
+@requires_arrow
+def test_mixed_values():
+    g = MTG()
+    v1 = g.add_component(g.root, label='P1')
+    v2 = g.add_component(v1, label='I1', x=1, y=[1, 2])
+    g.add_child(v2, label='I2', x='a', y=[3])
+    table = to_arrow(g)
+    assert table.schema.field('x').type == pa.binary()
+    assert table.schema.field('y').type == pa.list_(pa.int64())
+    same_mtg(g, from_arrow(table))
+
+
+@requires_arrow
+def test_parquet(tmp_path):
+    fn = str(tmp_path / 'g.parquet')
+    g = read_mtg_file('data/test11_wij10.mtg')
+    plants = g.component_roots_at_scale(g.root, 1)
+    assert len(plants) > 1
+
+    write_parquet(g, fn, row_group_size=1)
+    # the root and one row group per plant
+    assert pq.ParquetFile(fn).num_row_groups == len(plants) + 1
+    same_mtg(g, read_parquet(fn))
+
+    p = plants[1]
+    h = read_parquet(fn, columns=['label'], plants=[p])
+    assert 'label' in h.property_names() and 'Dist' not in h.property_names()
+    assert sorted(h.vertices()) == sorted([g.root] + [v for v in g.vertices()
+                                                    if v != g.root and g.complex_at_scale(v, 1) == p])
+    assert h.label(p) == g.label(p)
+    assert h.children(p) == [] and h.components(p) == g.components(p)
+
+    h = read_parquet(fn, scales=[1])
+    assert sorted(h.vertices()) == sorted(g.vertices(scale=0) + g.vertices(scale=1))
+    assert h.vertices(scale=1) == g.vertices(scale=1) and h.nb_scales() == 2
@@ -0,0 +1,90 @@
+from openalea.mtg import *
+from openalea.mtg.traversal import *
+from openalea.mtg.frozen import FrozenMTG
+
+
+def check(g, fg):
+    assert len(fg) == len(g)
+    assert fg.root == g.root
+    assert fg.scales() == g.scales()
+    assert fg.max_scale() == g.max_scale()
+    assert fg.vertices() == g.vertices()
+    for scale in g.scales():
+        assert fg.vertices(scale=scale) == g.vertices(scale=scale)
+        assert fg.nb_vertices(scale=scale) == g.nb_vertices(scale=scale)
+        assert fg.roots(scale=scale) == g.roots(scale=scale)
+    for v in g:
+        assert fg.scale(v) == g.scale(v)
+        assert fg.parent(v) == g.parent(v)
+        assert fg.children(v) == g.children(v)
+        assert fg.complex(v) == g.complex(v)
+        assert fg.components(v) == g.components(v)
+        assert fg.component_roots(v) == g.component_roots(v)
+        assert fg[v] == g[v]
+    assert list(iter_mtg2(fg, fg.root)) == list(iter_mtg2(g, g.root))
+
+
+def test_freeze():
+    g = MTG('data/test9_noylum2.mtg')
+    fg = g.freeze()
+    assert isinstance(fg, FrozenMTG)
+    check(g, fg)
+
+    v = g.vertices(scale=3)[10]
+    assert fg.Descendants(v) == g.Descendants(v)
+    assert fg.Ancestors(v) == g.Ancestors(v)
+    assert fg.Sons(v) == g.Sons(v)
+    assert fg.Axis(v) == g.Axis(v)
+    assert fg.Complex(v, Scale=1) == g.Complex(v, Scale=1)
+    assert fg.label(v) == g.label(v)
+    assert fg.property('Length') == g.property('Length')
+
+    assert 12345678 not in fg
+    assert fg.parent(12345678) is None
+    assert fg.children(12345678) == []
+
+    # negative ids are not indices from the end
+    for v in (-1, -2, -len(fg)):
+        assert v not in fg
+        assert fg.parent(v) is None and fg.complex(v) is None
+        assert fg.children(v) == [] and fg.nb_children(v) == 0
+        assert fg.components(v) == []
+        assert v not in fg._complex and v not in fg._components
+
+
+def test_freeze_is_a_snapshot():
+    g = MTG()
+    random_tree(g, g.root, 3, 100)
+    g = random_mtg(g, 4)
+    fg = g.freeze()
+    check(g, fg)
+
+    n = len(g)
+    g.add_child(g.vertices(scale=3)[0], edge_type='<')
+    assert len(fg) == n
+    try:
+        fg.property('edge_type')[1] = '+'
+    except TypeError:
+        pass
+    else:
+        assert False, 'properties of a FrozenMTG are read-only'
+
+
+def test_thaw():
+    g = MTG('data/test10_agraf.mtg')
+    g1 = g.freeze().thaw()
+    for name in ('_parent', '_children', '_complex', '_components', '_scale', '_properties'):
+        assert getattr(g1, name) == getattr(g, name), name
+    check(g1, g1.freeze())
+
+    v = g1.add_child(g1.vertices(scale=g1.max_scale())[-1], edge_type='<')
+    assert g1.nb_vertices() == len(g)+1
+
+
+def test_pickle():
+    import pickle
+
+    g = MTG('data/test9_noylum2.mtg')
+    fg = pickle.loads(pickle.dumps(g.freeze()))
+    check(g, fg)
+    assert fg.property('Length') == g.property('Length')
@@ -225,3 +225,131 @@ def test_reindex():
         assert g0[v] == g[v]
         
 
+
+def check_scale_index(g):
+    for scale in range(g.max_scale()+1):
+        expected = [v for v in g._scale if g._scale[v] == scale]
+        assert list(g.vertices_iter(scale=scale)) == expected
+        assert g.nb_vertices(scale=scale) == len(expected)
+    assert g.scales() == sorted(set(g._scale.values()))
+
+def test_vertices_at_scale():
+    g = MTG()
+    random_tree(g, g.root, 3, 100)
+    g = random_mtg(g, 4)
+    check_scale_index(g)
+
+    g1 = g.reindex(copy=True)
+    check_scale_index(g1)
+    g.reindex()
+    check_scale_index(g)
+
+    leaf = [v for v in g.vertices(scale=3) if g.is_leaf(v)][0]
+    g.remove_vertex(leaf)
+    check_scale_index(g)
+    assert leaf not in g.vertices(scale=3)
+
+    g = MTG()
+    vid = g.add_component(g.root, label='P')
+    vid = g.add_component(vid, label='S')
+    for et in '++<':
+        g.add_child(vid, label='S', edge_type=et)
+    g.insert_scale(inf_scale=2, partition=lambda v: g.edge_type(v) != '<')
+    check_scale_index(g)
+    assert g.nb_scales() == 4
+    assert g.nb_vertices(scale=2) == 3
+
+    g, _ = g.remove_scale(2)
+    check_scale_index(g)
+    assert g.nb_scales() == 3
+
+    g.clear()
+    check_scale_index(g)
+    assert g.nb_vertices(scale=1) == 0
+
+def test_implicit_complex():
+    g = MTG()
+    p1 = g.add_component(g.root, label='P')
+    v = g.add_component(p1, label='A')
+    axis = [v]
+    for i in range(10):
+        axis.append(g.add_child(axis[-1], edge_type='<', label='A'))
+    assert [g.complex(v) for v in axis] == [p1]*11
+    assert [g.complex_at_scale(v, 0) for v in axis] == [g.root]*11
+
+    # edit the topology after the complexes have been resolved
+    p2 = g.add_child(p1, edge_type='<', label='P')
+    g.add_component(p2, axis[5])
+    assert [g.complex(v) for v in axis] == [p1]*5 + [p2]*6
+    g.remove_vertex(axis[-1])
+    assert g.complex(axis[-1]) is None
+
+def test_class_name():
+    import pickle, re
+    from openalea.mtg.column import LabelColumn
+
+    def expected(g, v):
+        label = g.property('label').get(v)
+        if not label:
+            return '', v
+        m = re.match('[a-zA-Z]+', label)
+        i = re.search('[0-9]+$', label)
+        return (m.group(0) if m else ''), (i.group(0) if i else v)
+
+    g = MTG('data/test8_boutdenoylum2.mtg')
+    assert isinstance(g.property('label'), LabelColumn)
+    for h in [g, g.copy(), pickle.loads(pickle.dumps(g)), g.freeze(), g.freeze().thaw(),
+              g.reindex(), g.sub_mtg(g.roots(scale=1)[0])]:
+        for v in h.vertices():
+            assert (h.class_name(v), h.index(v)) == expected(h, v)
+        classes = set(h.class_name(v) for v in h.vertices()) - set([''])
+        for c in classes:
+            assert h.class_vertices(c) == [v for v in h.vertices() if h.class_name(v) == c]
+            assert h.ClassScale(c) == h.scale(h.class_vertices(c)[0])
+
+    # derived columns are updated when labels are written
+    labels = g.property('label')
+    v = g.class_vertices('U')[0]
+    labels[v] = 'E12'
+    assert (g.class_name(v), g.index(v)) == ('E', '12')
+    assert v in g.class_vertices('E') and v not in g.class_vertices('U')
+    g.node(v).label = 'X'
+    assert (g.class_name(v), g.index(v)) == ('X', v)
+    del labels[v]
+    assert (g.class_name(v), g.index(v)) == ('', v)
+    assert g.class_vertices('X') == [] and g.ClassScale('X') is None
+    labels.update({v: 'U1'})
+    assert v in g.class_vertices('U')
+
+def test_pickle():
+    import pickle
+    from openalea.mtg.io import read_mtg_file
+    from openalea.mtg.tree import Tree
+
+    for typed in (False, True):
+        g = read_mtg_file('data/test11_wij10.mtg', typed_properties=typed)
+        g.property('label')[1] = 12         # mixed values are pickled as a dict
+        g.add_property('flag')
+        g.property('flag').update({2: True, 3: False})
+        data = pickle.dumps(g, protocol=5)
+        assert len(data) < len(pickle.dumps(g.__dict__, protocol=5))
+
+        buffers = []
+        data = pickle.dumps(g, protocol=5, buffer_callback=buffers.append)
+        assert buffers
+        for h in (pickle.loads(data, buffers=buffers), g.copy()):
+            for name in ('_parent', '_children', '_complex', '_components', '_scale'):
+                assert getattr(h, name) == getattr(g, name), name
+                assert list(getattr(h, name)) == list(getattr(g, name)), name
+            assert h.vertices(scale=3) == g.vertices(scale=3)
+            assert h.properties() == g.properties()
+            assert all(type(h._properties[name]) is type(p) for name, p in g._properties.items())
+            assert h.class_vertices('U') == g.class_vertices('U')
+
+            # still editable
+            v = h.add_child(h.vertices(scale=3)[-1], edge_type='<', label='U1', XX=1.)
+            assert h.property('XX')[v] == 1.
+
+    t = Tree()
+    t.add_child(0)
+    assert pickle.loads(pickle.dumps(t))._children == t._children
@@ -76,3 +76,204 @@ def test11():
     fn = r'data/test11_wij10.mtg'
     #g = check(fn)
 
+
+def same_mtg(g1, g2):
+    assert g1._parent == g2._parent
+    assert g1._children == g2._children
+    assert g1._complex == g2._complex
+    assert g1._components == g2._components
+    assert g1._scale == g2._scale
+    assert g1.properties() == g2.properties()
+
+def test_stream():
+    fn = r'data/test8_boutdenoylum2.mtg'
+    g = read_mtg_file(fn)
+    with open(fn) as f:
+        txt = f.read()
+        f.seek(0)
+        same_mtg(g, read_mtg(f))
+    same_mtg(g, read_mtg(txt))
+
+    # _line is the line number of the vertex in the file
+    lines = txt.splitlines()
+    for vid, no_line in g.property('_line').items():
+        assert lines[no_line].split()[0].endswith(g.label(vid))
+
+def test_multiscale_edit():
+    symbols = {'P': 1, 'A': 2, 'U': 3}
+    code = '/P1/A1/U1<U2[+A2/U3<U4]<U5'
+    g = multiscale_edit(code, symbols)
+
+    builder = MultiscaleBuilder(symbols)
+    for line in ['/P1/A1/U1', '<U2', '[+A2/U3', '<U4]', '<U5']:
+        builder.add_line(line)
+    same_mtg(g, builder.finish())
+
+    assert len(g) == 9
+    u2, u3 = g.class_vertices('U')[1:3]
+    assert g.parent(u3) == u2 and g.edge_type(u3) == '+'
+    assert g.label(g.complex(u3)) == 'A2'
+
+def test_parallel():
+    fn = r'data/test11_wij10.mtg'
+    for typed in (False, True):
+        g = read_mtg_file(fn, typed_properties=typed)
+        h = read_mtg_file(fn, workers=2, typed_properties=typed)
+        same_mtg(g, h)
+        assert g._id == h._id
+        assert list(g.class_vertices('P')) == list(h.class_vertices('P'))
+        assert type(g.property('label')) is type(h.property('label'))
+
+    # one plant: parsed in the main process
+    fn = r'data/test8_boutdenoylum2.mtg'
+    same_mtg(read_mtg_file(fn), read_mtg_file(fn, workers=None))
+
+def test_plants(tmp_path):
+    import os, shutil
+    import pytest
+
+    fn = str(tmp_path / 'wij10.mtg')
+    shutil.copy('data/test11_wij10.mtg', fn)
+    g = read_mtg_file(fn)
+    index = plant_index(fn)
+    assert [p[0] for p in index['plants']] == [g.label(v) for v in g.vertices(scale=1)]
+    assert not os.path.exists(fn + '.idx')
+
+    h = read_mtg_file(fn, plants=['P5', 3])
+    assert [h.label(v) for v in h.vertices(scale=1)] == ['P3', 'P5']
+    p3 = [v for v in g.vertices(scale=1) if g.label(v) == 'P3'][0]
+    h3 = h.vertices(scale=1)[0]
+    assert h.nb_components(h3) == g.nb_components(p3)
+    assert h.property('_line')[h3] == g.property('_line')[p3]
+    def lines(g, plant):
+        return sorted(g.property('_line')[v] for v in g.vertices(scale=3)
+                      if g.complex_at_scale(v, 1) == plant and v in g.property('_line'))
+    assert lines(h, h3) == lines(g, p3)
+
+    with pytest.raises(ValueError):
+        read_mtg_file(fn, plants=[42])
+
+    # sidecar index, updated when the file changes
+    assert plant_index(fn, sidecar=True) == index
+    assert os.path.exists(fn + '.idx')
+    assert plant_index(fn) == index
+    with open(fn, 'a') as f:
+        f.write('/P11\n')
+    assert plant_index(fn)['plants'][-1][0] == 'P11'
+
+def test_features():
+    import pickle
+    import pytest
+    from openalea.mtg.column import LazyColumn
+
+    fn = r'data/test10_agraf.mtg'
+    g = read_mtg_file(fn)
+
+    h = read_mtg_file(fn, features=['XX', 'TopDia'], keep_line_numbers=False)
+    assert set(h.property_names()) == {'edge_type', 'index', 'label', 'XX', 'TopDia'}
+    assert h.property('XX') == g.property('XX')
+    assert h.property('TopDia') == g.property('TopDia')
+    with pytest.raises(ValueError):
+        read_mtg_file(fn, features=['Length'])
+
+    for options in ({}, dict(workers=2), dict(typed_properties=True)):
+        h = read_mtg_file(fn, lazy=True, **options)
+        xx = h.property('XX')
+        assert isinstance(xx, LazyColumn) and not xx.loaded
+        assert dict(xx) == dict(g.property('XX')) and xx.loaded
+        same_mtg(g, h)
+        assert all(not isinstance(p, LazyColumn)
+                   for p in pickle.loads(pickle.dumps(h))._properties.values())
+
+    # only the selected fields are kept, until all the columns are loaded
+    h = read_mtg_file(fn, features=['XX', 'TopDia'], lazy=True)
+    xx, top_dia = h.property('XX'), h.property('TopDia')
+    raw = xx._load.args[0]
+    assert raw and all(l.count('\t') == 1 for l in raw.values())
+    assert dict(xx) == dict(g.property('XX')) and raw
+    assert dict(top_dia) == dict(g.property('TopDia'))
+    assert raw == {}
+
+def test_cache(tmp_path, monkeypatch):
+    import os, shutil
+    from openalea.mtg import cache, io
+
+    fn = str(tmp_path / 'noylum2.mtg')
+    shutil.copy('data/test8_boutdenoylum2.mtg', fn)
+    directory = str(tmp_path / 'cache')
+    g = read_mtg_file(fn, cache=directory)
+    assert len(os.listdir(directory)) == 1
+
+    # loaded without parsing
+    def parse(self):
+        raise AssertionError('parsed')
+    monkeypatch.setattr(io.Reader, 'parse', parse)
+    h = read_mtg_file(fn, cache=directory)
+    same_mtg(g, h)
+    assert g.properties() == h.properties()
+    monkeypatch.undo()
+
+    # other options or modified file: parsed again
+    h = read_mtg_file(fn, cache=directory, features=['Dist'])
+    assert 'NFe' not in h.property_names()
+    with open(fn, 'a') as f:
+        f.write('/P2\n')
+    assert len(read_mtg_file(fn, cache=directory)) > len(g)
+    assert len(os.listdir(directory)) == 3
+
+    size = sum(os.path.getsize(os.path.join(directory, e)) for e in os.listdir(directory))
+    cache.evict(directory, size - 1)
+    assert len(os.listdir(directory)) == 2
+    cache.clear_cache(directory)
+    assert os.listdir(directory) == []
+
+def test_load_many():
+    import pytest
+
+    paths = ['data/test8_boutdenoylum2.mtg', 'data/test11_wij10.mtg', 'data/no_file.mtg']
+    for workers in (1, 2):
+        results = dict((fn, (g, warnings, error))
+                       for fn, g, warnings, error in load_many(paths, workers=workers, on_error='collect'))
+        assert set(results) == set(paths)
+        g, warnings, error = results['data/no_file.mtg']
+        assert g is None and isinstance(error, FileNotFoundError)
+        for fn in paths[:2]:
+            g, warnings, error = results[fn]
+            assert error is None and warnings == []
+            h = read_mtg_file(fn)
+            same_mtg(g, h)
+            assert g.properties() == h.properties()
+
+        with pytest.raises(FileNotFoundError):
+            list(load_many(paths, workers=workers))
+
+    # the MTGs sent by the workers are smaller than the pickled dicts
+    import pickle
+    from openalea.mtg.io import _load_file
+    g, _, _ = _load_file('data/test9_noylum2.mtg', dict(has_line_as_param=True))
+    assert len(pickle.dumps(g)) < len(pickle.dumps(g.__dict__))
+
+def test_plant_boundaries(tmp_path):
+    # '/I1<I2...' lines start at the first column but are not plants
+    fn = r'data/code_file.mtg'
+    g = read_mtg_file(fn)
+    h = read_mtg_file(fn, workers=3)
+    same_mtg(g, h)
+    assert g.properties() == h.properties()
+    assert [p[0] for p in plant_index(fn)['plants']] == ['P1']
+
+    # two plants
+    with open(fn) as f:
+        txt = f.read()
+    code = txt[txt.index('/P1/U1'):]
+    fn2 = str(tmp_path / 'two_plants.mtg')
+    with open(fn2, 'w') as f:
+        f.write(txt + code.replace('/P1/U1', '/P2/U1'))
+    g = read_mtg_file(fn2)
+    same_mtg(g, read_mtg_file(fn2, workers=2))
+    assert [p[0] for p in plant_index(fn2)['plants']] == ['P1', 'P2']
+    h = read_mtg_file(fn2, plants=[2])
+    p2 = g.vertices(scale=1)[1]
+    h2 = h.vertices(scale=1)[0]
+    assert h.label(h2) == 'P2'
+    assert h.nb_components(h2) == g.nb_components(p2)
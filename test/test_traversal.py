@@ -85,3 +85,48 @@ def test_iter_mtg_nplants():
     assert len(list(iter_mtg2_with_filter(g, p1, lambda x:True, None))) ==  22
     assert len(list(iter_mtg2_with_filter(g, p2, lambda x : True, None))) ==  22
 
+
+def recursive_iter_mtg2(mtg, vtx_id):
+    visited = {vtx_id:True}
+    yield vtx_id
+    for vid in mtg.component_roots_at_scale_iter(vtx_id, mtg.max_scale()):
+        for v in pre_order2(mtg, vid):
+            for node in iter_scale2(mtg, v, vtx_id, visited):
+                yield node
+
+def test_iter_mtg2_order():
+    for fn in ['data/test8_boutdenoylum2.mtg', 'data/mtg_dynamic.mtg']:
+        g = MTG(fn)
+        for v in g.vertices(scale=1) + g.vertices(scale=2)[:30] + [g.root]:
+            l = list(recursive_iter_mtg2(g, v))
+            assert list(iter_mtg2(g, v)) == l
+            assert list(iter_mtg2_with_filter(g, v)) == l
+        assert sorted(iter_mtg2(g, g.root)) == sorted(g.vertices())
+
+def test_post_order_long_axis():
+    g = MTG()
+    vid = g.add_component(g.root)
+    vid = root = g.add_component(vid)
+    axis = [root]
+    for i in range(5000):
+        vid = g.add_child(vid, edge_type='<')
+        axis.append(vid)
+    branch = g.add_child(root, edge_type='+')
+
+    l = list(post_order(g, root))
+    assert len(l) == 5002
+    assert l[0] == vid and l[-1] == root
+    assert list(post_order2(g, root)) == l
+
+    class Visitor(object):
+        def __init__(self):
+            self.pre, self.post = [], []
+        def pre_order(self, v):
+            self.pre.append(v)
+            return True
+        def post_order(self, v):
+            self.post.append(v)
+    visitor = Visitor()
+    assert list(post_order(g, root, visitor_filter=visitor)) == l
+    assert visitor.post == l
+    assert visitor.pre == axis + [branch]
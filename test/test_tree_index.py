@@ -0,0 +1,209 @@
+import numpy as np
+import pytest
+
+from openalea.mtg import *
+from openalea.mtg import algo
+from openalea.mtg.traversal import pre_order2
+from openalea.mtg.tree_index import interval_index
+
+
+def naive_ancestors(g, v):
+    l = []
+    while v is not None:
+        l.append(v)
+        v = g.parent(v)
+    return l
+
+
+def naive_components(g, v):
+    l = [v]
+    for c in g.components_iter(v):
+        l.extend(naive_components(g, c))
+    return l
+
+
+def check(g):
+    index = interval_index(g)
+    assert len(index) == len(g)
+    for v1 in g:
+        anc = set(naive_ancestors(g, v1))
+        assert index.descendants(v1) == list(pre_order2(g, v1))
+        assert index.nb_descendants(v1) == len(index.descendants(v1))
+        assert index.complex(v1) == g.complex(v1)
+        for v2 in g:
+            assert index.is_ancestor(v2, v1) == (v2 in anc)
+            if g.scale(v2) < g.scale(v1):
+                contained = g.complex_at_scale(v1, scale=g.scale(v2)) == v2
+                assert index.is_contained_in(v1, v2) == contained
+
+
+def test_interval_index():
+    g = MTG('data/test8_boutdenoylum2.mtg')
+    check(g)
+    check(g.freeze())
+    check(g.sub_mtg(g.roots(scale=1)[0]))
+    check(MTG('data/test6_apricot2.mtg'))
+
+
+def test_interval_index_is_updated():
+    g = MTG('data/test8_boutdenoylum2.mtg')
+    index = interval_index(g)
+    assert interval_index(g) is index
+
+    v = max(g.vertices(scale=g.max_scale()))
+    new = g.add_child(v, edge_type='<', label='X')
+    assert interval_index(g) is not index
+    assert algo.is_ancestor(g, v, new)
+    check(g)
+
+    g.remove_vertex(new)
+    assert not algo.is_ancestor(g, v, new)
+    check(g)
+
+
+def test_algo():
+    g = MTG('data/test8_boutdenoylum2.mtg')
+    vertices = g.vertices(scale=g.max_scale())
+    root = g.roots(scale=g.max_scale())[0]
+    leaf = vertices[-1]
+
+    p, sign = algo.path(g, root, leaf)
+    assert list(p) == naive_ancestors(g, leaf)[::-1] and sign == 1
+    p, sign = algo.path(g, leaf, root)
+    assert list(p) == naive_ancestors(g, leaf)[::-1] and sign == -1
+    assert algo.path(g, vertices[1], g.root)[1] == 0
+
+    for v in vertices:
+        desc = list(pre_order2(g, v))
+        assert list(algo.descendants(g, v)) == desc
+        assert set(algo.extremities(g, v)) == set(x for x in desc if g.is_leaf(x))
+
+    # ContainedIn
+    for cid in g.vertices(scale=1):
+        for v in g.component_roots_at_scale(cid, scale=g.max_scale()):
+            contained = [x for x in pre_order2(g, v)
+                         if g.complex_at_scale(x, scale=1) == cid]
+            assert list(algo.descendants(g, v, ContainedIn=cid)) == contained
+
+
+def naive_lca(g, v1, v2):
+    anc = naive_ancestors(g, v1)
+    for v in naive_ancestors(g, v2):
+        if v in anc:
+            return v
+
+
+def test_lca():
+    g = MTG('data/test8_boutdenoylum2.mtg')
+    vertices = g.vertices()
+    pairs = [(v1, v2) for v1 in vertices for v2 in vertices]
+    lcas = algo.lca_many(g, pairs)
+    lengths = algo.path_length_many(g, pairs)
+    for (v1, v2), c, d in zip(pairs, lcas, lengths):
+        expected = naive_lca(g, v1, v2)
+        assert algo.lca(g, v1, v2) == expected
+        assert c == (-1 if expected is None else expected)
+        if expected is None:
+            assert d == -1
+            assert algo.topological_distance(g, v1, v2) is None
+        else:
+            dist = (len(naive_ancestors(g, v1)) + len(naive_ancestors(g, v2))
+                    - 2*len(naive_ancestors(g, expected)))
+            assert d == dist
+            assert algo.topological_distance(g, v1, v2) == dist
+
+    leaves = [v for v in g.vertices(scale=g.max_scale()) if g.is_leaf(v)]
+    d = algo.topological_distances(g, leaves)
+    assert d.shape == (len(leaves), len(leaves))
+    assert (d == d.T).all() and (d.diagonal() == 0).all()
+
+    expected = leaves[0]
+    for v in leaves[1:]:
+        expected = naive_lca(g, expected, v)
+    assert algo.lowestCommonAncestor(g, leaves) == expected
+
+    v = leaves[0]
+    new = g.add_child(v, edge_type='<')
+    assert algo.lca(g, new, leaves[0]) == v
+
+
+def test_topology_metrics():
+    g = MTG('data/test8_boutdenoylum2.mtg')
+    metrics = algo.topology_metrics(g)
+    n = len(g)
+    assert all(len(a) == n for a in metrics.values())
+    assert sorted(metrics['vid']) == sorted(g.vertices())
+    assert list(metrics['scale']) == sorted(metrics['scale'])
+
+    orders = algo.orders(g)
+    heights = algo.heights(g)
+    for i, v in enumerate(metrics['vid']):
+        assert metrics['scale'][i] == g.scale(v)
+        assert metrics['order'][i] == g.order(v) == algo.order(g, v)
+        assert metrics['height'][i] == algo.height(g, v)
+        assert metrics['rank'][i] == g.Rank(v)
+        assert metrics['decomposition_depth'][i] == max(g.scale(c) for c in naive_components(g, v)) - g.scale(v)
+        desc = list(pre_order2(g, v))
+        assert metrics['subtree_size'][i] == len(desc)
+        assert metrics['nb_leaves'][i] == len([x for x in desc if g.is_leaf(x)])
+        if g.scale(v) == g.max_scale():
+            assert metrics['order'][i] == orders[v]
+            assert metrics['height'][i] == heights[v]
+
+    finest = algo.topology_metrics(g, scale=g.max_scale())
+    assert list(finest['vid']) == [v for v in metrics['vid'] if g.scale(v) == g.max_scale()]
+
+    # an axis which is not decomposed
+    axis = g.add_child(g.vertices(scale=2)[0], edge_type='+', label='A')
+    metrics = algo.topology_metrics(g, scale=2)
+    depth = dict(zip(metrics['vid'].tolist(), metrics['decomposition_depth'].tolist()))
+    assert depth[axis] == 0
+    assert depth[g.vertices(scale=2)[0]] == 1
+
+
+def test_accumulate():
+    g = MTG('data/test8_boutdenoylum2.mtg')
+    scale = g.max_scale()
+    vertices = g.vertices(scale=scale)
+    weight = dict((v, v % 5 + 1) for v in vertices)
+
+    total = algo.accumulate(g, weight, scale=scale)
+    maxi = algo.accumulate(g, weight, op='max', scale=scale)
+    distance = algo.propagate(g, weight, scale=scale)
+    mini = algo.propagate(g, weight, op=np.minimum, scale=scale)
+    assert sorted(total) == sorted(vertices)
+    for v in vertices:
+        desc = list(pre_order2(g, v))
+        anc = naive_ancestors(g, v)
+        assert total[v] == sum(weight[x] for x in desc)
+        assert maxi[v] == max(weight[x] for x in desc)
+        assert distance[v] == sum(weight[x] for x in anc)
+        assert mini[v] == min(weight[x] for x in anc)
+
+    # aggregate the components of each complex
+    for s in range(1, scale):
+        length = algo.accumulate(g, weight, direction='complex', scale=s)
+        for v in g.vertices(scale=s):
+            assert length[v] == sum(weight[x] for x in g.components_at_scale(v, scale))
+
+    leaves = dict((v, 1) for v in vertices if g.is_leaf(v))
+    nb_leaves = algo.accumulate(g, leaves)
+    metrics = algo.topology_metrics(g)
+    assert [nb_leaves[v] for v in metrics['vid'] if g.scale(v) == scale] == \
+        [n for n, s in zip(metrics['nb_leaves'], metrics['scale']) if s == scale]
+
+    # operators without identity
+    partial = dict((v, weight[v]) for v in vertices if v % 3)
+    fmax = algo.accumulate(g, partial, op=np.fmax, scale=scale)
+    fmin = algo.propagate(g, partial, op=np.fmin, scale=scale)
+    for v in vertices:
+        desc = [weight[x] for x in pre_order2(g, v) if x in partial]
+        anc = [weight[x] for x in naive_ancestors(g, v) if x in partial]
+        assert fmax[v] == (max(desc) if desc else -np.inf)
+        assert fmin[v] == (min(anc) if anc else np.inf)
+    with pytest.raises(ValueError):
+        algo.accumulate(g, weight, op=np.arctan2)
+    assert algo.accumulate(g, weight, op=np.arctan2, default=0.)
+
+    with pytest.raises(ValueError):
+        algo.accumulate(g, weight, direction='left')
@@ -28,6 +28,7 @@ def files_to_check():
     reconstructed_appletree.mtg
     test6_apricot2.mtg
     mtg_dynamic.mtg
+    code_file.mtg
     '''.split())
     files = [f for f in files if os.path.basename(f) not in exclude]
 
@@ -70,3 +71,65 @@ def test_files(fn):
         g, s = build_mtg_and_check(fn)
         check(g, s, fn)
 
+
+def test_write_fileobj():
+    from io import StringIO
+    from openalea.mtg.algo import orders
+
+    g = read_mtg_file('data/test8_boutdenoylum2.mtg')
+    props = [('Dist', 'REAL'), ('NFe', 'INT')]
+    s = write_mtg(g, props)
+
+    f = StringIO()
+    assert write_mtg(g, props, fileobj=f) is None
+    assert f.getvalue() == s
+
+    # one column per order
+    entity = [l for l in s.splitlines() if l.startswith('ENTITY-CODE')][0]
+    assert entity.split('\t') == ['ENTITY-CODE'] + ['']*max(orders(g).values()) + ['Dist', 'NFe']
+
+    g1 = read_mtg(s)
+    assert len(g1) == len(g)
+    assert g1.property('Dist') == g.property('Dist')
+    assert [g1.label(v) for v in g1.vertices()] == [g.label(v) for v in g.vertices()]
+
+
+@pytest.mark.parametrize('ext', ['gz', 'bz2', 'xz', 'zst'])
+def test_compressed(tmp_path, ext):
+    from io import BytesIO
+    from openalea.mtg.compress import open_file
+
+    if ext == 'zst':
+        try:
+            import compression.zstd
+        except ImportError:
+            pytest.importorskip('zstandard')
+
+    g = read_mtg_file('data/test11_wij10.mtg')
+    props = [('XX', 'REAL'), ('YY', 'REAL')]
+    fn = str(tmp_path / ('g.mtg.' + ext))
+    write_mtg_file(g, fn, props)
+    with open(fn, 'rb') as f:
+        data = f.read()
+    assert b'ENTITY-CODE' not in data
+
+    s = write_mtg(g, props)
+    with open_file(fn) as f:
+        assert f.read() == s
+
+    h = read_mtg_file(fn)
+    assert len(h) == len(g)
+    assert h.property('XX') == g.property('XX')
+    with open(fn, 'rb') as f:
+        assert len(read_mtg_file(f)) == len(g)
+
+    # plants selected in the decompressed stream
+    plain = str(tmp_path / 'g.mtg')
+    write_mtg_file(g, plain, props)
+    h = read_mtg_file(fn, plants=['P7', 'P2'])
+    assert h.property('_line') == read_mtg_file(plain, plants=['P7', 'P2']).property('_line')
+    assert [h.label(v) for v in h.vertices(scale=1)] == ['P2', 'P7']
+
+    f = BytesIO()
+    write_mtg(g, props, fileobj=f)
+    assert not f.closed and f.getvalue().decode() == s